@@ -0,0 +1,6853 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# BSD 3-Clause License
+#
+# Copyright (c) 2025, Bjoern Hendrik Fock
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# pylint: disable=invalid-name
+# pylint: disable=too-many-lines
+# pylint: disable=import-outside-toplevel
+#
+"""
+git-cl: A pre-staging layer for organising changes in Git.
+
+GitHub: https://github.com/BHFock/git-cl
+DOI:    https://doi.org/10.5281/zenodo.18722077
+
+git-cl brings changelist support to Git, allowing developers to partition
+modified files into named groups before staging or committing. Changelists
+persist across sessions in a JSON file inside the .git directory, and
+integrate transparently with existing Git workflows.
+
+Features:
+- Group files into named changelists (add, remove, status)
+- Stage, unstage, commit, or diff by changelist
+- Checkout (revert) changelist files to HEAD
+- Stash and unstash changelists selectively
+- Promote a changelist to a dedicated branch (late-binding branching)
+
+Single file, zero dependencies beyond Python 3.9+ and Git.
+Cross-platform: Unix (fcntl) and Windows (msvcrt) file locking.
+
+This file is the whole program and can be installed on its own as
+'git-cl'. The 'git-cl' launcher next to it imports it as a module
+instead, so that Python caches its compiled bytecode.
+"""
+
+__version__ = "1.1.6"
+
+# Modules that only some commands need (copy, datetime, socket, tempfile,
+# colorama) are imported inside the functions using them, which keeps
+# start-up short for the common commands such as 'git cl st'
+import argparse
+import atexit
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+from contextlib import (closing, contextmanager, redirect_stderr,
+                        redirect_stdout)
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional, Iterator
+
+if sys.version_info < (3, 9):
+    print("Error: git-cl requires Python 3.9+", file=sys.stderr)
+    sys.exit(1)
+
+# ANSI colour codes for 'git cl st', named as in colorama
+
+# pylint: disable=too-few-public-methods
+class Fore:
+    """Foreground colours."""
+    BLUE = "\033[34m"
+    GREEN = "\033[32m"
+    MAGENTA = "\033[35m"
+    RED = "\033[31m"
+
+
+class Style:
+    """Text styles."""
+    RESET_ALL = "\033[0m"
+
+
+def _relpath(path, start):
+    """Like os.path.relpath, but always returns forward slashes."""
+    return os.path.relpath(path, start).replace("\\", "/")
+
+# =============================================================================
+# PUBLIC API TYPES (results and errors of the Repo class)
+# =============================================================================
+
+
+class GitClError(Exception):
+    """
+    Base class of the errors raised by Repo and the functions behind it.
+
+    The message is the error text 'git cl' prints for the same failure.
+
+    Attributes:
+        reported: True if the details were already printed by the helper
+                  that failed; the CLI then prints nothing more
+        output: What the operation printed before failing, as captured by
+                Repo (empty otherwise)
+    """
+
+    def __init__(self, message: str, reported: bool = False):
+        super().__init__(message)
+        self.reported = reported
+        self.output = ""
+
+
+class NotARepositoryError(GitClError):
+    """The path is not inside a Git working tree."""
+
+
+class InvalidNameError(GitClError):
+    """The changelist name is not allowed."""
+
+
+class ChangelistNotFoundError(GitClError):
+    """No active (or, for unstash, stashed) changelist has the name."""
+
+
+class StashedFilesError(GitClError):
+    """Files to add belong to a stashed changelist."""
+
+
+class MergeConflictError(GitClError):
+    """The operation is refused while merge conflicts are unresolved."""
+
+
+class StashError(GitClError):
+    """A changelist could not be stashed or unstashed."""
+
+
+class FileStatus(NamedTuple):
+    """
+    One file as shown by 'git cl status'.
+
+    Attributes:
+        path: Path relative to the repository root, with forward slashes;
+              an untracked directory reported as a whole ends in '/'
+        code: Two-letter code as in 'git status --short': '  ' for an
+              unchanged file, 'XX' for a changelist file that does not exist
+        changelist: Name of the changelist holding the file, or None
+    """
+    path: str
+    code: str
+    changelist: Optional[str]
+
+
+class StashedChangelist(NamedTuple):
+    """
+    A stashed changelist.
+
+    Attributes:
+        name: Changelist name
+        files: Files in the changelist, relative to the repository root
+        source_branch: Branch it was stashed from, None if not recorded
+        timestamp: When it was stashed, in ISO 8601 format
+    """
+    name: str
+    files: list[str]
+    source_branch: Optional[str]
+    timestamp: str
+
+
+class StatusReport(NamedTuple):
+    """
+    Everything 'git cl status' shows.
+
+    Attributes:
+        changelists: Files of each non-empty active changelist, by name,
+                     in the order they were added
+        unassigned: Changed files in no changelist, sorted by path
+        stashed: Stashed changelists, most recently stashed first
+        conflicts: Paths with unresolved merge conflicts, sorted
+        entries: Status code of every changed file, by path
+    """
+    changelists: dict[str, list[FileStatus]]
+    unassigned: list[FileStatus]
+    stashed: list[StashedChangelist]
+    conflicts: list[str]
+    entries: dict[str, str]
+
+
+class AddResult(NamedTuple):
+    """
+    Outcome of adding files to a changelist.
+
+    Attributes:
+        name: Changelist name
+        files: Files now in the changelist, relative to the repository root
+        missing: Those of files that do not exist
+        skipped: Arguments ignored as invalid or outside the repository
+    """
+    name: str
+    files: list[str]
+    missing: list[str]
+    skipped: list[str]
+
+
+class StashResult(NamedTuple):
+    """
+    Outcome of stashing a changelist.
+
+    Attributes:
+        name: Changelist name
+        files: Files whose changes were stashed and reset
+        stash_ref: Git ref of the stash entry when it was created
+        source_branch: Branch it was stashed from, None on a detached HEAD
+    """
+    name: str
+    files: list[str]
+    stash_ref: str
+    source_branch: Optional[str]
+
+
+class UnstashResult(NamedTuple):
+    """
+    Outcome of unstashing a changelist.
+
+    Attributes:
+        name: Changelist name
+        files: Files of the restored changelist
+    """
+    name: str
+    files: list[str]
+
+
+def clutil_print_error(error: GitClError) -> None:
+    """Prints an error for the CLI, unless its helper already did."""
+    if not error.reported:
+        print(error)
+
+# =============================================================================
+# INTERNAL UTILITIES
+# =============================================================================
+
+# Note: Some utility functions call CLI command functions like cl_stash and
+#       cl_unstash. These are defined later in the module but are called by
+#       utility functions.
+
+
+class GitTrace:
+    """
+    Accounting for the Git processes started by one git-cl invocation.
+
+    Every Git command goes through clutil_run_git() (or the streaming
+    status reader), which reports it here. Nothing is recorded unless
+    tracing is on: GIT_CL_TRACE=1 or the --trace option prints each
+    command with its wall time, exit status and output sizes to stderr,
+    and a summary when git-cl exits; GIT_CL_TRACE_FILE=<path> appends the
+    same information to <path> as JSON lines.
+
+    Attributes:
+        to_stderr (bool): Print each command and the summary to stderr.
+        trace_file (Optional[str]): File to append JSON lines to.
+        calls (int): Number of Git processes started so far.
+        seconds (float): Their combined wall time.
+    """
+
+    def __init__(self) -> None:
+        self.to_stderr = os.environ.get("GIT_CL_TRACE", "").lower() in (
+            "1", "true", "yes", "on")
+        self.trace_file = os.environ.get("GIT_CL_TRACE_FILE") or None
+        self.calls = 0
+        self.seconds = 0.0
+        self.stdout_bytes = 0
+        self.stderr_bytes = 0
+        if self.enabled:
+            atexit.register(self.summary)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether Git commands are being recorded."""
+        return self.to_stderr or self.trace_file is not None
+
+    def enable_stderr(self) -> None:
+        """Turns on tracing to stderr, as --trace does."""
+        if not self.enabled:
+            atexit.register(self.summary)
+        self.to_stderr = True
+
+    def record(self, cmd: list[str], seconds: float, returncode: int,
+               stdout_bytes: Optional[int], stderr_bytes: Optional[int]) -> None:
+        """
+        Records one finished Git process.
+
+        Args:
+            cmd: The command line
+            seconds: Wall time from start to exit
+            returncode: Exit status
+            stdout_bytes: Size of the captured output, None if not captured
+            stderr_bytes: Size of the captured errors, None if not captured
+        """
+        self.calls += 1
+        self.seconds += seconds
+        self.stdout_bytes += stdout_bytes or 0
+        self.stderr_bytes += stderr_bytes or 0
+        if self.to_stderr:
+            out = "-" if stdout_bytes is None else f"{stdout_bytes} B"
+            err = "-" if stderr_bytes is None else f"{stderr_bytes} B"
+            print(f"git-cl trace: {seconds:.3f}s exit {returncode} "
+                  f"out {out} err {err}: {' '.join(cmd)}", file=sys.stderr)
+        self._write({"event": "git", "argv": cmd, "seconds": round(seconds, 6),
+                     "returncode": returncode, "stdout_bytes": stdout_bytes,
+                     "stderr_bytes": stderr_bytes})
+
+    def summary(self) -> None:
+        """Reports the totals; registered to run when git-cl exits."""
+        if self.to_stderr:
+            print(f"git-cl trace: {self.calls} Git processes, "
+                  f"{self.seconds:.3f}s, out {self.stdout_bytes} B, "
+                  f"err {self.stderr_bytes} B", file=sys.stderr)
+        self._write({"event": "summary", "argv": sys.argv[1:],
+                     "calls": self.calls, "seconds": round(self.seconds, 6),
+                     "stdout_bytes": self.stdout_bytes,
+                     "stderr_bytes": self.stderr_bytes})
+
+    def _write(self, data: dict) -> None:
+        if self.trace_file is None:
+            return
+        data["pid"] = os.getpid()
+        try:
+            # One write per line, so concurrent git-cl processes can share
+            # the file
+            with open(self.trace_file, "a", encoding="utf-8") as trace:
+                trace.write(json.dumps(data) + "\n")
+        except OSError:
+            pass
+
+
+_GIT_TRACE = GitTrace()
+
+
+def _output_size(output) -> Optional[int]:
+    """Returns the size in bytes of captured str or bytes output."""
+    if output is None:
+        return None
+    if isinstance(output, str):
+        return len(output.encode("utf-8", "surrogateescape"))
+    return len(output)
+
+
+class _CountingReader:
+    """Wraps a binary stream and counts the bytes read from it."""
+
+    def __init__(self, stream) -> None:
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads like stream.read() and adds to the count."""
+        chunk = self.stream.read(size)
+        self.count += len(chunk)
+        return chunk
+
+
+def clutil_run_git(cmd: list[str], check: bool = False,
+                   **kwargs) -> subprocess.CompletedProcess:
+    """
+    Runs a Git command; the single place git-cl starts Git processes.
+
+    A drop-in replacement for subprocess.run() that reports the command to
+    the GitTrace when tracing is on.
+
+    Args:
+        cmd: The full command line, starting with 'git'
+        check: Raise CalledProcessError on a non-zero exit status
+        **kwargs: Passed on to subprocess.run()
+
+    Returns:
+        subprocess.CompletedProcess: The finished process.
+
+    Raises:
+        subprocess.CalledProcessError: If check is True and Git fails.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(cmd, check=False, **kwargs)
+    if _GIT_TRACE.enabled:
+        _GIT_TRACE.record(cmd, time.perf_counter() - start, result.returncode,
+                          _output_size(result.stdout),
+                          _output_size(result.stderr))
+    if check:
+        result.check_returncode()
+    return result
+
+
+def clutil_git_output(cmd: list[str], **kwargs):
+    """
+    Runs a Git command and returns its output, like subprocess.check_output().
+
+    Args:
+        cmd: The full command line, starting with 'git'
+        **kwargs: Passed on to subprocess.run()
+
+    Returns:
+        The standard output, as str with text=True and bytes otherwise.
+
+    Raises:
+        subprocess.CalledProcessError: If Git fails.
+    """
+    return clutil_run_git(cmd, stdout=subprocess.PIPE, check=True,
+                          **kwargs).stdout
+
+
+# Locks held by this process: lock path -> [open lock file, exclusive?, depth]
+_HELD_LOCKS: dict[str, list] = {}
+
+
+def _lock_file_handle(lock_file, exclusive: bool) -> None:
+    """Locks an open lock file shared or exclusively (always exclusive on Windows)."""
+    if sys.platform == "win32":
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+    else:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+def _unlock_file_handle(lock_file) -> None:
+    """Releases a lock taken by _lock_file_handle()."""
+    if sys.platform == "win32":
+        try:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+    else:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def clutil_file_lock(lock_path: Path, shared: bool = False):
+    """
+    Acquires a lock on a file for safe concurrent access.
+
+    Writers take the lock exclusively; readers may take it shared, so
+    several readers can load metadata at the same time while a writer
+    waits for them (and they for it). The lock file is created on first
+    use and never removed: unlinking it would let a process that already
+    opened the old file lock a different inode than later arrivals.
+
+    Locks are re-entrant within a process. Acquiring a lock this process
+    already holds does not block; asking for an exclusive lock while
+    holding a shared one upgrades it for the duration of the inner block.
+
+    Args:
+        lock_path (Path): Path to the lock file to create and lock.
+        shared (bool): Take a shared (read) lock instead of an exclusive
+                       (write) lock.
+
+    Yields:
+        None
+
+    Raises:
+        OSError: If the lock file cannot be created or locked.
+
+    Platform notes:
+        On Unix, ``fcntl.flock`` acquires a whole-file advisory lock that
+        blocks indefinitely until the lock becomes available.
+        On Windows, ``msvcrt.locking`` locks a single byte (the file is
+        empty and used only for mutual exclusion, so one byte suffices).
+        It has no shared mode, so shared locks are exclusive there.
+        Unlike ``fcntl.flock``, ``msvcrt.locking`` with ``LK_LOCK`` retries
+        for approximately ten seconds before raising ``OSError``.  This is
+        acceptable because changelist operations are fast.
+
+    Example:
+        >>> lock_file = Path('.git/cl.lock')
+        >>> with clutil_file_lock(lock_file):
+        ...     # Perform operations that need exclusive access
+        ...     pass
+    """
+    key = os.path.abspath(lock_path)
+    held = _HELD_LOCKS.get(key)
+    if held is not None:
+        upgrade = not shared and not held[1]
+        if upgrade:
+            _lock_file_handle(held[0], exclusive=True)
+            held[1] = True
+        held[2] += 1
+        try:
+            yield
+        finally:
+            held[2] -= 1
+            if upgrade:
+                _lock_file_handle(held[0], exclusive=False)
+                held[1] = False
+        return
+
+    # pylint: disable-next=consider-using-with
+    lock_file = open(lock_path, 'a', encoding='utf-8')
+    try:
+        _lock_file_handle(lock_file, exclusive=not shared)
+        # Windows has no shared locks, so every lock held there is exclusive
+        exclusive = not shared or sys.platform == "win32"
+        _HELD_LOCKS[key] = [lock_file, exclusive, 1]
+        try:
+            yield
+        finally:
+            del _HELD_LOCKS[key]
+            _unlock_file_handle(lock_file)
+    finally:
+        lock_file.close()
+
+
+@lru_cache(maxsize=None)
+def clutil_terminal_supports_color() -> bool:
+    """
+    Returns True if ANSI colour codes can be written to the terminal.
+
+    Terminals on Unix-like systems understand them natively. The Windows
+    console only does once colorama has switched it to ANSI mode, so
+    colorama is imported there, and only there, the first time colour is
+    about to be used. Without colorama, Windows output stays plain.
+
+    Returns:
+        bool: True if coloured output can be shown.
+    """
+    if sys.platform != "win32":
+        return True
+    try:
+        import colorama
+    except ImportError:
+        return False
+    if hasattr(colorama, "just_fix_windows_console"):
+        colorama.just_fix_windows_console()
+    else:
+        colorama.init()
+    return True
+
+
+def clutil_should_use_color(args) -> bool:
+    """
+    Determines whether coloured output should be used in CLI display.
+
+    This function checks multiple conditions to decide if colour formatting
+    is appropriate:
+    - The --no-color flag is not set.
+    - The NO_COLOR environment variable is not set.
+    - The output is being sent to a terminal (TTY).
+    - The terminal understands ANSI colour codes
+      (clutil_terminal_supports_color()).
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments, expected to
+                                   include the 'no_color' attribute.
+
+    Returns:
+        bool: True if coloured output should be enabled, False otherwise.
+    """
+    no_color_env = bool(os.environ.get('NO_COLOR'))
+    is_tty = sys.stdout.isatty()
+    return (not (args.no_color or no_color_env or not is_tty) and
+            clutil_terminal_supports_color())
+
+
+def clutil_resolve_commit_message(args: argparse.Namespace) -> Optional[str]:
+    """
+    Resolves the commit message from CLI arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments with 'message' or 'file'.
+
+    Returns:
+        Optional[str]: The commit message, or None if resolution fails.
+    """
+    if args.message:
+        return args.message
+
+    if args.file:
+        try:
+            return clutil_read_commit_message_file(args.file)
+        except (OSError, ValueError) as error:
+            print(f"Error reading commit message file '{args.file}': {error}")
+            return None
+
+    print("Error: No commit message provided.")
+    return None
+
+
+class RepoContext(NamedTuple):
+    """
+    Repository locations and HEAD state, resolved once per invocation.
+
+    Attributes:
+        git_root (Path): Absolute top-level directory of the working tree.
+        git_dir (Path): Absolute path to the (per-worktree) Git directory.
+        git_common_dir (Path): Absolute path to the Git directory shared
+                               by all worktrees of the repository.
+        head_oid (Optional[str]): Object name of the HEAD commit, or None
+                                  before the first commit.
+        branch (Optional[str]): Current branch name, or None when HEAD
+                                is detached.
+    """
+    git_root: Path
+    git_dir: Path
+    git_common_dir: Path
+    head_oid: Optional[str]
+    branch: Optional[str]
+
+
+@lru_cache(maxsize=None)
+def clutil_get_repo_context() -> RepoContext:
+    """
+    Returns the repository context for the current invocation.
+
+    All of the locations git-cl needs are resolved with a single
+    'git rev-parse' call and cached, so helpers such as clutil_get_file(),
+    clutil_get_stash_file() and clutil_get_git_root() no longer spawn a
+    Git process each. Call clutil_reset_repo_context() after any operation
+    that moves HEAD to a different branch.
+
+    Returns:
+        RepoContext: The resolved repository context.
+
+    Raises:
+        SystemExit: If not inside a Git working tree.
+    """
+    result = clutil_run_git(
+        ["git", "rev-parse", "--show-toplevel", "--git-dir",
+         "--git-common-dir", "HEAD", "--symbolic-full-name", "HEAD"],
+        capture_output=True, text=True, check=False
+    )
+    lines = result.stdout.splitlines()
+    if len(lines) < 3:
+        print("Error: Not inside a Git repository.")
+        print("Please run this command from within a Git repository.")
+        sys.exit(1)
+
+    # --git-dir and --git-common-dir may be relative to the current directory
+    cwd = Path.cwd()
+    git_root = Path(lines[0]).resolve()
+    git_dir = Path(os.path.abspath(cwd / lines[1]))
+    git_common_dir = Path(os.path.abspath(cwd / lines[2]))
+
+    if result.returncode == 0 and len(lines) > 4:
+        # 'refs/heads/<name>' on a branch, plain 'HEAD' when detached.
+        # Unlike --abbrev-ref this stays unambiguous if a tag shares the
+        # branch name.
+        head_oid = lines[3]
+        head = lines[4]
+        branch = None
+        if head.startswith("refs/heads/"):
+            branch = head[len("refs/heads/"):]
+    else:
+        # HEAD does not resolve yet (no commits on the current branch)
+        head_oid = None
+        unborn = clutil_run_git(["git", "symbolic-ref", "--short", "-q", "HEAD"],
+                                capture_output=True, text=True, check=False)
+        branch = unborn.stdout.strip() or None
+
+    return RepoContext(git_root, git_dir, git_common_dir, head_oid, branch)
+
+
+def clutil_reset_repo_context() -> None:
+    """
+    Discards the cached repository context.
+
+    The next call to clutil_get_repo_context() re-reads it from Git. Used
+    after checking out a new branch, since the cached branch name is stale.
+    """
+    clutil_get_repo_context.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def clutil_get_config() -> dict[str, str]:
+    """
+    Returns the 'cl.*', 'core.*' and 'status.*' Git configuration, read once.
+
+    Section and key names are lower-cased by Git, so lookups use
+    lower-case names such as 'cl.statuscache' or 'core.fsmonitor'.
+
+    Returns:
+        dict[str, str]: Mapping of configuration names to their last value.
+    """
+    result = clutil_run_git(
+        ["git", "config", "-z", "--get-regexp", r"^(cl|core|status)\."],
+        capture_output=True, check=False
+    )
+    config = {}
+    # Each record is '<name>\n<value>', or just '<name>' for a bare boolean
+    for record in result.stdout.split(b"\0"):
+        if record:
+            name, newline, value = os.fsdecode(record).partition("\n")
+            config[name] = value if newline else "true"
+    return config
+
+
+def clutil_config_bool(name: str, default: bool = False) -> bool:
+    """
+    Reads a boolean Git configuration value.
+
+    Args:
+        name (str): Lower-case configuration name, e.g. 'cl.statuscache'.
+        default (bool): Value to use when the option is unset or invalid.
+
+    Returns:
+        bool: The configured value.
+    """
+    value = clutil_get_config().get(name, "").lower()
+    if value in ("true", "yes", "on", "1"):
+        return True
+    if value in ("false", "no", "off", "0"):
+        return False
+    return default
+
+
+def clutil_repo_state_key() -> list[list[int]]:
+    """
+    Returns the stat keys of the files the cached repository context and
+    configuration are read from.
+
+    Covers HEAD, the current branch's ref, packed refs and the repository,
+    worktree, global and XDG configuration files. Files pulled in with
+    'include.path' are not watched.
+
+    Returns:
+        list[list[int]]: One clutil_stat_key() per file.
+    """
+    context = clutil_get_repo_context()
+    xdg_home = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+    files = [context.git_dir / "HEAD",
+             context.git_common_dir / "packed-refs",
+             context.git_common_dir / "config",
+             context.git_dir / "config.worktree",
+             Path.home() / ".gitconfig",
+             Path(xdg_home) / "git" / "config"]
+    if context.branch:
+        files.append(context.git_common_dir / "refs" / "heads" /
+                     context.branch)
+    return [clutil_stat_key(path) for path in files]
+
+
+def clutil_refresh_repo_context(state: dict) -> None:
+    """
+    Drops the cached repository context and configuration if stale.
+
+    For processes that run many commands against one repository: the
+    daemon and scripts using Repo. The changelist store and status map
+    check their own files when they are read.
+
+    Args:
+        state: Kept by the caller between calls; holds the last
+               clutil_repo_state_key()
+    """
+    key = clutil_repo_state_key()
+    if state.get("repo_state", key) != key:
+        clutil_reset_repo_context()
+        clutil_get_config.cache_clear()
+        key = clutil_repo_state_key()
+    state["repo_state"] = key
+
+
+def clutil_get_file() -> Path:
+    """
+    Returns the path to the changelist file inside the Git directory.
+
+    Returns:
+        Path: Path to the '.git/cl.json' file.
+
+    Raises:
+        SystemExit: If not inside a Git repository.
+    """
+    return clutil_get_repo_context().git_dir / "cl.json"
+
+
+class _IndexedStore(dict):
+    """
+    A dict of metadata records with a reverse index from file to record.
+
+    Subclasses set _files_of to a static method returning the files a
+    record owns. The index is built on first use and dropped whenever a
+    record is added, replaced or removed through the dict interface; file
+    lists must not be modified in place other than through the subclass
+    methods.
+
+    Every mutation is also recorded as a JSON journal record (see
+    clutil_save()), serialised when it happens so later changes to the
+    same objects cannot alter it.
+    """
+
+    _files_of: Callable[[object], list[str]]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._owners: Optional[dict[str, str]] = None
+        self.journal: Optional[list[str]] = []
+
+    def _index(self) -> dict[str, str]:
+        if self._owners is None:
+            self._owners = {path: name for name, record in self.items()
+                            for path in self._files_of(record)}
+        return self._owners
+
+    def owner(self, path: str) -> Optional[str]:
+        """
+        Returns the name of the record that owns a file.
+
+        Args:
+            path (str): Repo-root relative path as stored in the metadata.
+
+        Returns:
+            Optional[str]: The owning record's name, or None.
+        """
+        return self._index().get(path)
+
+    def _invalidate(self) -> None:
+        self._owners = None
+
+    def _record(self, *operation) -> None:
+        if self.journal is not None:  # None while replaying a journal
+            self.journal.append(json.dumps(operation))
+
+    def apply(self, operation: list) -> None:
+        """
+        Applies one journal record, as written by _record().
+
+        Args:
+            operation (list): Operation name followed by its arguments.
+        """
+        name, *op_args = operation
+        if name == "set":
+            self[op_args[0]] = op_args[1]
+        elif name == "del":
+            self.pop(op_args[0], None)
+        elif name == "clear":
+            self.clear()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._invalidate()
+        self._record("set", key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._invalidate()
+        self._record("del", key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._invalidate()
+            self._record("del", key)
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._invalidate()
+        self._record("del", key)
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+        self._record("clear")
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+class ChangelistStore(_IndexedStore):
+    """
+    Changelists as loaded from 'cl.json': names mapped to lists of files.
+
+    Each file belongs to at most one changelist. assign() and discard()
+    keep that invariant and the reverse index in step, and touch every
+    affected list once per call rather than once per file.
+    """
+
+    @staticmethod
+    def _files_of(record) -> list[str]:
+        return record
+
+    def _drop(self, removals: dict[str, set[str]]) -> None:
+        """Removes files from the named lists, one pass per list."""
+        owners = self._index()
+        for name, paths in removals.items():
+            dict.__setitem__(self, name, [path for path in self[name]
+                                          if path not in paths])
+            for path in paths:
+                owners.pop(path, None)
+
+    def assign(self, name: str, paths: list[str]) -> None:
+        """
+        Adds files to a changelist, moving them out of any other one.
+
+        The changelist is created if needed. Files already in it keep their
+        position; new files are appended in the given order.
+
+        Args:
+            name (str): Name of the target changelist.
+            paths (list[str]): Repo-root relative paths.
+        """
+        owners = self._index()
+        removals = {}
+        added = []
+        for path in dict.fromkeys(paths):
+            current = owners.get(path)
+            if current == name:
+                continue
+            if current is not None:
+                removals.setdefault(current, set()).add(path)
+            added.append(path)
+
+        self._drop(removals)
+        if name not in self:
+            dict.__setitem__(self, name, [])
+        self[name].extend(added)
+        for path in added:
+            owners[path] = name
+        self._record("assign", name, list(paths))
+
+    def discard(self, paths: list[str]) -> list[tuple[str, str]]:
+        """
+        Removes files from whichever changelists contain them.
+
+        Args:
+            paths (list[str]): Repo-root relative paths.
+
+        Returns:
+            list[tuple[str, str]]: (path, changelist name) for every file
+                                   that was removed, in the given order.
+        """
+        owners = self._index()
+        removed = []
+        removals = {}
+        for path in dict.fromkeys(paths):
+            name = owners.get(path)
+            if name is not None:
+                removed.append((path, name))
+                removals.setdefault(name, set()).add(path)
+        self._drop(removals)
+        self._record("discard", list(paths))
+        return removed
+
+    def apply(self, operation: list) -> None:
+        name, *op_args = operation
+        if name == "assign":
+            self.assign(*op_args)
+        elif name == "discard":
+            self.discard(*op_args)
+        else:
+            super().apply(operation)
+
+
+class StashStore(_IndexedStore):
+    """
+    Stash metadata as loaded from 'cl-stashes.json': names of stashed
+    changelists mapped to their metadata, including the 'files' list.
+    """
+
+    @staticmethod
+    def _files_of(record) -> list[str]:
+        return record.get("files", [])
+
+
+def clutil_get_journal_file() -> Path:
+    """
+    Returns the path to the changelist journal inside the Git directory.
+
+    Returns:
+        Path: Path to the '.git/cl.journal' file.
+    """
+    return clutil_get_repo_context().git_dir / "cl.journal"
+
+
+# The journal is compacted into cl.json once it is larger than this or
+# than cl.json itself, whichever is bigger
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+
+def clutil_stat_key(path) -> list[int]:
+    """
+    Returns a file's modification time, size and inode, or zeros if missing.
+
+    Git and git-cl replace the files they rewrite by renaming a new file
+    over them, so the inode changes even when the time and size do not.
+
+    Args:
+        path: The file to look at.
+
+    Returns:
+        list[int]: [mtime in nanoseconds, size in bytes, inode number].
+    """
+    try:
+        info = os.stat(path)
+    except OSError:
+        return [0, 0, 0]
+    return [info.st_mtime_ns, info.st_size, info.st_ino]
+
+
+# In a 'git cl daemon' process: values kept between requests, by name.
+# None in every other process, which always reads from disk.
+_DAEMON_CACHE: Optional[dict] = None
+
+
+def clutil_daemon_cached(name: str, paths: list[Path], loader):
+    """
+    Returns loader(), reusing the daemon's earlier result if still valid.
+
+    Outside a daemon this just calls loader(). Inside one, the result is
+    kept and returned again for as long as the files it was read from are
+    unchanged. Only read-only callers may use this, since the same object
+    is handed out every time.
+
+    Args:
+        name: Key for the cached value.
+        paths: Files the value is read from.
+        loader: Function reading the value.
+
+    Returns:
+        The value returned by loader(), now or on an earlier call.
+    """
+    if _DAEMON_CACHE is None:
+        return loader()
+    key = [clutil_stat_key(path) for path in paths]
+    cached = _DAEMON_CACHE.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    value = loader()
+    _DAEMON_CACHE[name] = (key, value)
+    return value
+
+
+def clutil_read_changelists() -> ChangelistStore:
+    """
+    Reads cl.json and replays cl.journal on top of it, without locking.
+
+    A journal record cut short by a crash is skipped. Changelists left
+    empty by the journal are dropped, as clutil_save() would.
+
+    Returns:
+        ChangelistStore: The current changelists, with an empty journal.
+
+    Raises:
+        OSError: If a file exists but cannot be read.
+        json.JSONDecodeError: If cl.json is not valid JSON.
+    """
+    changelist_file = clutil_get_file()
+    store = ChangelistStore()
+    if changelist_file.exists():
+        with open(changelist_file, "r", encoding="utf-8") as file_handle:
+            store = ChangelistStore(json.load(file_handle))
+
+    journal_file = clutil_get_journal_file()
+    if journal_file.exists():
+        store.journal = None
+        with open(journal_file, "r", encoding="utf-8") as file_handle:
+            for line in file_handle:
+                try:
+                    store.apply(json.loads(line))
+                except (ValueError, TypeError, IndexError):
+                    continue
+        store = ChangelistStore({k: v for k, v in store.items() if v})
+    return store
+
+
+def clutil_load(lock: bool = True) -> ChangelistStore:
+    """
+    Loads changelist data from the 'cl.json' file and its journal.
+
+    Loading takes a shared lock, so it only waits for writers. Read-only
+    commands can pass lock=False: cl.json is only ever replaced as a
+    whole by os.replace(), so an unlocked reader sees either the old or
+    the new file, never a partial one. In journal mode the shared lock is
+    always taken, since an unlocked reader could miss records that a
+    concurrent compaction moves from the journal into cl.json.
+
+    Args:
+        lock (bool): If False, read without taking the lock.
+
+    Returns:
+        ChangelistStore: A mapping of changelist names to lists of file
+                         paths, with a reverse index from file to
+                         changelist.
+    """
+    changelist_file = clutil_get_file()
+    lock_file = changelist_file.with_suffix('.lock')
+    if clutil_get_journal_file().exists():
+        lock = True
+    elif not changelist_file.exists():
+        return ChangelistStore()
+
+    try:
+        if not lock:
+            return clutil_daemon_cached("changelists", [changelist_file],
+                                        clutil_read_changelists)
+        with clutil_file_lock(lock_file, shared=True):
+            return clutil_read_changelists()
+    except (json.JSONDecodeError, OSError) as error:
+        print(f"Error reading changelists: {error}")
+        return ChangelistStore()
+
+
+def clutil_fsync_directory(directory: Path) -> None:
+    """
+    Flushes a directory entry to disk so that a rename into it is durable.
+
+    Not supported on Windows, where directories cannot be opened; there
+    the rename itself is relied upon.
+
+    Args:
+        directory (Path): The directory to flush.
+    """
+    if sys.platform == "win32":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def clutil_write_json_atomic(path: Path, data: dict, sync: bool = False) -> None:
+    """
+    Writes a JSON document atomically.
+
+    The data is first written to a temporary file in the same directory,
+    then renamed over the target. If the process is interrupted mid-write,
+    the original file is left untouched.
+
+    Args:
+        path (Path): The file to write.
+        data (dict): The document to write.
+        sync (bool): Flush the temporary file to disk before the rename,
+                     so a crash cannot leave an empty or partial file
+                     in place of the target.
+
+    Raises:
+        OSError: If the file cannot be written.
+    """
+    import tempfile
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=path.parent,
+            prefix=f'.{path.name}.',
+            suffix='.tmp'
+        )
+        with os.fdopen(fd, 'w', encoding='utf-8') as file_handle:
+            json.dump(data, file_handle, indent=2)
+            if sync:
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+        os.replace(tmp_path, path)
+        tmp_path = None  # successfully renamed, nothing to clean up
+    finally:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def clutil_write_changelists(data: dict[str, list[str]],
+                             sync: bool = False) -> None:
+    """
+    Writes cl.json atomically and retires the journal. Caller holds the lock.
+
+    The journal is emptied only after the new cl.json is in place. Journal
+    records are idempotent, so replaying them on top of a snapshot that
+    already contains them (after a crash between the two steps) gives the
+    same result.
+
+    Args:
+        data (dict): Mapping of changelist names to lists of files.
+        sync (bool): Flush the new file to disk before it replaces cl.json.
+
+    Raises:
+        OSError: If the file cannot be written.
+    """
+    cleaned = {k: v for k, v in data.items() if v}
+    clutil_write_json_atomic(clutil_get_file(), cleaned, sync=sync)
+    clutil_get_journal_file().unlink(missing_ok=True)
+
+
+def clutil_store_changelists(data: dict[str, list[str]],
+                             sync: bool = False) -> None:
+    """
+    Writes changelists in the configured storage mode. Caller holds the lock.
+
+    See clutil_save() for the storage modes.
+
+    Args:
+        data (dict): Mapping of changelist names to lists of files.
+        sync (bool): Flush the written data to disk before returning.
+
+    Raises:
+        OSError: If the data cannot be written.
+        json.JSONDecodeError: If cl.json is corrupt when the journal is
+                              compacted.
+    """
+    changelist_file = clutil_get_file()
+    journal_mode = (isinstance(data, ChangelistStore) and
+                    clutil_get_config().get("cl.storage", "").lower()
+                    == "journal")
+    if not journal_mode:
+        clutil_write_changelists(data, sync=sync)
+        if isinstance(data, ChangelistStore):
+            data.journal = []
+        return
+
+    journal_file = clutil_get_journal_file()
+    with open(journal_file, "a", encoding="utf-8") as file_handle:
+        for record in data.journal:
+            file_handle.write(record + "\n")
+        if sync:
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+    data.journal = []
+
+    snapshot_size = (changelist_file.stat().st_size
+                     if changelist_file.exists() else 0)
+    if journal_file.stat().st_size > max(JOURNAL_COMPACT_BYTES,
+                                         snapshot_size):
+        clutil_write_changelists(clutil_read_changelists(), sync=sync)
+
+
+def clutil_save(data: dict[str, list[str]]) -> None:
+    """
+    Saves the changelist data to 'cl.json', omitting empty changelists.
+
+    Writes are atomic: the data is first written to a temporary file in the
+    same directory, then renamed over the target. If the process is
+    interrupted mid-write, the original file is left untouched.
+
+    With 'git config cl.storage journal', the changes recorded by a
+    ChangelistStore since it was loaded are appended to '.git/cl.journal'
+    instead, so a small change costs a small write however large the
+    changelists are. The journal is compacted into cl.json once it
+    outgrows JOURNAL_COMPACT_BYTES and cl.json.
+
+    Args:
+        data (dict): Mapping of changelist names to lists of files.
+    """
+    lock_file = clutil_get_file().with_suffix('.lock')
+    with clutil_file_lock(lock_file):
+        try:
+            clutil_store_changelists(data)
+        except (OSError, json.JSONDecodeError) as error:
+            print(f"Error saving changelists: {error}")
+
+
+def clutil_validate_name(name: str) -> bool:
+    """
+    Validates that a changelist name is safe to use.
+
+    Args:
+        name (str): The changelist name to validate.
+
+    Returns:
+        bool: True if the name is valid, False otherwise.
+    """
+    # Check for empty names
+    if not name:
+        return False
+
+    # Check for reasonable length (max 100 characters)
+    if len(name) > 100:
+        return False
+
+    # Only allow safe characters: letters, numbers, hyphens, underscores, dots
+    allowed_chars = set(
+        'abcdefghijklmnopqrstuvwxyz'
+        'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+        '0123456789-_.'
+    )
+
+    if not all(char in allowed_chars for char in name):
+        return False
+
+    # Don't allow names that are only dots (filesystem issues)
+    if all(char == '.' for char in name):
+        return False
+
+    # Check for Git reserved words (only the critical ones)
+    reserved_names = {'HEAD', 'FETCH_HEAD', 'ORIG_HEAD', 'MERGE_HEAD',
+                      'CHERRY_PICK_HEAD', 'index'}
+    if name in reserved_names:
+        return False
+
+    return True
+
+
+def clutil_get_git_root() -> Path:
+    """
+    Returns the absolute path to the root of the current Git repository.
+
+    Returns:
+        Path: The top-level directory of the Git repository.
+
+    Raises:
+        SystemExit: If the current directory is not inside a Git repository.
+    """
+    return clutil_get_repo_context().git_root
+
+
+class StatusEntry(NamedTuple):
+    """
+    A single record from 'git status --porcelain=v2 -z'.
+
+    Attributes:
+        kind (str): One of 'ordinary', 'rename', 'copy', 'unmerged',
+                    'untracked' or 'ignored'.
+        code (str): Two-letter status code in the familiar porcelain v1
+                    notation (e.g. ' M', 'R ', 'UU', '??').
+        path (str): Path relative to the repository root.
+        orig_path (Optional[str]): Source path of a rename or copy,
+                                   None for all other kinds.
+        is_symlink (bool): True if HEAD, the index or the working tree
+                           records the path as a symbolic link.
+    """
+    kind: str
+    code: str
+    path: str
+    orig_path: Optional[str] = None
+    is_symlink: bool = False
+
+
+class StatusMap(dict):
+    """
+    Mapping of repo-root relative paths to two-letter status codes.
+
+    With '--untracked-files=normal', Git reports a directory containing
+    only untracked files as a single 'dir/' entry. Lookups of paths inside
+    such a directory fall back to that entry, so callers can keep asking
+    for individual files with get(), [] and 'in'.
+    """
+
+    def __missing__(self, path: str) -> str:
+        parts = path.rstrip("/").split("/")
+        for depth in range(len(parts), 0, -1):
+            code = dict.get(self, "/".join(parts[:depth]) + "/")
+            if code is not None:
+                return code
+        raise KeyError(path)
+
+    def get(self, path, default=None):
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+    def __contains__(self, path) -> bool:
+        return self.get(path) is not None
+
+
+# Git file mode of a symbolic link, as reported in porcelain v2 records
+GIT_SYMLINK_MODE = "120000"
+
+
+def clutil_iter_nul_records(stream, chunk_size: int = 65536) -> Iterator[str]:
+    """
+    Yields NUL-terminated records from a binary stream as they arrive.
+
+    Only the current chunk and any partial trailing record are held in
+    memory, so arbitrarily large outputs can be consumed incrementally.
+
+    Args:
+        stream: Binary file object to read from (e.g. a subprocess pipe).
+        chunk_size (int): Number of bytes to read per call.
+
+    Yields:
+        str: Each record, decoded with the filesystem encoding.
+    """
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        records = (pending + chunk).split(b"\0")
+        pending = records.pop()
+        for record in records:
+            yield os.fsdecode(record)
+    if pending:
+        yield os.fsdecode(pending)
+
+
+def clutil_parse_status_record(record: str, records: Iterator[str]) -> \
+        Optional[StatusEntry]:
+    """
+    Parses one porcelain v2 record into a StatusEntry.
+
+    Args:
+        record (str): The record to parse.
+        records (Iterator[str]): The remaining records; renames and copies
+                                 consume their source path from it.
+
+    Returns:
+        Optional[StatusEntry]: The parsed entry, or None for header lines
+                               and records that cannot be parsed.
+    """
+    kind_char = record[:1]
+
+    if kind_char == "1":
+        fields = record.split(" ", 8)
+        if len(fields) == 9:
+            code = fields[1].replace(".", " ")
+            is_symlink = GIT_SYMLINK_MODE in fields[3:6]
+            return StatusEntry("ordinary", code, fields[8],
+                               is_symlink=is_symlink)
+    elif kind_char == "2":
+        fields = record.split(" ", 9)
+        orig_path = next(records, None)
+        if len(fields) == 10:
+            code = fields[1].replace(".", " ")
+            kind = "copy" if fields[8].startswith("C") else "rename"
+            is_symlink = GIT_SYMLINK_MODE in fields[3:6]
+            return StatusEntry(kind, code, fields[9], orig_path,
+                               is_symlink=is_symlink)
+    elif kind_char == "u":
+        fields = record.split(" ", 10)
+        if len(fields) == 11:
+            is_symlink = GIT_SYMLINK_MODE in fields[3:7]
+            return StatusEntry("unmerged", fields[1], fields[10],
+                               is_symlink=is_symlink)
+    elif kind_char == "?":
+        return StatusEntry("untracked", "??", record[2:])
+    elif kind_char == "!":
+        return StatusEntry("ignored", "!!", record[2:])
+
+    # '#' headers and anything unrecognised
+    return None
+
+
+# Upper bound on the combined length of pathspecs passed to one Git
+# command. Windows limits a whole command line to 32767 characters.
+PATHSPEC_ARGV_BUDGET = 24000
+
+# Scoped status queries needing more Git invocations than this fall back
+# to a single full-tree scan, since every invocation reloads the index.
+PATHSPEC_MAX_CHUNKS = 8
+
+
+def clutil_chunk_pathspecs(paths: list[str],
+                           budget: int = PATHSPEC_ARGV_BUDGET) -> list[list[str]]:
+    """
+    Splits a list of paths into chunks that each fit on one command line.
+
+    Args:
+        paths (list[str]): Paths to split.
+        budget (int): Maximum combined length of the paths in one chunk.
+
+    Returns:
+        list[list[str]]: The chunks, in order. Empty if paths is empty.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for path in paths:
+        cost = len(path) + 1
+        if current and used + cost > budget:
+            chunks.append(current)
+            current = []
+            used = 0
+        current.append(path)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def clutil_run_git_status(cmd: list[str], cwd: Optional[Path] = None,
+                          env: Optional[dict] = None) -> Iterator[StatusEntry]:
+    """
+    Runs one porcelain v2 status command and streams its parsed entries.
+
+    Args:
+        cmd (list[str]): The full 'git status' command line.
+        cwd (Optional[Path]): Working directory for Git, if not the current.
+        env (Optional[dict]): Environment for Git, if not inherited.
+
+    Yields:
+        StatusEntry: One entry per record in the output.
+
+    Raises:
+        subprocess.CalledProcessError: If the command fails.
+    """
+    start = time.perf_counter()
+    # Streamed rather than run through clutil_run_git(), but traced the same
+    # pylint: disable-next=consider-using-with
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=cwd, env=env)
+    stdout = _CountingReader(proc.stdout)
+    finished = False
+    try:
+        records = clutil_iter_nul_records(stdout)
+        for record in records:
+            entry = clutil_parse_status_record(record, records)
+            if entry is not None:
+                yield entry
+        finished = True
+    finally:
+        if not finished:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+        if _GIT_TRACE.enabled:
+            _GIT_TRACE.record(cmd, time.perf_counter() - start, returncode,
+                              stdout.count, None)
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def clutil_iter_git_status(
+        untracked: str = "all",
+        paths: Optional[list[str]] = None,
+        write_index: bool = True) -> Iterator[StatusEntry]:
+    """
+    Streams 'git status --porcelain=v2 -z' as typed StatusEntry records.
+
+    The output is NUL-delimited, so paths containing spaces, ' -> ' or
+    newlines are reported exactly, and it is parsed while Git is still
+    writing it rather than buffered as one string. Closing the iterator
+    early terminates the Git process.
+
+    When paths are given, Git only inspects those paths, including the
+    untracked-file walk. They are passed as literal pathspecs relative to
+    the repository root, split across several Git invocations if they do
+    not fit on one command line ('git status' has no
+    '--pathspec-from-file').
+
+    Args:
+        untracked (str): Value for '--untracked-files' ('all', 'normal'
+                         or 'no').
+        paths (Optional[list[str]]): Repo-root relative paths to limit the
+                                     query to, or None for the whole tree.
+        write_index (bool): If False, Git does not write refreshed stat
+                            information back to the index
+                            ('--no-optional-locks').
+
+    Yields:
+        StatusEntry: One entry per changed, unmerged or untracked path.
+
+    Raises:
+        subprocess.CalledProcessError: If 'git status' fails.
+    """
+    cmd = ["git", "status", "--porcelain=v2", "-z",
+           f"--untracked-files={untracked}"]
+    if not write_index:
+        cmd.insert(1, "--no-optional-locks")
+
+    if paths is None:
+        yield from clutil_run_git_status(cmd)
+        return
+
+    git_root = clutil_get_git_root()
+    env = {**os.environ, "GIT_LITERAL_PATHSPECS": "1"}
+    for chunk in clutil_chunk_pathspecs(paths):
+        yield from clutil_run_git_status(cmd + ["--"] + chunk,
+                                         cwd=git_root, env=env)
+
+
+def clutil_sanitize_path(file_path: str, git_root: Path) -> Optional[str]:
+    """
+    Sanitizes and validates a file path for safe use with Git commands.
+
+    Args:
+        file_path (str): The file path to sanitize
+        git_root (Path): The root directory of the Git repository
+
+    Returns:
+        str | None: The sanitized path relative to git_root, or None if invalid
+    """
+    return clutil_sanitize_paths([file_path], git_root)[0]
+
+
+def clutil_sanitize_paths(file_paths: list[str],
+                          git_root: Path) -> list[Optional[str]]:
+    """
+    Sanitizes and validates many file paths for safe use with Git commands.
+
+    Gives the same result as resolving each path with Path.resolve(), but
+    the current directory is resolved once and the real path of each
+    parent directory is cached, so a batch of files in a few directories
+    costs about one lstat() per file.
+
+    Args:
+        file_paths (list[str]): Paths relative to the current directory,
+                                or absolute.
+        git_root (Path): The root directory of the Git repository
+
+    Returns:
+        list[Optional[str]]: For each input path, the sanitized path
+                             relative to git_root using forward slashes,
+                             or None if it is invalid or outside the
+                             repository.
+    """
+    cwd = str(Path.cwd().resolve())
+    root = str(git_root)
+    root_prefix = os.path.join(root, "")
+    real_parents = {}
+
+    # Basic security check: reject paths with dangerous characters
+    dangerous_chars = [';', '|', '&', '`', '$', '\n', '\r', '\0']
+
+    results = []
+    for file_path in file_paths:
+        try:
+            # Relative paths are taken relative to the current directory
+            parent, name = os.path.split(os.path.join(cwd, file_path))
+            if name in ("", ".", ".."):
+                real_path = os.path.realpath(os.path.join(parent, name))
+            else:
+                real_parent = real_parents.get(parent)
+                if real_parent is None:
+                    real_parent = real_parents[parent] = os.path.realpath(parent)
+                real_path = os.path.join(real_parent, name)
+                if os.path.islink(real_path):
+                    real_path = os.path.realpath(real_path)
+        except (OSError, ValueError):
+            # Any path resolution errors
+            results.append(None)
+            continue
+
+        # Ensure the path is within the Git repository
+        if real_path == root:
+            sanitized = "."
+        elif real_path.startswith(root_prefix):
+            # Convert to forward slashes (Git standard)
+            sanitized = real_path[len(root_prefix):].replace(os.sep, "/")
+        else:
+            results.append(None)
+            continue
+
+        if any(char in sanitized for char in dangerous_chars):
+            results.append(None)
+        else:
+            results.append(sanitized)
+
+    return results
+
+
+def clutil_read_pathspec_file(source: str, nul_separated: bool) -> list[str]:
+    """
+    Reads file paths from a file, or from standard input if source is '-'.
+
+    Args:
+        source (str): Path of the file to read, or '-' for standard input.
+        nul_separated (bool): If True, paths are separated by NUL bytes;
+                              otherwise there is one path per line.
+
+    Returns:
+        list[str]: The paths, without empty entries.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    if source == "-":
+        data = sys.stdin.buffer.read()
+    else:
+        with open(source, "rb") as file_handle:
+            data = file_handle.read()
+
+    if nul_separated:
+        records = data.split(b"\0")
+    else:
+        records = [line.rstrip(b"\r") for line in data.split(b"\n")]
+    return [os.fsdecode(record) for record in records if record]
+
+
+def clutil_is_pathspec_pattern(file_arg: str) -> bool:
+    """
+    Tells whether a file argument must be expanded by Git.
+
+    Pathspec magic (':(glob)...', ':(exclude)...', ':/...'), wildcards
+    that do not name an existing file, and directories are patterns;
+    everything else is taken as a literal file path.
+
+    Args:
+        file_arg (str): A FILE argument as given by the user.
+
+    Returns:
+        bool: True if the argument should go through
+              clutil_expand_pathspecs().
+    """
+    if file_arg.startswith(":"):
+        return True
+    if any(char in file_arg for char in "*?["):
+        return not os.path.lexists(file_arg)
+    return os.path.isdir(file_arg)
+
+
+def clutil_expand_pathspecs(pathspecs: list[str]) -> Optional[list[str]]:
+    """
+    Expands Git pathspecs to the files they match.
+
+    Only tracked files (including modified and deleted ones) and untracked
+    files that are not ignored are listed, using a single
+    'git ls-files --cached --others --exclude-standard' per chunk of
+    pathspecs. Git does not descend into ignored directories, so large
+    build output is never walked.
+
+    Args:
+        pathspecs (list[str]): Pathspecs relative to the current directory.
+
+    Returns:
+        Optional[list[str]]: Matching paths relative to the current
+                             directory, without duplicates, or None after
+                             printing an error.
+    """
+    cwd = Path.cwd().resolve()
+    git_root = clutil_get_git_root()
+    cmd = ["git", "ls-files", "-z", "--full-name", "--cached", "--others",
+           "--exclude-standard", "--"]
+
+    matches = {}
+    for chunk in clutil_chunk_pathspecs(pathspecs):
+        result = clutil_run_git(cmd + chunk, capture_output=True, check=False)
+        if result.returncode != 0:
+            message = os.fsdecode(result.stderr).strip()
+            print(f"Error: Invalid pathspec: {message}")
+            return None
+        for path in result.stdout.split(b"\0"):
+            if path:
+                matches[os.fsdecode(path)] = None
+
+    return [_relpath(git_root / path, cwd) for path in matches]
+
+
+def clutil_get_file_arguments(args: argparse.Namespace) -> Optional[list[str]]:
+    """
+    Collects the files a command operates on, from argv or a pathspec file.
+
+    Invalid combinations of arguments are usage errors, reported by
+    argparse with exit code 2 as if FILE were still a required argument.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments with 'files', 'stdin',
+                                   'pathspec_from_file', 'nul' and
+                                   'file_parser' attributes.
+
+    Returns:
+        Optional[list[str]]: The file paths, or None after printing an
+                             error.
+    """
+    parser = args.file_parser
+    source = "-" if args.stdin else args.pathspec_from_file
+    if args.stdin and args.pathspec_from_file:
+        parser.error("--stdin and --pathspec-from-file are mutually exclusive")
+    if source is None:
+        if args.nul:
+            parser.error("-z requires --stdin or --pathspec-from-file")
+        if not args.files:
+            parser.error("the following arguments are required: FILE")
+        return args.files
+    if args.files:
+        parser.error("cannot combine FILE arguments with --stdin or "
+                     "--pathspec-from-file")
+
+    try:
+        return clutil_read_pathspec_file(source, args.nul)
+    except OSError as error:
+        print(f"Error: Cannot read pathspec file: {error}")
+        return None
+
+
+def clutil_resolve_repo_path(path: str, git_root: Path) -> str:
+    """
+    Resolves symlinks in a repo-relative path.
+
+    Args:
+        path (str): Path relative to the repository root.
+        git_root (Path): The root directory of the Git repository.
+
+    Returns:
+        str: The resolved path relative to git_root, or the path unchanged
+             if it resolves to somewhere outside the repository.
+    """
+    abs_path = (git_root / path).resolve()
+    try:
+        return abs_path.relative_to(git_root).as_posix()
+    except ValueError:
+        return path
+
+
+# Maps the set of index stages present for an unmerged path to the
+# porcelain status code git status would show for it
+UNMERGED_STAGE_CODES = {
+    frozenset({1, 2, 3}): 'UU',
+    frozenset({2, 3}): 'AA',
+    frozenset({1}): 'DD',
+    frozenset({2}): 'AU',
+    frozenset({3}): 'UA',
+    frozenset({1, 3}): 'DU',
+    frozenset({1, 2}): 'UD',
+}
+
+
+def clutil_get_unmerged_status_map() -> dict[str, str]:
+    """
+    Get the merge-conflict status codes of all unmerged paths.
+
+    Reads only the index ('git ls-files --unmerged'), without scanning the
+    working tree, so it is cheap even in very large checkouts. Used to keep
+    merge-conflict refusal repository-wide when the rest of the status map
+    is limited to a few paths.
+
+    Returns:
+        dict[str, str]: Mapping of repo-root relative paths to conflict
+                        codes ('UU', 'AA', 'DD', 'AU', 'UA', 'DU', 'UD').
+    """
+    cmd = ["git", "ls-files", "--unmerged", "-z"]
+    try:
+        output = clutil_run_git(cmd, capture_output=True, check=True,
+                                cwd=clutil_get_git_root()).stdout
+    except subprocess.CalledProcessError as error:
+        print(f"Error getting git status: {error}")
+        sys.exit(1)
+
+    # Each record is '<mode> <object> <stage>\t<path>'
+    stages = {}
+    for record in output.split(b"\0"):
+        if not record:
+            continue
+        info, _, path = record.partition(b"\t")
+        stages.setdefault(os.fsdecode(path), set()).add(int(info.split()[2]))
+
+    return {path: UNMERGED_STAGE_CODES.get(frozenset(found), 'UU')
+            for path, found in stages.items()}
+
+
+# Format version of '.git/cl-status-cache.json'; older caches are ignored
+STATUS_CACHE_VERSION = 1
+
+
+def clutil_get_status_cache_file() -> Path:
+    """
+    Returns the path to the status cache file inside the Git directory.
+
+    Returns:
+        Path: Path to the '.git/cl-status-cache.json' file.
+    """
+    return clutil_get_repo_context().git_dir / "cl-status-cache.json"
+
+
+def clutil_query_fsmonitor(token: str) -> Optional[tuple[str, list[str]]]:
+    """
+    Asks the configured fsmonitor hook what changed since a token.
+
+    Only hooks speaking protocol version 2 can be queried; Git's built-in
+    fsmonitor daemon ('core.fsmonitor = true') has no stable client
+    interface, and version 1 hooks carry no token.
+
+    Args:
+        token (str): Token returned by an earlier query, or '' if none.
+
+    Returns:
+        Optional[tuple[str, list[str]]]: The new token and the paths
+            changed since the given one ('/' means everything may have
+            changed), or None if no usable hook is configured or it failed.
+    """
+    config = clutil_get_config()
+    hook = config.get("core.fsmonitor", "")
+    if (sys.platform == "win32" or not hook
+            or hook.lower() in ("true", "false", "yes", "no", "on", "off",
+                                "1", "0")
+            or config.get("core.fsmonitorhookversion", "2") != "2"):
+        return None
+
+    # Git runs the hook through the shell from the top of the working tree
+    result = subprocess.run(["sh", "-c", hook + ' "$@"', hook, "2", token],
+                            capture_output=True, check=False,
+                            cwd=clutil_get_git_root())
+    if result.returncode != 0:
+        return None
+
+    new_token, *changed = result.stdout.split(b"\0")
+    if not new_token:
+        return None
+    return os.fsdecode(new_token), [os.fsdecode(p) for p in changed if p]
+
+
+def clutil_status_untracked_mode() -> str:
+    """
+    Chooses the '--untracked-files' mode for cached whole-tree scans.
+
+    Git only uses its untracked cache ('core.untrackedCache') for
+    '--untracked-files=all' if 'status.showUntrackedFiles' is 'all' as
+    well; otherwise it would walk every untracked directory again. In that
+    case 'normal' is used and untracked directories are reported as one
+    'dir/' entry, which StatusMap resolves for the files inside them.
+
+    Returns:
+        str: 'normal' or 'all'.
+    """
+    config = clutil_get_config()
+    if clutil_config_bool("core.untrackedcache") and \
+            config.get("status.showuntrackedfiles", "").lower() != "all":
+        return "normal"
+    return "all"
+
+
+def clutil_get_excludes_file() -> Path:
+    """
+    Returns the global ignore file Git reads, from 'core.excludesFile'.
+
+    Without the setting Git falls back to '$XDG_CONFIG_HOME/git/ignore'
+    (or '~/.config/git/ignore'). A relative path is taken relative to the
+    repository root, where 'git status' runs.
+
+    Returns:
+        Path: Path of the ignore file, which need not exist.
+    """
+    configured = clutil_get_config().get("core.excludesfile")
+    if configured:
+        return clutil_get_git_root() / os.path.expanduser(configured)
+    xdg_home = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+    return Path(xdg_home) / "git" / "ignore"
+
+
+def clutil_status_fingerprint() -> dict:
+    """
+    Collects the repository state a cached status map depends on.
+
+    Covers the index (staging, 'git add', 'git reset'), HEAD (commits,
+    branch switches), '.git/info/exclude', the 'core.excludesFile' ignore
+    file and the untracked-files mode. Working-tree changes, including
+    edits to '.gitignore' files, are not part of it; they are reported
+    by the fsmonitor hook.
+
+    Returns:
+        dict: JSON-serialisable fingerprint, compared with '=='.
+    """
+    context = clutil_get_repo_context()
+    index_file = os.environ.get("GIT_INDEX_FILE") or context.git_dir / "index"
+
+    return {
+        "index": clutil_stat_key(index_file),
+        "head": context.head_oid,
+        "exclude": clutil_stat_key(context.git_common_dir / "info" / "exclude"),
+        "excludes_file": clutil_stat_key(clutil_get_excludes_file()),
+        "untracked": clutil_status_untracked_mode(),
+    }
+
+
+def clutil_load_status_cache() -> dict:
+    """
+    Loads the status cache, or an empty dict if it is missing or unusable.
+
+    Returns:
+        dict: The cache with 'fingerprint' and 'entries' keys, or {}.
+    """
+    if _DAEMON_CACHE is not None:
+        return _DAEMON_CACHE.get("status", {})
+    try:
+        with open(clutil_get_status_cache_file(), "r",
+                  encoding="utf-8") as file_handle:
+            cache = json.load(file_handle)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or \
+            cache.get("version") != STATUS_CACHE_VERSION:
+        return {}
+    return cache
+
+
+def clutil_save_status_cache(fingerprint: dict,
+                             entries: dict[str, str]) -> None:
+    """
+    Writes the status cache atomically.
+
+    The cache is only an optimisation, so write errors are ignored.
+
+    Args:
+        fingerprint (dict): State the entries were computed for, including
+                            the fsmonitor token.
+        entries (dict[str, str]): Unfiltered mapping of paths to codes.
+    """
+    import tempfile
+    if _DAEMON_CACHE is not None:
+        # A daemon keeps the cache in memory
+        _DAEMON_CACHE["status"] = {"version": STATUS_CACHE_VERSION,
+                                   "fingerprint": fingerprint,
+                                   "entries": entries}
+        return
+    cache_file = clutil_get_status_cache_file()
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+                "w", dir=cache_file.parent, prefix=".cl-status-cache.",
+                suffix=".tmp", delete=False, encoding="utf-8") as tmp:
+            tmp_path = tmp.name
+            json.dump({"version": STATUS_CACHE_VERSION,
+                       "fingerprint": fingerprint,
+                       "entries": entries}, tmp)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def clutil_scan_status_map(paths: Optional[list[str]] = None,
+                           untracked: str = "all",
+                           write_index: bool = True) -> dict[str, str]:
+    """
+    Runs 'git status' and maps every reported path to its status code.
+
+    Args:
+        paths (Optional[list[str]]): Repo-root relative paths to limit the
+                                     query to, or None for the whole tree.
+        untracked (str): Value for '--untracked-files'.
+        write_index (bool): Passed on to clutil_iter_git_status().
+
+    Returns:
+        dict[str, str]: Unfiltered mapping of paths to status codes.
+    """
+    git_root = clutil_get_git_root()
+    entries = {}
+    try:
+        for entry in clutil_iter_git_status(untracked=untracked, paths=paths,
+                                            write_index=write_index):
+            # Git already reports normalised, root-relative paths with
+            # forward slashes, so they are used as-is. Only symlinks need
+            # the filesystem, to match the resolved paths that
+            # clutil_sanitize_path() stores in changelists. Untracked
+            # records carry no mode, so those are checked with lstat().
+            rel_path = entry.path  # the new path for renames and copies
+            if entry.is_symlink or (entry.kind == "untracked"
+                                    and os.path.islink(git_root / rel_path)):
+                rel_path = clutil_resolve_repo_path(rel_path, git_root)
+            entries[rel_path] = entry.code
+    except subprocess.CalledProcessError as error:
+        print(f"Error getting git status: {error}")
+        sys.exit(1)
+    return entries
+
+
+def clutil_update_status_entries(
+        entries: dict[str, str], changed: list[str],
+        untracked: str) -> Optional[dict[str, str]]:
+    """
+    Re-queries the paths an fsmonitor hook reported as changed.
+
+    Entries for the changed paths (and anything below them) are dropped
+    and replaced by a 'git status' limited to those paths. A change inside
+    an untracked directory that was reported collapsed ('dir/') re-queries
+    the whole directory, since it may have become empty or stayed
+    untracked. A changed '.gitignore' needs a full scan.
+
+    Args:
+        entries (dict[str, str]): The cached status map.
+        changed (list[str]): Paths reported by the hook.
+        untracked (str): Value for '--untracked-files'.
+
+    Returns:
+        Optional[dict[str, str]]: The updated map, or None if a full scan
+                                  is needed instead.
+    """
+    if "/" in changed:
+        return None
+
+    paths = set()
+    for path in changed:
+        path = path.rstrip("/")
+        if path == ".git" or path.startswith(".git/"):
+            continue
+        # A changed ignore rule can hide or reveal untracked files
+        # anywhere below its directory, not just at the reported path
+        if path.rsplit("/", 1)[-1] == ".gitignore":
+            return None
+        # Renames are paired across paths, so a limited query could not
+        # reproduce them
+        if entries.get(path, "")[:1] in ("R", "C"):
+            return None
+        parts = path.split("/")
+        for depth in range(1, len(parts)):
+            if "/".join(parts[:depth]) + "/" in entries:
+                path = "/".join(parts[:depth])
+                break
+        paths.add(path)
+
+    if not paths:
+        return entries
+    paths = sorted(paths)
+    if len(clutil_chunk_pathspecs(paths)) > PATHSPEC_MAX_CHUNKS:
+        return None
+
+    def is_covered(key: str) -> bool:
+        parts = key.rstrip("/").split("/")
+        return any("/".join(parts[:depth]) in paths_set
+                   for depth in range(1, len(parts) + 1))
+
+    paths_set = set(paths)
+    updated = {key: code for key, code in entries.items()
+               if not is_covered(key)}
+    updated.update(clutil_scan_status_map(paths, untracked=untracked,
+                                          write_index=False))
+    return updated
+
+
+def clutil_get_cached_status_map() -> dict[str, str]:
+    """
+    Returns the whole-tree status map, reusing the status cache if valid.
+
+    The cache in '.git/cl-status-cache.json' is reused only when the
+    fingerprint from clutil_status_fingerprint() is unchanged. The
+    fsmonitor hook is then asked what changed since the stored token:
+    nothing means the cached map is returned as is, a list of paths means
+    only those are re-queried (clutil_update_status_entries()). Without a
+    queryable hook an edited file cannot be told apart from an unchanged
+    one, so the cache is bypassed and Git is asked every time.
+
+    Returns:
+        dict[str, str]: Unfiltered mapping of paths to status codes.
+    """
+    untracked = clutil_status_untracked_mode()
+    cache = clutil_load_status_cache()
+    cached_fingerprint = cache.get("fingerprint", {})
+    cached_token = cached_fingerprint.get("fsmonitor", "")
+    query = clutil_query_fsmonitor(cached_token)
+    if query is None:
+        return clutil_scan_status_map(untracked=untracked)
+
+    token, changed = query
+    before = clutil_status_fingerprint()
+    entries = None
+    if cached_fingerprint == {**before, "fsmonitor": cached_token}:
+        if not changed:
+            return cache["entries"]
+        entries = clutil_update_status_entries(cache["entries"], changed,
+                                               untracked)
+
+    # Without --no-optional-locks 'git status' would rewrite the index
+    # whenever it refreshes stat information (on every run while the
+    # fsmonitor token moves), changing the fingerprint it is cached under
+    if entries is None:
+        entries = clutil_scan_status_map(untracked=untracked,
+                                         write_index=False)
+    # Only store the result if nothing changed the index meanwhile
+    if clutil_status_fingerprint() == before:
+        clutil_save_status_cache({**before, "fsmonitor": token}, entries)
+    return entries
+
+
+def clutil_get_file_status_map(
+        show_all: bool = False,
+        paths: Optional[list[str]] = None,
+        warn_skipped: bool = True) -> dict[str, str]:
+    """
+    Get a mapping of files to their Git 2-letter status codes.
+
+    By default, only a predefined set of common status codes are included.
+    Files with uncommon status codes (e.g. merge conflicts, type changes)
+    are skipped and counted for a warning message — unless `--all` is used.
+
+    Ignored files are silently excluded from both the output and the
+    warning, since `git status --porcelain` does not include them unless
+    explicitly requested with `--ignored`.
+
+    Status is read through clutil_iter_git_status(), so the porcelain
+    output is parsed as it streams in and never held as a whole.
+
+    Commands that only act on the files of a changelist pass those files
+    as paths, so Git skips the rest of the working tree (including the
+    untracked walk). The scoped map still contains every unmerged path in
+    the repository, so clutil_refuse_on_merge_conflict() keeps working.
+
+    With 'git config cl.statusCache true', whole-tree maps are served from
+    clutil_get_cached_status_map(), which only re-queries what changed.
+    With Git's untracked cache enabled, such maps may list untracked
+    directories as a single 'dir/' entry.
+
+    Args:
+        show_all (bool): If True, include all files regardless of status code.
+        paths (Optional[list[str]]): Repo-root relative paths to limit the
+                                     query to, or None for the whole tree.
+        warn_skipped (bool): Print a note about skipped files; off for
+                             machine-readable output.
+
+    Returns:
+        dict[str, str]: Mapping of relative file paths
+                        to their Git status codes.
+    """
+    # Allowlist of known meaningful status codes
+    INTERESTING_CODES = {
+        '??', ' M', 'M ', 'MM', 'A ', 'AM', ' D', 'D ', 'R ', 'RM',
+        'UU', 'AA', 'DD', 'AU', 'UA', 'DU', 'UD',  # merge conflicts
+    }
+
+    status_map = StatusMap()
+    skipped = {}
+
+    if paths is not None:
+        if len(clutil_chunk_pathspecs(paths)) > PATHSPEC_MAX_CHUNKS:
+            paths = None
+        else:
+            status_map.update(clutil_get_unmerged_status_map())
+            if not paths:
+                return status_map
+
+    if paths is None and clutil_config_bool("cl.statuscache"):
+        entries = clutil_get_cached_status_map()
+    else:
+        entries = clutil_scan_status_map(paths)
+
+    for rel_path, code in entries.items():
+        if show_all or code in INTERESTING_CODES:
+            status_map[rel_path] = code
+        else:
+            skipped.setdefault(code, []).append(rel_path)
+
+    if skipped and not show_all and warn_skipped:
+        skipped_count = sum(len(v) for v in skipped.values())
+        print(f"Note: {skipped_count} file(s) with uncommon Git status codes "
+              "were not shown. Use 'git cl st --all' to include them.")
+
+    return status_map
+
+
+def clutil_format_file_status(
+        entry: FileStatus, git_root: Path, cwd: Path,
+        use_color: bool = True) -> str:
+    """
+    Format a file's Git status line with optional color-coded output.
+    Paths are shown relative to cwd, the resolved current directory.
+    """
+    file, status = entry.path, entry.code
+    rel_to_cwd = _relpath((git_root / file).resolve(), cwd)
+    if file.endswith("/"):
+        rel_to_cwd += "/"  # untracked directory reported as a whole
+
+    # Files which are deleted (committed) but still in a changelist
+    if status == "XX":
+        print(f"Warning: The file '{rel_to_cwd}' does not exist "
+              f"on the current branch.\n"
+              f"         Remove it from changelist with "
+              f"'git cl rm {rel_to_cwd}'.")
+
+    tag = f"[{status}]"
+
+    if not use_color:
+        return f"  {tag} {rel_to_cwd}"
+
+    staged, unstaged = status[0], status[1]
+
+
+    CONFLICT_CODES = {'UU', 'AA', 'DD', 'AU', 'UA', 'DU', 'UD'}
+
+    if status in CONFLICT_CODES:
+        color = Fore.RED
+    elif status == "??":
+        color = Fore.BLUE
+    elif staged == 'A':
+        color = Fore.GREEN
+    elif staged != " " and unstaged == " ":
+        color = Fore.GREEN
+    elif staged == " " and unstaged != " ":
+        color = Fore.RED
+    elif staged != " " and unstaged != " ":
+        color = Fore.MAGENTA
+    else:
+        color = Style.RESET_ALL
+
+    return f"{color}  {tag} {rel_to_cwd}{Style.RESET_ALL}"
+
+
+def clutil_read_commit_message_file(file_path: str) -> str:
+    """
+    Reads a commit message from a file, with validation and processing.
+
+    Args:
+        file_path (str): Path to the file containing the commit message
+
+    Returns:
+        str: The commit message content
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is empty or contains only whitespace
+    """
+    try:
+        # Resolve path relative to current working directory
+        path = Path(file_path).resolve()
+
+        # Basic security check - ensure file exists and is readable
+        if not path.exists():
+            raise OSError(f"File does not exist: {file_path}")
+
+        if not path.is_file():
+            raise OSError(f"Path is not a file: {file_path}")
+
+        # Reasonable size limit for commit messages (generous 64KB)
+        if path.stat().st_size > 64 * 1024:
+            raise ValueError("Commit message file too large (>64KB)")
+
+        # Read the file
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read(64 * 1024)  # Enforce the same limit
+
+    except (OSError, UnicodeDecodeError) as error:
+        raise OSError(f"Cannot read file: {error}") from error
+
+    # Validate content
+    if not content or not content.strip():
+        raise ValueError(
+            "Commit message file is empty or contains only whitespace")
+
+    # Process the content similar to how Git does it:
+    # - Strip trailing whitespace from each line
+    # - Remove trailing empty lines
+    lines = [line.rstrip() for line in content.splitlines()]
+
+    # Remove trailing empty lines
+    while lines and not lines[-1]:
+        lines.pop()
+
+    if not lines:
+        raise ValueError(
+            "Commit message file contains no content after processing")
+
+    # Join lines back together
+    processed_content = '\n'.join(lines)
+
+    return processed_content
+
+
+def clutil_is_file_untracked(
+        file_path_rel_to_git_root: str, git_root: Path) -> bool:
+    """
+    Check if a file (specified relative to git root) is untracked.
+
+    Args:
+        file_path_rel_to_git_root: File path relative to git repository root
+        git_root: Absolute path to git repository root
+
+    Returns:
+        True if the file is untracked, False if it's tracked
+    """
+    # Get absolute path of the file we're checking
+    abs_file_path = (git_root / file_path_rel_to_git_root).resolve()
+
+    # Check untracked files and directories
+    try:
+        with closing(clutil_iter_git_status(untracked="all")) as entries:
+            for entry in entries:
+                if entry.kind != "untracked":
+                    continue
+                abs_untracked = (git_root / entry.path).resolve()
+
+                # Direct match for files
+                if abs_file_path == abs_untracked:
+                    return True
+
+                # Check if file is under an untracked directory
+                if (
+                    abs_untracked.is_dir()
+                    and abs_file_path.is_relative_to(abs_untracked)
+                ):
+                    return True
+    except subprocess.CalledProcessError as error:
+        print(f"Error getting git status: {error}")
+        sys.exit(1)
+
+    return False
+
+
+def clutil_is_file_untracked_cached(
+        file_path_rel_to_git_root: str,
+        status_map: dict[str, str]) -> bool:
+    """
+    Check if a file is untracked using a precomputed status map.
+
+    This is a faster alternative to clutil_is_file_untracked for use
+    inside loops, avoiding a separate `git status` shellout per file.
+    The caller is responsible for obtaining the status map once via
+    clutil_get_file_status_map(show_all=True) before the loop.
+
+    Args:
+        file_path_rel_to_git_root: File path relative to git repository root
+        status_map: Precomputed status map from clutil_get_file_status_map
+
+    Returns:
+        True if the file is untracked, False otherwise.
+    """
+    return status_map.get(file_path_rel_to_git_root, "  ") == "??"
+
+
+def clutil_detect_merge_conflicts(status_map: dict[str, str]) -> list[str]:
+    """
+    Return a list of files currently in a merge-conflict (unmerged) state.
+
+    Unmerged status codes per git-status(1):
+      UU - both sides modified
+      AA - both sides added
+      DD - both sides deleted
+      AU - added by us, modified by them
+      UA - added by them, modified by us
+      DU - deleted by us, modified by them
+      UD - modified by us, deleted by them
+
+    A file in any of these states cannot be safely staged, committed,
+    stashed, or checked out via git-cl while the merge is unresolved.
+
+    Args:
+        status_map: Precomputed status map from clutil_get_file_status_map
+
+    Returns:
+        Sorted list of file paths (relative to git root) in a conflict state.
+    """
+    conflict_codes = {'UU', 'AA', 'DD', 'AU', 'UA', 'DU', 'UD'}
+    return sorted(path for path, code in status_map.items()
+                  if code in conflict_codes)
+
+
+def clutil_refuse_on_merge_conflict(
+        status_map: dict[str, str], operation: str) -> bool:
+    """
+    Check for merge conflicts and print a refusal message if any are found.
+
+    Used at the top of state-mutating commands (stage, unstage, commit,
+    stash, checkout) to bail out cleanly rather than letting git produce
+    cryptic errors or leave the repo in an inconsistent state.
+
+    Args:
+        status_map: Precomputed status map from clutil_get_file_status_map
+        operation: Short verb for the error message (e.g. 'stage', 'commit')
+
+    Returns:
+        True if a conflict was detected and the caller should return.
+        False if the caller may proceed.
+    """
+    message = clutil_merge_conflict_message(status_map, operation)
+    if message is None:
+        return False
+
+    print(message)
+    return True
+
+
+def clutil_merge_conflict_message(
+        status_map: dict[str, str], operation: str) -> Optional[str]:
+    """
+    Build the refusal message for an operation blocked by merge conflicts.
+
+    Args:
+        status_map: Precomputed status map from clutil_get_file_status_map
+        operation: Short verb for the error message (e.g. 'stage', 'commit')
+
+    Returns:
+        The message, or None if there are no merge conflicts.
+    """
+    conflicts = clutil_detect_merge_conflicts(status_map)
+    if not conflicts:
+        return None
+
+    lines = [f"Error: Cannot {operation} while merge conflicts are unresolved.",
+             "The following files have conflicts:"]
+    lines += [f"  [{status_map[path]}] {path}" for path in conflicts]
+    lines += ["\nResolve conflicts first:",
+              "  1. Edit the files to resolve conflicts",
+              "  2. Stage resolved files: git add <files>",
+              "  3. Complete the merge: git commit",
+              "\nOr abort the merge: git merge --abort"]
+    return "\n".join(lines)
+
+
+# With 'git config cl.stashRefs true', each stashed changelist is kept
+# under its own ref here instead of in refs/stash
+CL_STASH_REF_PREFIX = "refs/cl-stash/"
+
+
+def clutil_stash_ref_name(name: str) -> Optional[str]:
+    """
+    Returns the ref under CL_STASH_REF_PREFIX for a changelist's stash.
+
+    clutil_validate_name() allows letters, digits, '-', '_' and '.', so
+    only names with a dot can break Git's ref name rules (a '.lock'
+    suffix, '..', a leading or trailing dot). Only those are checked
+    with 'git check-ref-format'.
+
+    Args:
+        name: Changelist name
+
+    Returns:
+        The ref name, or None if Git does not accept it as one.
+    """
+    ref = CL_STASH_REF_PREFIX + name
+    if "." in name and clutil_run_git(["git", "check-ref-format", ref],
+                                      capture_output=True,
+                                      check=False).returncode != 0:
+        return None
+    return ref
+
+
+def clutil_ref_exists(ref: str) -> bool:
+    """Returns True if the given full ref name exists."""
+    return clutil_run_git(["git", "rev-parse", "-q", "--verify", ref],
+                          capture_output=True, check=False).returncode == 0
+
+
+def clutil_get_stash_file() -> Path:
+    """
+    Returns the path to the stash metadata file inside the Git directory.
+
+    Returns:
+        Path: Path to the '.git/cl-stashes.json' file.
+    """
+    return clutil_get_repo_context().git_dir / "cl-stashes.json"
+
+
+def clutil_load_stashes(lock: bool = True) -> StashStore:
+    """
+    Loads stash metadata from the 'cl-stashes.json' file.
+
+    Takes a shared lock unless lock is False; see clutil_load().
+
+    Args:
+        lock (bool): If False, read without taking the lock.
+
+    Returns:
+        StashStore: A mapping of stashed changelist names to their
+                    metadata, with a reverse index from file to stash.
+    """
+    stash_file = clutil_get_stash_file()
+    lock_file = stash_file.with_suffix('.lock')
+    if not stash_file.exists():
+        return StashStore()
+
+    try:
+        if not lock:
+            return clutil_daemon_cached("stashes", [stash_file],
+                                        clutil_read_stashes)
+        with clutil_file_lock(lock_file, shared=True):
+            return clutil_read_stashes()
+    except (json.JSONDecodeError, OSError) as error:
+        print(f"Error reading stash metadata: {error}")
+        return StashStore()
+
+
+def clutil_read_stashes() -> StashStore:
+    """
+    Reads 'cl-stashes.json' without locking.
+
+    Returns:
+        StashStore: The stash metadata, empty if the file does not exist.
+
+    Raises:
+        OSError: If the file exists but cannot be read.
+        json.JSONDecodeError: If the file is not valid JSON.
+    """
+    stash_file = clutil_get_stash_file()
+    if not stash_file.exists():
+        return StashStore()
+    with open(stash_file, "r", encoding="utf-8") as file_handle:
+        return StashStore(json.load(file_handle))
+
+
+def clutil_save_stashes(data: dict[str, dict]) -> None:
+    """
+    Saves the stash metadata to 'cl-stashes.json'.
+
+    Writes are atomic: the data is first written to a temporary file in the
+    same directory, then renamed over the target. If the process is
+    interrupted mid-write, the original file is left untouched.
+
+    Args:
+        data (dict): Mapping of stashed changelist names to metadata.
+    """
+    stash_file = clutil_get_stash_file()
+    lock_file = stash_file.with_suffix('.lock')
+    with clutil_file_lock(lock_file):
+        try:
+            clutil_write_json_atomic(stash_file, data)
+        except OSError as error:
+            print(f"Error saving stash metadata: {error}")
+
+
+class MetadataTransaction:
+    """
+    Changelists and stash metadata loaded together for a single update.
+
+    Created by clutil_metadata_transaction(), which holds both metadata
+    locks while it is in use. Mutate 'changelists' and 'stashes' in place,
+    then call commit(); changes still pending when the block ends are
+    committed then.
+
+    Attributes:
+        changelists (ChangelistStore): The active changelists.
+        stashes (StashStore): The stashed changelists.
+    """
+
+    def __init__(self, changelists: ChangelistStore, stashes: StashStore):
+        self.changelists = changelists
+        self.stashes = stashes
+        self._changelists_before: dict[str, list[str]] = {}
+        self._stashes_before: dict[str, dict] = {}
+        self._snapshot()
+
+    def _snapshot(self) -> None:
+        import copy
+        self._changelists_before = {name: list(files) for name, files
+                                    in self.changelists.items()}
+        self._stashes_before = copy.deepcopy(dict(self.stashes))
+
+    def commit(self) -> None:
+        """
+        Writes the documents that changed since loading or the last commit.
+
+        Stash metadata is written before the changelists, each flushed to
+        disk before it is renamed into place. If the changelists cannot be
+        written, the previous stash metadata is put back, so either both
+        documents are updated or neither is.
+
+        Raises:
+            OSError: If the metadata cannot be written.
+            json.JSONDecodeError: If cl.json is corrupt when the journal
+                                  is compacted.
+        """
+        stash_file = clutil_get_stash_file()
+        stashes_changed = self.stashes != self._stashes_before
+        changelists_changed = self.changelists != self._changelists_before
+
+        if stashes_changed:
+            clutil_write_json_atomic(stash_file, self.stashes, sync=True)
+        if changelists_changed:
+            try:
+                clutil_store_changelists(self.changelists, sync=True)
+            except (OSError, json.JSONDecodeError):
+                if stashes_changed:
+                    clutil_write_json_atomic(stash_file, self._stashes_before,
+                                             sync=True)
+                raise
+        else:
+            self.changelists.journal = []
+        if stashes_changed or changelists_changed:
+            clutil_fsync_directory(stash_file.parent)
+        self._snapshot()
+
+    def rollback(self) -> None:
+        """Discards the changes made since loading or the last commit."""
+        import copy
+        self.changelists = ChangelistStore(
+            {name: list(files) for name, files
+             in self._changelists_before.items()})
+        self.stashes = StashStore(copy.deepcopy(self._stashes_before))
+
+
+@contextmanager
+def clutil_metadata_transaction() -> Iterator[MetadataTransaction]:
+    """
+    Loads changelists and stash metadata once, under one lock, for an update.
+
+    Both metadata locks are taken exclusively for the whole block, always
+    the changelist lock first, so concurrent transactions cannot deadlock
+    and no other git-cl process can change either file in between. If the
+    block raises, nothing that was not already committed is written.
+
+    Yields:
+        MetadataTransaction: The loaded metadata.
+
+    Example:
+        >>> with clutil_metadata_transaction() as txn:
+        ...     txn.stashes[name] = metadata
+        ...     del txn.changelists[name]
+    """
+    with clutil_file_lock(clutil_get_file().with_suffix('.lock')), \
+            clutil_file_lock(clutil_get_stash_file().with_suffix('.lock')):
+        txn = MetadataTransaction(clutil_load(), clutil_load_stashes())
+        yield txn
+        try:
+            txn.commit()
+        except (OSError, json.JSONDecodeError) as error:
+            print(f"Error saving metadata: {error}")
+
+
+def clutil_check_files_unstaged(files: list[str],
+                                git_root: Path) -> tuple[list[str], list[str]]:
+    """
+    Check which files in the list have staged vs unstaged changes.
+
+    Args:
+        files: List of file paths relative to git root
+        git_root: Path to git repository root
+
+    Returns:
+        tuple: (unstaged_files, staged_files)
+               files that can/cannot be stashed
+    """
+    status_map = clutil_get_file_status_map(show_all=True, paths=files)
+
+    unstaged_files = []
+    staged_files = []
+
+    for file_path in files:
+        abs_path = (git_root / file_path).resolve()
+        if not abs_path.exists():
+            continue
+
+        rel_to_git_root = abs_path.relative_to(git_root).as_posix()
+        status = status_map.get(rel_to_git_root, "  ")
+
+        # Check if file has staged changes (first character is not space)
+        if status[0] != " ":
+            staged_files.append(file_path)
+        else:
+            unstaged_files.append(file_path)
+
+    return unstaged_files, staged_files
+
+
+# Git status analysis for unstash conflicts
+# Maps (staged_char, unstaged_char) -> (is_conflict, description)
+UNSTASH_STATUS_ANALYSIS = {
+    ('?', '?'): (True, "untracked file blocking stash restoration"),
+    (' ', 'M'): (True, "modified in working directory"),
+    (' ', 'D'): (True, "deleted in working directory"),
+    ('A', ' '): (False, "staged for addition (safe)"),
+    ('M', ' '): (False, "staged modifications (safe)"),
+    ('D', ' '): (False, "staged for deletion (safe)"),
+    ('R', ' '): (False, "staged rename (safe)"),
+    (' ', ' '): (False, "clean (ready for unstash)"),
+}
+
+
+def clutil_analyze_file_status_for_unstash(status: str) -> tuple[bool, str]:
+    """
+    Analyze a Git status code to determine unstash conflicts.
+
+    Args:
+        status: 2-character Git status code
+
+    Returns:
+        Tuple of (is_conflict, description)
+    """
+    if len(status) != 2:
+        return False, "unknown status"
+
+    staged, unstaged = status[0], status[1]
+
+    # Check direct lookup first
+    if (staged, unstaged) in UNSTASH_STATUS_ANALYSIS:
+        return UNSTASH_STATUS_ANALYSIS[(staged, unstaged)]
+
+    # Handle remaining cases with simple logic
+    if unstaged in ['M', 'D']:
+        if unstaged == 'M':
+            conflict_desc = "modified in working directory"
+        else:
+            conflict_desc = "deleted in working directory"
+        return True, conflict_desc
+
+    if staged in ['A', 'M', 'D', 'R']:
+        stage_desc = {
+            'A': "staged for addition (safe)",
+            'M': "staged modifications (safe)",
+            'D': "staged for deletion (safe)",
+            'R': "staged rename (safe)"
+        }
+        return False, stage_desc.get(staged, "staged changes (safe)")
+
+    return False, "clean (ready for unstash)"
+
+
+def clutil_check_unstash_conflicts_optimized(
+        files: list[str], git_root: Path,
+        status_map: Optional[dict[str, str]] = None
+) -> tuple[list[str], dict[str, str]]:
+    """
+    Check for conflicts optimized for the stash-branch-unstash workflow.
+
+    In the intended workflow:
+    1. Stash changelists → clean working directory
+    2. Create/switch to feature branch
+    3. Unstash specific changelist → should be conflict-free
+
+    This function focuses on detecting only the conflicts that actually matter
+    in this workflow, rather than being overly conservative.
+
+    Args:
+        files: List of file paths relative to git root that were stashed
+        git_root: Path to git repository root
+        status_map: Status already read for these files; queried when None
+
+    Returns:
+        tuple: (real_conflicts, file_status_info) where:
+        - real_conflicts: Files that will actually prevent unstashing
+        - file_status_info: Dict of file -> status description for user info
+    """
+    if status_map is None:
+        status_map = clutil_get_file_status_map(show_all=True, paths=files)
+    real_conflicts = []
+    file_status_info = {}
+
+    for file_path in files:
+        abs_path = (git_root / file_path).resolve()
+
+        if not abs_path.exists():
+            # File doesn't exist - this is actually GOOD for unstashing
+            # The stash will restore it without conflict
+            file_status_info[file_path] = "missing (will be restored)"
+            continue
+
+        rel_to_git_root = abs_path.relative_to(git_root).as_posix()
+        status = status_map.get(rel_to_git_root, "  ")
+
+        # Use the lookup table for clean analysis
+        is_conflict, description = clutil_analyze_file_status_for_unstash(status)
+
+        if is_conflict:
+            real_conflicts.append(file_path)
+
+        file_status_info[file_path] = description
+
+    return real_conflicts, file_status_info
+
+
+def clutil_suggest_workflow_actions(
+        conflicting_files: list[str],
+        file_status_info: dict[str, str]) -> None:
+    """
+    Provide workflow-specific suggestions for resolving conflicts.
+
+    Args:
+        conflicting_files: Files that have real conflicts
+        file_status_info: Status information for all files
+    """
+    if not conflicting_files:
+        return
+
+    print("Workflow suggestions to resolve conflicts:")
+
+    untracked_conflicts = []
+    modified_conflicts = []
+    deleted_conflicts = []
+
+    for file_path in conflicting_files:
+        status_desc = file_status_info[file_path]
+        if "untracked" in status_desc:
+            untracked_conflicts.append(file_path)
+        elif "modified in working" in status_desc:
+            modified_conflicts.append(file_path)
+        elif "deleted in working" in status_desc:
+            deleted_conflicts.append(file_path)
+
+    if untracked_conflicts:
+        print("\n  Untracked files blocking stash restoration:")
+        for file_path in untracked_conflicts:
+            print(f"    {file_path}")
+        print("  → Solution: Move, rename, or delete these untracked files")
+
+    if modified_conflicts:
+        print("\n  Working directory modifications:")
+        for file_path in modified_conflicts:
+            print(f"    {file_path}")
+        print("  → Solution: Stage/commit these changes or revert them")
+        print(f"    git add {' '.join(modified_conflicts)} "
+              "&& git commit -m 'Save current work'")
+        print(f"    # OR: git checkout -- {' '.join(modified_conflicts)}")
+
+    if deleted_conflicts:
+        print("\n  Files deleted in working directory:")
+        for file_path in deleted_conflicts:
+            print(f"    {file_path}")
+        print("  → Solution: If intentional, stage the deletions;"
+              "if not, restore the files")
+        print(f"    git rm {' '.join(deleted_conflicts)} "
+              "&& git commit -m 'Remove files'")
+        print(f"    # OR: git checkout HEAD -- {' '.join(deleted_conflicts)}")
+
+
+def clutil_get_current_branch() -> Optional[str]:
+    """
+    Get the name of the current Git branch.
+
+    Returns:
+        Branch name or None if not on a branch (detached HEAD)
+    """
+    return clutil_get_repo_context().branch
+
+
+@contextmanager
+def clutil_safe_stash_context(git_root: Path) -> Iterator[None]:
+    """
+    Context manager to handle directory changes during stash operations.
+
+    Runs the block from the git root, then returns to the original
+    directory, or explains what happened if stashing removed it.
+
+    Args:
+        git_root: Path to git repository root
+    """
+    original_cwd = Path.cwd().resolve()
+
+    # Change to git root
+    os.chdir(git_root)
+
+    try:
+        yield
+    finally:
+        # Try to restore original directory
+        if original_cwd.exists():
+            os.chdir(original_cwd)
+        else:
+            # Directory was deleted - warn user and stay in git root
+            try:
+                rel_path = _relpath(original_cwd, git_root)
+                print(f"Note: Directory '{rel_path}' was removed by git stash.")
+                print("Your shell is still pointing to the deleted directory.")
+                print("Please run: cd ..")
+            except (ValueError, OSError):
+                print("Note: Your working directory was removed by git stash.")
+                print("Your shell is still pointing to the deleted directory.")
+                print("Please run: cd ..")
+
+
+def clutil_get_stash_source_branch(stash_data: dict) -> Optional[str]:
+    """
+    Extract the branch name from stash metadata if stored.
+
+    Args:
+        stash_data: Stash metadata dictionary
+
+    Returns:
+        Branch name or None if not available
+    """
+    return stash_data.get('source_branch')
+
+
+def clutil_find_stash_by_message(message: str) -> Optional[str]:
+    """
+    Find a stash reference by its commit message.
+
+    Args:
+        message: The stash message to search for
+
+    Returns:
+        The stash reference (e.g. "stash@{0}") or None if not found
+    """
+    try:
+        stash_list = clutil_git_output(["git", "stash", "list"], text=True)
+        for line in stash_list.strip().split('\n'):
+            if line and message in line:
+                return line.split(':')[0]
+    except subprocess.CalledProcessError:
+        pass
+    return None
+
+
+def clutil_create_unique_stash_message(changelist_name: str) -> str:
+    """
+    Create a unique stash message that includes changelist name and timestamp.
+    This helps identify our stashes even when mixed with user-created stashes.
+
+    Args:
+        changelist_name: Name of the changelist being stashed
+
+    Returns:
+        Unique stash message string
+    """
+    import datetime
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"git-cl-stash:{changelist_name}:{timestamp}"
+
+
+def clutil_parse_stash_message(
+        stash_message: str) -> Optional[tuple[str, str]]:
+    """
+    Parse our stash message format to extract changelist name and timestamp.
+
+    Args:
+        stash_message: The stash message to parse
+
+    Returns:
+        Tuple of (changelist_name, timestamp) or None if not our format
+    """
+    if stash_message.startswith("git-cl-stash:"):
+        try:
+            parts = stash_message.split(":")
+            if len(parts) >= 3:
+                changelist_name = parts[1]
+                timestamp = parts[2]
+                return changelist_name, timestamp
+        except (IndexError, ValueError):
+            pass
+    return None
+
+
+def clutil_find_stash_by_message_substring(
+        message_substring: str) -> Optional[str]:
+    """
+    Find a stash reference by searching for a substring in stash messages.
+
+    Args:
+        message_substring: Part of the stash message to search for
+
+    Returns:
+        The stash reference (e.g. "stash@{2}") or None if not found
+    """
+    try:
+        stash_list = clutil_git_output(["git", "stash", "list"], text=True)
+        for line in stash_list.strip().split('\n'):
+            if line and message_substring in line:
+                # Extract stash reference from format:
+                # "stash@{0}: WIP on main: abc1234 message"
+                stash_ref = line.split(':')[0].strip()
+                return stash_ref
+    except subprocess.CalledProcessError:
+        pass
+    return None
+
+
+def clutil_rollback_stash(stash_ref: str, changelist_name: str) -> bool:
+    """
+    Attempt to rollback a stash creation by dropping the stash.
+
+    Args:
+        stash_ref: The stash reference to drop (e.g. "stash@{0}")
+        changelist_name: Name of changelist for error reporting
+
+    Returns:
+        True if rollback succeeded, False otherwise
+    """
+    if stash_ref.startswith(CL_STASH_REF_PREFIX):
+        cmd = ["git", "update-ref", "-d", stash_ref]
+    else:
+        cmd = ["git", "stash", "drop", stash_ref]
+    try:
+        # Attempt to drop the stash
+        clutil_run_git(cmd, check=True, capture_output=True, text=True)
+        print(f"Rolled back stash {stash_ref} due to metadata save failure.")
+        return True
+    except subprocess.CalledProcessError as error:
+        print(f"Warning: Could not rollback stash {stash_ref}: {error}")
+        print(f"You may need to manually clean up stash for changelist "
+              f"'{changelist_name}'")
+        return False
+
+
+def clutil_stash_all_changelists(
+    changelists: dict[str, list[str]],
+    quiet: bool = False,
+    status_map: Optional[dict[str, str]] = None
+) -> list[str]:
+    """
+    Helper function to stash all active changelists.
+
+    The changelists are stashed as one batch: their files are disjoint, so
+    Git status is computed once for all of them. Each changelist becomes
+    one stash entry, created without touching the working tree; the
+    metadata is then written once, and only after that are the files of
+    all stashed changelists reset in one step.
+
+    Args:
+        changelists: Dictionary of active changelists
+        quiet: If True, suppress verbose output for workflow contexts
+        status_map: Status already read for the changelists' files (and
+                    every unmerged path); queried when None
+
+    Returns:
+        The paths that were stashed and reset to HEAD, empty if nothing
+        was stashed
+    """
+    if not changelists:
+        if not quiet:
+            print("No active changelists found.")
+        return []
+
+    # Get current branch for tracking
+    current_branch = clutil_get_current_branch()
+
+    if not quiet:
+        print(f"Stashing all active changelists from branch "
+              f"'{current_branch or 'detached HEAD'}':")
+
+    # Sort changelists by name for predictable order, skipping empty ones
+    names = sorted(name for name, files in changelists.items() if files)
+
+    with clutil_metadata_transaction() as txn:
+        if status_map is None:
+            all_files = [file_path for name in names
+                         for file_path in txn.changelists.get(name, [])]
+            status_map = clutil_get_file_status_map(show_all=True,
+                                                    paths=all_files)
+
+        if clutil_refuse_on_merge_conflict(status_map, "stash"):
+            return []
+
+        git_root = clutil_get_git_root()
+        pushed = []
+
+        try:
+            with clutil_stash_builder(git_root) as builder:
+                for cl_name in names:
+                    if not quiet:
+                        print(f"\n--- Stashing '{cl_name}' ---")
+
+                    error_msg = clutil_validate_stash_preconditions(
+                        cl_name, txn.changelists, txn.stashes)
+                    if error_msg:
+                        print(error_msg)
+                        continue
+
+                    files = txn.changelists[cl_name]
+                    result = clutil_push_changelist_stash(
+                        cl_name, files, status_map, git_root, builder,
+                        quiet=quiet)
+                    if result:
+                        pushed.append((cl_name, files, result))
+        except (subprocess.CalledProcessError, ValueError) as error:
+            print(f"Error creating stash: {error}")
+
+        # Every push onto refs/stash lands on stash@{0}, so of k pushes
+        # the i-th is now stash@{k-1-i}. Changelists whose name is not a
+        # valid ref name use refs/stash even with cl.stashRefs.
+        later_pushes = sum(not result[0].startswith(CL_STASH_REF_PREFIX)
+                           for _, _, result in pushed)
+        for cl_name, files, result in pushed:
+            stash_ref, stash_oid, file_categories, _ = result
+            if not stash_ref.startswith(CL_STASH_REF_PREFIX):
+                later_pushes -= 1
+                stash_ref = f"stash@{{{later_pushes}}}"
+            txn.stashes[cl_name] = clutil_build_stash_metadata(
+                cl_name, stash_ref, stash_oid, files, file_categories,
+                current_branch)
+            del txn.changelists[cl_name]
+
+        try:
+            txn.commit()
+        except (OSError, json.JSONDecodeError) as error:
+            print(f"Error during atomic operation: {error}")
+            txn.rollback()
+            print("Metadata was not changed.")
+            # Drop the newest stash first, so each is stash@{0} in turn
+            for cl_name, _, (stash_ref, _, _, _) in reversed(pushed):
+                clutil_rollback_stash(stash_ref, cl_name)
+            return []
+
+        stashed_paths = [file_path for _, _, (_, _, _, stashable) in pushed
+                         for file_path in stashable]
+        clutil_finish_stash(stashed_paths, status_map, git_root)
+
+    if not quiet:
+        for cl_name, _, (_, _, file_categories, stashable_files) in pushed:
+            clutil_print_stash_success(cl_name, stashable_files,
+                                       file_categories, current_branch)
+        print(
+            f"\nStashed {len(pushed)}/{len(names)} "
+            "changelists successfully."
+        )
+        if pushed:
+            print("Working directory should now be clean for branch operations.")
+            print("Use 'git cl unstash <changelist>' to restore individual "
+                  "changelists to feature branches.")
+    return stashed_paths
+
+
+def clutil_migrate_stash_refs() -> None:
+    """
+    Move stashed changelists from refs/stash to their own refs.
+
+    Each stash entry recorded in the metadata gets a ref under
+    CL_STASH_REF_PREFIX, the metadata is updated, and only then are the
+    entries dropped from refs/stash, highest position first so the
+    remaining positions stay valid.
+    """
+    with clutil_metadata_transaction() as txn:
+        pending = sorted(name for name, data in txn.stashes.items()
+                         if not data.get("stash_ref", "").startswith(
+                             CL_STASH_REF_PREFIX))
+        if not pending:
+            print("No stashed changelists to migrate.")
+            return
+
+        result = clutil_run_git(["git", "reflog", "show", "--format=%H",
+                                 "refs/stash", "--"],
+                                capture_output=True, text=True, check=False)
+        reflog = result.stdout.split() if result.returncode == 0 else []
+
+        positions = {}
+        for name in pending:
+            if clutil_stash_ref_name(name) is None:
+                print(f"Note: '{name}' is not a valid Git ref name, so its "
+                      "stash stays in refs/stash.")
+                continue
+            stash_oid = txn.stashes[name].get("stash_oid")
+            if stash_oid in reflog:
+                positions[name] = reflog.index(stash_oid)
+                continue
+            # Metadata from older versions only has the message
+            stash_ref = clutil_find_stash_by_message_substring(
+                f"git-cl-stash:{name}:")
+            if stash_ref and stash_ref[7:-1].isdigit() and \
+                    int(stash_ref[7:-1]) < len(reflog):
+                positions[name] = int(stash_ref[7:-1])
+            else:
+                print(f"Warning: Stash for changelist '{name}' no longer "
+                      f"exists, skipped.")
+
+        try:
+            for name, index in positions.items():
+                clutil_run_git(["git", "update-ref", "-m",
+                                f"git-cl: move stash of '{name}'",
+                                CL_STASH_REF_PREFIX + name, reflog[index], ""],
+                               capture_output=True, text=True, check=True)
+                txn.stashes[name]["stash_ref"] = CL_STASH_REF_PREFIX + name
+                txn.stashes[name]["stash_oid"] = reflog[index]
+            txn.commit()
+        except (subprocess.CalledProcessError, OSError) as error:
+            print(f"Error migrating stashes: {error}")
+            txn.rollback()
+            return
+
+    for index in sorted(positions.values(), reverse=True):
+        clutil_run_git(["git", "stash", "drop", "-q", f"stash@{{{index}}}"],
+                       capture_output=True, text=True, check=False)
+
+    print(f"Moved {len(positions)} stashed changelist(s) to "
+          f"{CL_STASH_REF_PREFIX}.")
+    if not clutil_config_bool("cl.stashrefs"):
+        print("Run 'git config cl.stashRefs true' to store new stashes "
+              "there too.")
+
+
+def clutil_validate_stash_preconditions(
+    name: str,
+    changelists: dict[str, list[str]],
+    stashes: dict[str, dict]
+) -> Optional[str]:
+    """
+    Validate preconditions for stashing a changelist.
+
+    Args:
+        name: Changelist name
+        changelists: Active changelists
+        stashes: Already stashed changelists
+
+    Returns:
+        Error message if validation fails, None if all checks pass
+    """
+    # Check if changelist exists
+    if name not in changelists:
+        return f"Changelist '{name}' not found."
+
+    # Check if changelist is already stashed
+    if name in stashes:
+        return (f"Changelist '{name}' is already stashed.\n"
+                f"Use 'git cl unstash {name}' to restore it first.")
+
+    # Check if changelist is empty
+    if not changelists[name]:
+        return f"Changelist '{name}' is empty - nothing to stash."
+
+    return None
+
+
+def clutil_categorize_files_for_stash(
+    files: list[tuple[str, Path]],
+    missing_files: list[str],
+    status_map: dict[str, str],
+    git_root: Path
+) -> tuple[dict[str, list[str]], list[str], list[str]]:
+    """
+    Categorize files based on their Git status for stashing.
+
+    Args:
+        files: List of (stored_path, abs_path) tuples for existing files
+        missing_files: List of paths for non-existent files
+        status_map: Git status mapping
+        git_root: Git repository root
+
+    Returns:
+        Tuple of (file_categories, stashable_files, unstashable_files)
+    """
+    file_categories = {
+        'unstaged_changes': [],     # Modified, deleted in working directory
+        'staged_additions': [],     # Newly added to index (A_)
+        'untracked': [],            # Untracked files (??)
+        'deleted_files': [],        # Files that don't exist (potential deletions)
+        'clean_files': [],          # Clean files (not stashable)
+        'staged_modifications': []  # Files with only staged changes (not stashable)
+    }
+
+    stashable_files = []
+    unstashable_files = []
+
+    # Process existing files
+    for stored_path, abs_path in files:
+        rel_to_git_root = abs_path.relative_to(git_root).as_posix()
+        status = status_map.get(rel_to_git_root, "  ")
+        staged, unstaged = status[0], status[1]
+
+        if status == "??":
+            # Untracked files
+            # - stashable since they're explicitly in changelist
+            file_categories['untracked'].append(stored_path)
+            stashable_files.append(stored_path)
+        elif unstaged in ['M', 'D']:
+            # Unstaged modifications/deletions - stashable
+            file_categories['unstaged_changes'].append(stored_path)
+            stashable_files.append(stored_path)
+        elif staged == 'A' and unstaged == ' ':
+            # Newly added to index - stashable
+            file_categories['staged_additions'].append(stored_path)
+            stashable_files.append(stored_path)
+        elif staged in ['M', 'D', 'R'] and unstaged == ' ':
+            # Only staged changes - not stashable with git stash push
+            file_categories['staged_modifications'].append(stored_path)
+            unstashable_files.append(stored_path)
+        elif status == "  ":
+            # Clean files - not stashable
+            file_categories['clean_files'].append(stored_path)
+            unstashable_files.append(stored_path)
+        else:
+            # Mixed staged+unstaged or other complex states
+            if unstaged != ' ':
+                # Has unstaged component - stashable
+                file_categories['unstaged_changes'].append(stored_path)
+                stashable_files.append(stored_path)
+            else:
+                # Only staged component - not stashable
+                file_categories['staged_modifications'].append(stored_path)
+                unstashable_files.append(stored_path)
+
+    # Process missing files (potential deletions)
+    for stored_path in missing_files:
+        # Check if this is a deletion by looking at git status
+        rel_to_git_root = stored_path  # already relative to git root
+        status = status_map.get(rel_to_git_root, "  ")
+
+        if status[1] == 'D':  # Deleted in working directory
+            file_categories['deleted_files'].append(stored_path)
+            stashable_files.append(stored_path)
+        else:
+            # File just doesn't exist and git doesn't know about it
+            print(f"Warning: File '{stored_path}' "
+                  f"does not exist and is not tracked.")
+            unstashable_files.append(stored_path)
+
+    return file_categories, stashable_files, unstashable_files
+
+
+def clutil_report_stash_categorization(
+    file_categories: dict[str, list[str]],
+    unstashable_files: list[str],
+    name: str,
+    quiet: bool = False
+) -> bool:
+    """
+    Report file categorization results and check if stash can proceed.
+
+    Args:
+        file_categories: Categorized files
+        unstashable_files: List of unstashable files
+        name: Changelist name
+        quiet: If True, suppress verbose output
+
+    Returns:
+        True if stash can proceed, False otherwise
+    """
+    # Report what we found (unless in quiet mode)
+    if not quiet:
+        if file_categories['unstaged_changes']:
+            print(f"Files with unstaged changes: "
+                  f"{len(file_categories['unstaged_changes'])}")
+        if file_categories['staged_additions']:
+            print(f"Newly added files: "
+                  f"{len(file_categories['staged_additions'])}")
+        if file_categories['untracked']:
+            print(f"Untracked files: {len(file_categories['untracked'])}")
+        if file_categories['deleted_files']:
+            print(f"Deleted files: {len(file_categories['deleted_files'])}")
+
+    # Check for unstashable files and report (always show errors)
+    if unstashable_files:
+        print(f"\nError: Cannot stash changelist '{name}' "
+              f"because these files are not stashable:")
+
+        if file_categories['clean_files']:
+            print("  Clean files (no changes):")
+            for file_path in file_categories['clean_files']:
+                print(f"    {file_path}")
+
+        if file_categories['staged_modifications']:
+            print("  Files with only staged changes "
+                  "(use 'git stash --staged' manually if needed):")
+            for file_path in file_categories['staged_modifications']:
+                print(f"    {file_path}")
+
+        other_unstashable = [f for f in unstashable_files
+                             if f not in file_categories['clean_files']
+                             and f not in file_categories['staged_modifications']]
+        if other_unstashable:
+            print("  Other non-stashable files:")
+            for file_path in other_unstashable:
+                print(f"    {file_path}")
+
+        print("\nStashable files must have:")
+        print("  - Unstaged changes (modified/deleted)")
+        print("  - Be newly added to index")
+        print("  - Be untracked (if explicitly in changelist)")
+        return False
+
+    return True
+
+
+class StashBuilder:
+    """
+    Creates Git stash entries with plumbing, without touching the working
+    tree or the index.
+
+    A stash entry is a commit W whose tree is the working-tree state of
+    the stashed files, with HEAD and an index commit I as parents, as
+    'git stash push' makes it. Both trees are written from a temporary
+    index that starts out as HEAD and receives only the stashed paths, so
+    one changelist's stash never picks up another changelist's files.
+    Resetting the stashed files afterwards is left to the caller (see
+    clutil_reset_stashed_files()), which can do it once for a whole batch.
+
+    Use through clutil_stash_builder(), which removes the temporary files.
+    """
+
+    def __init__(self, git_root: Path):
+        import tempfile
+        context = clutil_get_repo_context()
+        if context.head_oid is None:
+            raise ValueError("You do not have the initial commit yet")
+        self._git_root = git_root
+        self._head = context.head_oid
+        self._real_env = {**os.environ, "GIT_LITERAL_PATHSPECS": "1"}
+        fd, self._base_index = tempfile.mkstemp(dir=context.git_dir,
+                                                prefix="cl-stash-index.")
+        os.close(fd)
+        self._env = {**self._real_env, "GIT_INDEX_FILE": self._base_index}
+
+        self._branch = context.branch or "(no branch)"
+        self._head_tree, _, self._head_title = self._git(
+            ["log", "-1", "--format=%T%n%h %s", self._head],
+            env=self._real_env).partition("\n")
+
+    def _git(self, args: list[str], env: Optional[dict] = None,
+             input_data: Optional[str] = None) -> str:
+        return clutil_run_git(
+            ["git"] + args, input=input_data, capture_output=True, text=True,
+            check=True, cwd=self._git_root,
+            env=self._env if env is None else env).stdout.rstrip("\n")
+
+    def create(self, paths: list[str], message: str,
+               ref: Optional[str] = None) -> str:
+        """
+        Creates and stores a stash entry for the given files.
+
+        Args:
+            paths: Files to stash, relative to the git root
+            message: Stash message, as for 'git stash push -m'
+            ref: Ref to store the entry under, which must not exist yet,
+                 instead of pushing it onto refs/stash
+
+        Returns:
+            The object name of the new stash commit, now at stash@{0}
+            or at ref
+
+        Raises:
+            subprocess.CalledProcessError: If a Git command fails
+            ValueError: If none of the files has changes to stash
+        """
+        self._git(["read-tree", self._head])
+
+        # Index commit: HEAD with the staged state of the stashed paths
+        staged = "".join(
+            self._git(["ls-files", "--stage", "-z", "--"] + chunk,
+                      env=self._real_env)
+            for chunk in clutil_chunk_pathspecs(paths))
+        records = [record for record in staged.split("\0") if record]
+        in_index = {record.split("\t", 1)[1] for record in records}
+        null_oid = "0" * len(self._head)
+        records += [f"0 {null_oid}\t{path}" for path in paths
+                    if path not in in_index]
+        self._git(["update-index", "-z", "--index-info"],
+                  input_data="\0".join(records) + "\0")
+        index_tree = self._git(["write-tree"])
+
+        # Working-tree commit: the same paths as they are on disk
+        self._git(["update-index", "-z", "--add", "--remove", "--stdin"],
+                  input_data="\0".join(paths) + "\0")
+        work_tree = self._git(["write-tree"])
+
+        if work_tree == self._head_tree:
+            raise ValueError("No local changes to save")
+
+        index_commit = self._git(
+            ["commit-tree", index_tree, "-p", self._head,
+             "-m", f"index on {self._branch}: {self._head_title}"])
+        stash_message = f"On {self._branch}: {message}"
+        stash_oid = self._git(
+            ["commit-tree", work_tree, "-p", self._head, "-p", index_commit,
+             "-m", stash_message])
+        if ref:
+            self._git(["update-ref", "-m", stash_message, ref, stash_oid, ""],
+                      env=self._real_env)
+        else:
+            self._git(["stash", "store", "-m", stash_message, stash_oid],
+                      env=self._real_env)
+        return stash_oid
+
+    def close(self) -> None:
+        """Removes the temporary index."""
+        try:
+            os.unlink(self._base_index)
+        except OSError:
+            pass
+
+
+@contextmanager
+def clutil_stash_builder(git_root: Path) -> Iterator[StashBuilder]:
+    """
+    Provides a StashBuilder and removes its temporary index afterwards.
+
+    Args:
+        git_root: Path to git repository root
+
+    Yields:
+        StashBuilder: Builder for stash entries based on the current HEAD
+
+    Raises:
+        subprocess.CalledProcessError: If HEAD cannot be read
+        ValueError: If the repository has no commits yet
+    """
+    builder = StashBuilder(git_root)
+    try:
+        yield builder
+    finally:
+        builder.close()
+
+
+def clutil_reset_stashed_files(
+    paths: list[str],
+    status_map: dict[str, str],
+    git_root: Path
+) -> None:
+    """
+    Reset stashed files to HEAD in the index and working tree.
+
+    This is the second half of what 'git stash push' does, run once for
+    every file of a batch: files that exist in HEAD are checked out from
+    it, files that do not (new or untracked) are removed, together with
+    directories left empty.
+
+    Args:
+        paths: Stashed files, relative to the git root
+        status_map: Git status of the files from before stashing
+        git_root: Path to git repository root
+
+    Raises:
+        subprocess.CalledProcessError: If a Git command fails
+    """
+    in_head = []
+    new_files = []
+    for path in paths:
+        code = status_map.get(path, "  ")
+        if code == "??" or code[0] in "ARC":
+            new_files.append(path)
+        else:
+            in_head.append(path)
+
+    env = {**os.environ, "GIT_LITERAL_PATHSPECS": "1"}
+    with clutil_safe_stash_context(git_root):
+        for chunk in clutil_chunk_pathspecs(in_head):
+            clutil_run_git(["git", "checkout", "-q", "HEAD", "--"] + chunk,
+                           check=True, capture_output=True, env=env)
+        if not new_files:
+            return
+
+        clutil_run_git(["git", "update-index", "-z", "--force-remove", "--stdin"],
+                       input="\0".join(new_files) + "\0", text=True,
+                       check=True, capture_output=True)
+        for path in new_files:
+            abs_path = git_root / path
+            try:
+                abs_path.unlink()
+            except FileNotFoundError:
+                continue
+            parent = abs_path.parent
+            while parent != git_root:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+
+# pylint: disable-next=too-many-arguments
+def clutil_push_changelist_stash(
+    name: str,
+    files: list[str],
+    status_map: dict[str, str],
+    git_root: Path,
+    builder: StashBuilder,
+    quiet: bool = False
+) -> Optional[tuple[str, dict[str, list[str]], list[str]]]:
+    """
+    Categorize a changelist's files and create a Git stash entry for them.
+
+    Neither the working tree nor the metadata is changed; the caller
+    records the stash and then resets the stashed files.
+
+    Args:
+        name: Changelist name
+        files: Files in the changelist
+        status_map: Git status covering at least the changelist's files
+        git_root: Git repository root
+        builder: Stash builder to create the entry with
+        quiet: If True, suppress verbose output
+
+    Returns:
+        Tuple of (stash_ref, stash_oid, file_categories, stashable_files),
+        or None if nothing was stashed. stash_ref is the changelist's own
+        ref with 'cl.stashRefs', otherwise 'stash@{0}'.
+    """
+    # Check that files exist and categorize them
+    existing_files, missing_files = clutil_prepare_stash_files(files, git_root)
+    categorization = clutil_categorize_files_for_stash(
+        existing_files, missing_files, status_map, git_root
+    )
+    file_categories, stashable_files, unstashable_files = categorization
+
+    # Report categorization and check if we can proceed (suppress in quiet mode)
+    if not clutil_report_stash_categorization(file_categories,
+                                              unstashable_files, name, quiet=quiet):
+        return None
+
+    if not stashable_files:
+        if not quiet:
+            print(f"No stashable files found in changelist '{name}'.")
+        return None
+
+    if not quiet:
+        current_branch = clutil_get_current_branch()
+        if current_branch:
+            branch_info = f" from branch '{current_branch}'"
+        else:
+            branch_info = " from detached HEAD"
+        print(f"\nStashing {len(stashable_files)} file(s) "
+              f"from changelist '{name}'{branch_info}...")
+
+    own_ref = None
+    if clutil_config_bool("cl.stashrefs"):
+        own_ref = clutil_stash_ref_name(name)
+        if own_ref is None and not quiet:
+            print(f"Note: '{name}' is not a valid Git ref name, so the "
+                  "changelist is stashed in refs/stash instead.")
+    try:
+        stash_oid = builder.create(stashable_files,
+                                   clutil_create_unique_stash_message(name),
+                                   ref=own_ref)
+    except subprocess.CalledProcessError as error:
+        if own_ref and clutil_ref_exists(own_ref):
+            # Not recorded in the metadata, or the precondition check
+            # would have refused to stash the changelist again
+            print(f"Error: Cannot stash changelist '{name}': {own_ref} "
+                  "already exists but belongs to no stashed changelist.")
+            print("It is probably left over from an interrupted stash. "
+                  f"Inspect it with 'git stash show -p {own_ref}'")
+            print(f"and remove it with 'git update-ref -d {own_ref}'.")
+            return None
+        print(f"Error creating stash: {error}")
+        if error.stderr:
+            print(f"Git error: {error.stderr}")
+        return None
+    except ValueError:
+        print(f"Unexpected: No changes were stashed for changelist '{name}'.")
+        return None
+
+    return own_ref or "stash@{0}", stash_oid, file_categories, stashable_files
+
+
+def clutil_finish_stash(
+    paths: list[str],
+    status_map: dict[str, str],
+    git_root: Path
+) -> None:
+    """
+    Reset stashed files once their stash has been recorded.
+
+    Args:
+        paths: Stashed files, relative to the git root
+        status_map: Git status of the files from before stashing
+        git_root: Path to git repository root
+    """
+    try:
+        clutil_reset_stashed_files(paths, status_map, git_root)
+    except subprocess.CalledProcessError as error:
+        print(f"Warning: Changes were stashed but the files could not be "
+              f"reset: {error}")
+        print("The changes are safe in the stash. Revert the files with "
+              "'git checkout HEAD -- <files>'")
+
+
+# pylint: disable-next=too-many-arguments
+def clutil_build_stash_metadata(
+    name: str,
+    stash_ref: str,
+    stash_oid: str,
+    files: list[str],
+    file_categories: dict[str, list[str]],
+    current_branch: Optional[str]
+) -> dict:
+    """
+    Build stash metadata dictionary.
+
+    Args:
+        name: Changelist name
+        stash_ref: Git stash reference at the time of stashing
+        stash_oid: Object name of the stash commit
+        files: Files in the changelist
+        file_categories: Categorized files
+        current_branch: Current Git branch
+
+    Returns:
+        Dictionary containing stash metadata
+    """
+    import datetime
+    stash_message = clutil_create_unique_stash_message(name)
+
+    return {
+        "stash_ref": stash_ref,
+        "stash_oid": stash_oid,
+        "stash_message": stash_message,
+        "files": files.copy(),
+        "timestamp": datetime.datetime.now().isoformat(),
+        "source_branch": current_branch,
+        "file_categories": {
+            "unstaged_changes": file_categories['unstaged_changes'],
+            "staged_additions": file_categories['staged_additions'],
+            "untracked": file_categories['untracked'],
+            "deleted_files": file_categories['deleted_files']
+        }
+    }
+
+
+# pylint: disable-next=too-many-arguments
+def clutil_save_stash_metadata_atomic(
+    name: str,
+    stash_ref: str,
+    stash_oid: str,
+    files: list[str],
+    file_categories: dict[str, list[str]],
+    txn: MetadataTransaction
+) -> None:
+    """
+    Atomically save stash metadata and update changelists.
+
+    Both changes are committed together through the transaction.
+
+    Args:
+        name: Changelist name
+        stash_ref: Git stash reference
+        stash_oid: Object name of the stash commit
+        files: Files in the changelist
+        file_categories: Categorized files
+        txn: Open metadata transaction (will be modified and committed)
+
+    Raises:
+        OSError: If the metadata cannot be written (triggers rollback)
+    """
+    current_branch = clutil_get_current_branch()
+
+    # Build stash metadata
+    stash_metadata = clutil_build_stash_metadata(
+        name, stash_ref, stash_oid, files, file_categories, current_branch
+    )
+
+    # Record the stash and remove the changelist from active changelists
+    txn.stashes[name] = stash_metadata
+    del txn.changelists[name]
+    txn.commit()
+
+
+def clutil_handle_stash_failure(
+    error: Exception,
+    name: str,
+    stash_ref: str,
+    txn: MetadataTransaction
+) -> None:
+    """
+    Handle failure during stash metadata save with rollback.
+
+    A failed commit leaves both metadata files as they were, so only the
+    in-memory changes are discarded and the Git stash is dropped. The
+    stashed files have not been reset yet, so no changes are lost.
+
+    Args:
+        error: The exception that occurred
+        name: Changelist name
+        stash_ref: Git stash reference
+        txn: The metadata transaction whose commit failed
+    """
+    print(f"Error during atomic operation: {error}")
+    print("Attempting to rollback changes...")
+
+    rollback_success = True
+
+    txn.rollback()
+    print("Metadata was not changed.")
+
+    # Try to drop the orphaned stash
+    if not clutil_rollback_stash(stash_ref, name):
+        rollback_success = False
+
+    if rollback_success:
+        print(f"Rollback completed successfully. "
+              f"Changelist '{name}' remains active.")
+    else:
+        print("Partial rollback failure. Manual cleanup may be required:")
+        print(f"  - Check 'git stash list' for orphaned stash: {stash_ref}")
+        print(f"  - Verify changelist '{name}' state with 'git cl status'")
+        print(f"  - Consider 'git stash drop {stash_ref}' if stash is orphaned")
+
+
+def clutil_unstash_all_changelists(force: bool = False) -> None:
+    """
+    Helper function to unstash all stashed changelists.
+
+    Works as one batch: the metadata is loaded and saved once, the working
+    tree status for every stashed file is read once and updated in memory
+    as each stash is applied, and the stash list is read once and kept in
+    step with the stashes popped from it.
+
+    Args:
+        force: Whether to force unstash despite conflicts
+    """
+    with clutil_metadata_transaction() as txn:
+        if not txn.stashes:
+            print("No stashed changelists found.")
+            return
+
+        current_branch = clutil_get_current_branch()
+        if not current_branch:
+            print("Error: Cannot unstash --all while in detached HEAD state.")
+            print("Switch to a branch first: git checkout -b <branch-name>")
+            return
+
+        # Sort by timestamp (oldest first) for predictable order
+        stash_items = sorted(txn.stashes.items(),
+                             key=lambda x: x[1].get('timestamp', ''))
+        all_files = [path for _, stash_data in stash_items
+                     for path in stash_data.get("files", [])]
+
+        git_root = clutil_get_git_root()
+        status_map = clutil_get_file_status_map(show_all=True, paths=all_files)
+        # The branch workflow asks for a clean tree before the batch starts,
+        # not before each stash: the earlier stashes are what dirties it
+        is_dirty = False
+        if not force and any(
+                clutil_get_stash_source_branch(stash_data) != current_branch
+                for _, stash_data in stash_items):
+            try:
+                is_dirty = clutil_working_tree_is_dirty()
+            except subprocess.CalledProcessError:
+                pass
+        stash_reflog = clutil_read_stash_reflog()
+        own_refs = set(clutil_run_git(
+            ["git", "for-each-ref", "--format=%(refname)", CL_STASH_REF_PREFIX],
+            capture_output=True, text=True, check=False).stdout.split())
+
+        print(f"Unstashing all changelists to branch '{current_branch}':")
+        restored = []
+
+        for stash_name, stash_data in stash_items:
+            print(f"\n--- Unstashing '{stash_name}' ---")
+            files = stash_data["files"]
+
+            error_msg = clutil_validate_unstash_preconditions(
+                stash_name, stash_name, txn.stashes, txn.changelists)
+            if not error_msg:
+                error_msg = clutil_check_branch_workflow(
+                    stash_name, clutil_get_stash_source_branch(stash_data),
+                    force, current_branch=current_branch, is_dirty=is_dirty)
+            if error_msg:
+                print(error_msg)
+                continue
+
+            if not clutil_check_and_report_conflicts(files, git_root, stash_name,
+                                                     force, status_map=status_map):
+                continue
+
+            stash_ref = clutil_locate_batch_stash(stash_name, stash_data,
+                                                  stash_reflog, own_refs)
+            if not stash_ref:
+                clutil_report_missing_stash(stash_name)
+                continue
+            stash_data["stash_ref"] = stash_ref
+
+            try:
+                applied = clutil_apply_stash(stash_ref, stash_name)
+            except OSError as error:
+                print(f"Failed to unstash '{stash_name}': {error}")
+                continue
+            # Even a stash that stopped on conflicts has touched its files;
+            # a later stash that shares one of them must see it as modified
+            for path in files:
+                status_map[path] = " M"
+            if not applied:
+                continue
+
+            if not stash_ref.startswith(CL_STASH_REF_PREFIX):
+                del stash_reflog[int(stash_ref[len("stash@{"):-1])]
+
+            txn.changelists[stash_name] = files.copy()
+            del txn.stashes[stash_name]
+            restored.append(stash_name)
+            clutil_process_unstash_result(stash_name, files, current_branch)
+
+        try:
+            txn.commit()
+        except (OSError, json.JSONDecodeError) as error:
+            txn.rollback()
+            print(f"Warning: Unstash succeeded but metadata update failed: "
+                  f"{error}")
+            for stash_name in restored:
+                print(f"Manually recreate the changelist: git cl add "
+                      f"{stash_name} <files>")
+
+        print(f"\nUnstashed {len(restored)}/{len(stash_items)} "
+              f"changelists successfully.")
+
+
+def clutil_locate_batch_stash(
+    base_name: str,
+    stash_data: dict,
+    stash_reflog: list[tuple[str, str]],
+    own_refs: set[str]
+) -> Optional[str]:
+    """
+    Find a stashed changelist's stash in a stash list read up front.
+
+    The batch counterpart of clutil_verify_and_update_stash_ref(): the
+    stash list and the refs/cl-stash/ refs are read once by the caller.
+
+    Args:
+        base_name: Changelist name
+        stash_data: The changelist's stash metadata
+        stash_reflog: Output of clutil_read_stash_reflog(), kept current
+        own_refs: Existing refs under refs/cl-stash/
+
+    Returns:
+        The stash reference or None if the stash no longer exists
+    """
+    stash_ref = stash_data.get("stash_ref") or ""
+    if stash_ref.startswith(CL_STASH_REF_PREFIX):
+        return stash_ref if stash_ref in own_refs else None
+
+    stash_oid = stash_data.get("stash_oid")
+    for index, (oid, message) in enumerate(stash_reflog):
+        if (oid == stash_oid if stash_oid
+                else f"git-cl-stash:{base_name}:" in message):
+            return f"stash@{{{index}}}"
+    return None
+
+
+def clutil_resolve_unstash_name(name: str) -> tuple[str, str]:
+    """
+    Resolve changelist name handling both "name" and "name_stashed" formats.
+
+    Args:
+        name: The changelist name (with or without _stashed suffix)
+
+    Returns:
+        Tuple of (base_name, stash_key)
+    """
+    if name.endswith("_stashed"):
+        base_name = name[:-8]  # Remove "_stashed" suffix
+        stash_key = base_name
+    else:
+        base_name = name
+        stash_key = name
+
+    return base_name, stash_key
+
+
+def clutil_validate_unstash_preconditions(
+    base_name: str,
+    stash_key: str,
+    stashes: dict[str, dict],
+    changelists: dict[str, list[str]]
+) -> Optional[str]:
+    """
+    Validate preconditions for unstashing a changelist.
+
+    Args:
+        base_name: The base changelist name
+        stash_key: The key in stashes dictionary
+        stashes: Dictionary of stashed changelists
+        changelists: Dictionary of active changelists
+
+    Returns:
+        Error message if validation fails, None if all checks pass
+    """
+    if stash_key not in stashes:
+        error_msg = f"No stashed changelist found for '{base_name}'."
+        available = list(stashes.keys())
+        if available:
+            error_msg += "\nAvailable stashed changelists:"
+            for stashed_name in available:
+                error_msg += f"\n  {stashed_name}"
+        return error_msg
+
+    # Check if target changelist name already exists
+    if base_name in changelists and changelists[base_name]:
+        return (f"Error: Changelist '{base_name}' already exists with files.\n"
+                "Please delete or rename the existing changelist first.")
+
+    return None
+
+
+def clutil_working_tree_is_dirty() -> bool:
+    """
+    Check whether the working tree has any change or untracked file.
+
+    Returns:
+        True if git status reports at least one entry
+    """
+    # Any single entry means the tree is dirty; stop reading there
+    with closing(clutil_iter_git_status(untracked="normal")) as entries:
+        return next(entries, None) is not None
+
+
+def clutil_check_branch_workflow(
+    base_name: str,
+    source_branch: Optional[str],
+    force: bool,
+    current_branch: Optional[str] = None,
+    is_dirty: Optional[bool] = None
+) -> Optional[str]:
+    """
+    Check branch workflow requirements for unstashing.
+
+    Args:
+        base_name: The changelist name
+        source_branch: The branch where changelist was stashed from
+        force: Whether to force unstash despite warnings
+        current_branch: Current branch if already known; looked up when None
+        is_dirty: Working tree state if already known; checked when None
+
+    Returns:
+        Error message if check fails, None if checks pass
+    """
+    if force:
+        return None
+
+    if current_branch is None:
+        current_branch = clutil_get_current_branch()
+
+    if not current_branch:
+        return ("Error: Cannot unstash while in detached HEAD state.\n"
+                "Create a new branch first: git checkout -b feature-branch\n"
+                f"Or use --force to unstash anyway: git cl unstash {base_name} --force")
+
+    # Allow restoring to original branch, but encourage new branches
+    if source_branch and current_branch == source_branch:
+        print(f"Note: Unstashing '{base_name}' back to original branch "
+              f"'{current_branch}'")
+        print("This is allowed but consider using a new branch for feature work.")
+    else:
+        # Check if working directory is clean (recommended for branch workflow)
+        try:
+            if is_dirty is None:
+                is_dirty = clutil_working_tree_is_dirty()
+            if is_dirty:
+                return (f"Warning: Working directory is not clean on branch '{current_branch}'\n"
+                        "The branch workflow works best with a clean working directory.\n"
+                        "Consider committing or stashing current changes first.\n"
+                        "Or use --force to unstash anyway: git cl unstash "
+                        f"{base_name} --force")
+        except subprocess.CalledProcessError:
+            pass  # git status failed, continue anyway
+
+    return None
+
+
+def clutil_check_and_report_conflicts(
+    files: list[str],
+    git_root: Path,
+    base_name: str,
+    force: bool,
+    quiet: bool = False,
+    status_map: Optional[dict[str, str]] = None
+) -> bool:
+    """
+    Check for conflicts and report them to user.
+
+    Args:
+        files: List of files to unstash
+        git_root: Git repository root
+        base_name: Changelist name
+        force: Whether to force despite conflicts
+        quiet: If True, suppress verbose output
+        status_map: Status already read for these files; queried when None
+
+    Returns:
+        True if unstash can proceed, False otherwise
+    """
+    if force:
+        return True
+
+    real_conflicts, file_status_info = (
+        clutil_check_unstash_conflicts_optimized(files, git_root, status_map))
+
+    if real_conflicts:
+        print(f"Cannot unstash '{base_name}' due to conflicts:")
+        for file_path in real_conflicts:
+            status_desc = file_status_info[file_path]
+            print(f"  {file_path} ({status_desc})")
+
+        clutil_suggest_workflow_actions(real_conflicts, file_status_info)
+        print(f"\nAfter resolving conflicts, retry: git cl unstash {base_name}")
+        print(f"Or use --force to attempt automatic merge:"
+              f"git cl unstash {base_name} --force")
+        return False
+
+    # Show informational status for non-conflicting files (unless quiet)
+    if not quiet:
+        safe_files = [f for f in files if f not in real_conflicts]
+        if safe_files:
+            staged_files = []
+            clean_files = []
+            missing_files = []
+            for file_path in safe_files:
+                status_desc = file_status_info.get(file_path, "")
+                if "staged" in status_desc:
+                    staged_files.append(file_path)
+                elif "clean" in status_desc:
+                    clean_files.append(file_path)
+                elif "missing" in status_desc:
+                    missing_files.append(file_path)
+
+            status_summary = []
+            if clean_files:
+                status_summary.append(f"{len(clean_files)} clean")
+            if missing_files:
+                status_summary.append(f"{len(missing_files)} to be restored")
+            if staged_files:
+                status_summary.append(f"{len(staged_files)} with staged changes")
+
+            if status_summary:
+                print(f"Ready to unstash {len(safe_files)} "
+                      f"files: {', '.join(status_summary)}")
+
+    return True
+
+
+def clutil_resolve_stash_oid(stash_oid: str) -> Optional[str]:
+    """
+    Find the current reflog position of a stash commit.
+
+    Positions in refs/stash shift whenever anything is stashed or dropped,
+    but the stash commit itself never changes, so one read of the stash
+    reflog finds it, however many stashes there are or whatever their
+    messages say.
+
+    Args:
+        stash_oid: Object name of the stash commit
+
+    Returns:
+        The stash reference (e.g. "stash@{2}") or None if not found
+    """
+    for index, (oid, _) in enumerate(clutil_read_stash_reflog()):
+        if oid == stash_oid:
+            return f"stash@{{{index}}}"
+    return None
+
+
+def clutil_read_stash_reflog() -> list[tuple[str, str]]:
+    """
+    Read the stash list with one git call.
+
+    Returns:
+        (object name, message) per stash, newest first, so the list index
+        is the N in stash@{N}; empty if there are no stashes
+    """
+    result = clutil_run_git(["git", "reflog", "show", "--format=%H%x00%gs",
+                             "refs/stash", "--"],
+                            capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        return []
+    return [tuple(line.split("\0", 1)) for line in result.stdout.splitlines()
+            if "\0" in line]
+
+
+def clutil_report_missing_stash(base_name: str) -> None:
+    """
+    Tell the user a changelist's stash is gone and list the stashes left.
+
+    Args:
+        base_name: Changelist name
+    """
+    print(f"Error: Stash for changelist '{base_name}' no longer exists.")
+    print("The stash may have been manually dropped. Available stashes:")
+    try:
+        stash_list = clutil_git_output(["git", "stash", "list"], text=True)
+        if stash_list.strip():
+            for line in stash_list.strip().split('\n'):
+                print(f"  {line}")
+        else:
+            print("  (no stashes found)")
+    except subprocess.CalledProcessError:
+        print("  (could not list stashes)")
+
+
+def clutil_verify_and_update_stash_ref(
+    base_name: str,
+    stashes: dict[str, dict]
+) -> Optional[str]:
+    """
+    Verify stash still exists and update reference if needed.
+
+    Stashes kept under their own ref (see 'cl.stashRefs') only need that
+    ref to exist. Stashes in refs/stash that were recorded with their
+    commit ('stash_oid') are looked up by it.
+    Older metadata only has the reference and message, so the stash is
+    searched for by message in 'git stash list'. The current reference is
+    recorded in the stash metadata, to be saved with it.
+
+    Args:
+        base_name: Changelist name
+        stashes: Stashed changelists dictionary (will be modified)
+
+    Returns:
+        Updated stash reference or None if stash doesn't exist
+    """
+    stash_data = stashes[base_name]
+    old_stash_ref = stash_data.get("stash_ref")
+    stash_oid = stash_data.get("stash_oid")
+    if old_stash_ref and old_stash_ref.startswith(CL_STASH_REF_PREFIX):
+        current_stash_ref = (old_stash_ref
+                             if clutil_ref_exists(old_stash_ref) else None)
+    elif stash_oid:
+        current_stash_ref = clutil_resolve_stash_oid(stash_oid)
+    else:
+        current_stash_ref = clutil_find_stash_by_message_substring(
+            f"git-cl-stash:{base_name}:")
+
+    if not current_stash_ref:
+        clutil_report_missing_stash(base_name)
+        return None
+
+    # Update stash reference if needed
+    if current_stash_ref != old_stash_ref:
+        if not stash_oid:
+            print(f"Note: Stash reference updated from {old_stash_ref} "
+                  f"to {current_stash_ref}")
+        stash_data["stash_ref"] = current_stash_ref
+
+    return current_stash_ref
+
+
+def clutil_apply_stash(stash_ref: str, base_name: str, quiet: bool = False) -> bool:
+    """
+    Apply the stash using git stash pop.
+
+    A stash kept under its own ref is applied with 'git stash apply' and
+    its ref deleted afterwards.
+
+    Args:
+        stash_ref: Git stash reference
+        base_name: Changelist name for error messages
+        quiet: If True, suppress verbose output
+
+    Returns:
+        True if successful, False if conflicts occurred
+    """
+    if not quiet:
+        current_branch = clutil_get_current_branch()
+        branch_info = f" to branch '{current_branch}'" if current_branch else ""
+        print(f"Unstashing changelist '{base_name}'{branch_info}...")
+
+    own_ref = stash_ref.startswith(CL_STASH_REF_PREFIX)
+    try:
+        result = clutil_run_git(["git", "stash", "apply" if own_ref else "pop",
+                                 stash_ref],
+                                capture_output=True, text=True, check=True)
+
+        # Handle merge conflicts
+        if "CONFLICT" in result.stdout or "CONFLICT" in result.stderr:
+            print(f"Merge conflicts occurred while unstashing '{base_name}'.")
+            print("This is unexpected in the typical "
+                  "stash-branch-unstash workflow.")
+            print("\nTo resolve:")
+            print("  1. Resolve conflicts in the affected files")
+            print("  2. Stage resolved files: git add <resolved-files>")
+            print(f"  3. Recreate changelist: git cl add {base_name} <files>")
+            return False
+
+        if own_ref:
+            clutil_run_git(["git", "update-ref", "-d", stash_ref],
+                           capture_output=True, text=True, check=True)
+        return True
+
+    except subprocess.CalledProcessError as error:
+        print(f"Error unstashing '{base_name}': {error}")
+        if "CONFLICT" in str(error.stderr):
+            print("Merge conflicts occurred. To resolve:")
+            print("  1. Check 'git status' for conflicted files")
+            print("  2. Resolve conflicts and stage files")
+            print("  3. Recreate changelist manually")
+        else:
+            print("This may indicate the working directory is not clean.")
+            print("Ensure you're on a clean branch before unstashing.")
+        return False
+
+
+def clutil_process_unstash_result(
+    base_name: str,
+    files: list[str],
+    current_branch: Optional[str]
+) -> None:
+    """
+    Process and display results after successful unstash.
+
+    Args:
+        base_name: Changelist name
+        files: List of files that were restored
+        current_branch: Current Git branch
+    """
+    success_msg = f"  Successfully unstashed changelist '{base_name}'"
+    if current_branch:
+        success_msg += f" to branch '{current_branch}'"
+    print(success_msg)
+    print(f"  Restored {len(files)} files to working directory")
+    print("  Ready to work on your feature!")
+
+    # Show the files that were restored
+    if len(files) <= 10:
+        print("Files restored:")
+        for file_path in files:
+            print(f"  {file_path}")
+    else:
+        print(f"Files restored: {files[0]}, {files[1]}, "
+              f"... and {len(files) - 2} others")
+
+
+def clutil_update_unstash_metadata(
+    base_name: str,
+    stash_key: str,
+    files: list[str],
+    txn: MetadataTransaction,
+    quiet: bool = False
+) -> None:
+    """
+    Update metadata after successful unstash.
+
+    Args:
+        base_name: Changelist name
+        stash_key: Key in stashes dictionary
+        files: List of files in the changelist
+        txn: Open metadata transaction (will be modified and committed)
+        quiet: If True, suppress verbose output
+    """
+    try:
+        txn.changelists[base_name] = files.copy()
+        del txn.stashes[stash_key]
+        txn.commit()
+
+        if not quiet:
+            current_branch = clutil_get_current_branch()
+            clutil_process_unstash_result(base_name, files, current_branch)
+
+    except (OSError, subprocess.CalledProcessError,
+            json.JSONDecodeError) as metadata_error:
+        txn.rollback()
+        print(f"Warning: Unstash succeeded but metadata update failed: "
+              f"{metadata_error}")
+        print(f"Manually recreate the changelist: git cl add "
+              f"{base_name} <files>")
+
+
+def clutil_prepare_stash_files(
+    files: list[str],
+    git_root: Path
+) -> tuple[list[tuple[str, Path]], list[str]]:
+    """
+    Prepare files for stashing by checking existence.
+
+    Args:
+        files: List of file paths from changelist
+        git_root: Git repository root
+
+    Returns:
+        Tuple of (existing_files, missing_files)
+    """
+    missing_files = []
+    existing_files = []
+
+    for stored_path in files:
+        abs_path = (git_root / stored_path).resolve()
+        if not abs_path.exists():
+            missing_files.append(stored_path)
+        else:
+            existing_files.append((stored_path, abs_path))
+
+    return existing_files, missing_files
+
+
+def clutil_print_stash_success(
+    name: str,
+    stashable_files: list[str],
+    file_categories: dict[str, list[str]],
+    current_branch: Optional[str]
+) -> None:
+    """
+    Print success message after stashing.
+
+    Args:
+        name: Changelist name
+        stashable_files: List of files that were stashed
+        file_categories: Categorized files
+        current_branch: Current Git branch
+    """
+    success_msg = f"  Successfully stashed changelist '{name}'"
+    if current_branch:
+        success_msg += f" from branch '{current_branch}'"
+    print(success_msg)
+    print(f"  Stashed {len(stashable_files)} file(s):")
+
+    # Show breakdown of what was stashed
+    categories_to_show = {
+        'unstaged_changes': 'unstaged changes',
+        'staged_additions': 'newly added',
+        'untracked': 'untracked',
+        'deleted_files': 'deleted'
+    }
+
+    for category_key, category_display in categories_to_show.items():
+        files_list = file_categories.get(category_key, [])
+        if files_list:
+            print(f"    {len(files_list)} with {category_display}")
+
+    print("  Working directory is now clean for this changelist")
+
+
+def clutil_show_file_statuses(
+    title: str,
+    entries: list[FileStatus],
+    git_root: Path,
+    cwd: Path,
+    use_color: bool
+) -> None:
+    """
+    Display one group of files of 'git cl status'.
+
+    Args:
+        title: Heading, such as the changelist name followed by ':'
+        entries: Files to show, in order
+        git_root: Git repository root
+        cwd: Resolved current directory, which paths are shown relative to
+        use_color: Whether to use colored output
+    """
+    print(title)
+    for entry in entries:
+        print(clutil_format_file_status(entry, git_root, cwd, use_color))
+
+
+def clutil_show_stashed_changelists(stashed: list[StashedChangelist]) -> None:
+    """
+    Display stashed changelists section.
+
+    Args:
+        stashed: Stashed changelists, in the order to show them
+    """
+    import datetime
+    print("Stashed Changelists:")
+
+    for stash in stashed:
+        # Format timestamp for display
+        try:
+            dt = datetime.datetime.fromisoformat(stash.timestamp)
+            formatted_time = dt.strftime("%Y-%m-%d %H:%M")
+        except (ValueError, AttributeError):
+            formatted_time = "unknown time"
+
+        file_count = len(stash.files)
+        file_word = "file" if file_count == 1 else "files"
+        print(f"  {stash.name} ({file_count} {file_word}, {formatted_time})")
+
+
+def clutil_select_status_entries(
+    report: StatusReport,
+    selected_names: Optional[set[str]],
+    include_no_cl: bool
+) -> tuple[dict[str, list[FileStatus]], list[FileStatus]]:
+    """
+    Picks the files 'git cl status' shows for the given filter.
+
+    Args:
+        report: Status of the whole working tree
+        selected_names: Changelists to show (None = show all)
+        include_no_cl: Also show unassigned files when filtering
+
+    Returns:
+        Tuple of (changelists to show, files to show as 'No Changelist').
+    """
+    if selected_names is None:
+        return report.changelists, report.unassigned
+
+    shown = {name: entries for name, entries in report.changelists.items()
+             if name in selected_names}
+    if not include_no_cl:
+        return shown, []
+
+    # Changed files of the changelists not shown count as unassigned,
+    # also in the records of --porcelain and --json
+    hidden = [entry._replace(changelist=None)
+              for name, entries in report.changelists.items()
+              if name not in selected_names
+              for entry in entries if entry.path in report.entries]
+    return shown, sorted(report.unassigned + hidden)
+
+
+def clutil_quote_path(path: str) -> str:
+    """
+    Quotes a path for line-based porcelain output, as Git does.
+
+    Paths with control characters, '"' or a backslash are enclosed in
+    double quotes with C-style escapes; other paths are returned as is.
+    """
+    if path.isprintable() and '"' not in path and "\\" not in path:
+        return path
+    escapes = {'"': '\\"', "\\": "\\\\", "\a": "\\a", "\b": "\\b",
+               "\t": "\\t", "\n": "\\n", "\v": "\\v", "\f": "\\f",
+               "\r": "\\r"}
+    quoted = "".join(
+        escapes.get(char, f"\\{ord(char):03o}"
+                    if char < " " or char == "\x7f" else char)
+        for char in path)
+    return f'"{quoted}"'
+
+
+def clutil_iter_porcelain_records(
+    changelists: dict[str, list[FileStatus]],
+    unassigned: list[FileStatus],
+    nul_terminated: bool
+) -> Iterator[str]:
+    """
+    Yields the records of 'git cl status --porcelain'.
+
+    Each record is '<XY> <changelist> <path>': the two-letter status code,
+    the changelist the file is in (empty for unassigned files) and the
+    path relative to the repository root. Changelist names contain no
+    spaces, so the path is everything after the second space following
+    the code.
+
+    Args:
+        changelists: Files of each changelist to show
+        unassigned: Files in no changelist to show
+        nul_terminated: End records with NUL and leave paths unquoted
+                        (-z); otherwise end them with a newline and quote
+                        paths with clutil_quote_path()
+    """
+    end = "\0" if nul_terminated else "\n"
+    quote = str if nul_terminated else clutil_quote_path
+    for entries in (*changelists.values(), unassigned):
+        for entry in entries:
+            yield (f"{entry.code} {entry.changelist or ''} "
+                   f"{quote(entry.path)}{end}")
+
+
+def clutil_iter_json_records(
+    changelists: dict[str, list[FileStatus]],
+    unassigned: list[FileStatus],
+    stashed: list[StashedChangelist]
+) -> Iterator[str]:
+    """
+    Yields the JSON lines of 'git cl status --json'.
+
+    One object per line: {"type": "file", "changelist", "status", "path"}
+    for each file, with "changelist" null for unassigned files, then
+    {"type": "stash", "changelist", "files", "source_branch", "timestamp"}
+    for each stashed changelist. Paths are relative to the repository root.
+
+    Args:
+        changelists: Files of each changelist to show
+        unassigned: Files in no changelist to show
+        stashed: Stashed changelists to show
+    """
+    for entries in (*changelists.values(), unassigned):
+        for entry in entries:
+            yield json.dumps({"type": "file", "changelist": entry.changelist,
+                              "status": entry.code, "path": entry.path}) + "\n"
+    for stash in stashed:
+        yield json.dumps({"type": "stash", "changelist": stash.name,
+                          "files": stash.files,
+                          "source_branch": stash.source_branch,
+                          "timestamp": stash.timestamp}) + "\n"
+
+
+def clutil_validate_unstash_environment(
+    base_name: str,
+    stash_key: str,
+    stashes: dict[str, dict],
+    changelists: dict[str, list[str]],
+    force: bool,
+    is_dirty: Optional[bool] = None
+) -> tuple[Optional[str], Optional[dict]]:
+    """
+    Validate all preconditions for unstashing.
+
+    Args:
+        base_name: Base changelist name
+        stash_key: Key in stashes dictionary
+        stashes: Stashed changelists
+        changelists: Active changelists
+        force: Whether to force despite warnings
+        is_dirty: Working tree state if already known; checked when None
+
+    Returns:
+        Tuple of (error_message, stash_data) - error_message is None if valid
+    """
+    # Validate basic preconditions
+    error_msg = clutil_validate_unstash_preconditions(
+        base_name, stash_key, stashes, changelists
+    )
+    if error_msg:
+        return error_msg, None
+
+    stash_data = stashes[stash_key]
+    source_branch = clutil_get_stash_source_branch(stash_data)
+
+    # Check branch workflow requirements
+    error_msg = clutil_check_branch_workflow(base_name, source_branch, force,
+                                             is_dirty=is_dirty)
+    if error_msg:
+        return error_msg, None
+
+    return None, stash_data
+
+
+# =============================================================================
+# BRANCH WORKFLOW UTILITIES (branch-specific utilities)
+# =============================================================================
+
+def clutil_validate_branch_preconditions(
+        changelist_name: str, changelists: dict, stashes: dict) -> str:
+    """Validate preconditions for branch creation workflow."""
+    if changelist_name not in changelists:
+        error_msg = f"Error: Changelist '{changelist_name}' not found."
+        available = [name for name in changelists.keys() if changelists[name]]
+        if available:
+            error_msg += "\nAvailable active changelists:"
+            for name in available:
+                error_msg += f"\n  {name}"
+        return error_msg
+
+    if not changelists[changelist_name]:
+        return (f"Error: Changelist '{changelist_name}' is empty.\n"
+                f"Add files with: git cl add {changelist_name} <files>")
+
+    if changelist_name in stashes:
+        return (f"Error: Changelist '{changelist_name}' is already stashed.\n"
+                f"Use 'git cl unstash {changelist_name}' to restore it first.")
+
+    return ""
+
+
+def clutil_check_branch_exists(branch_name: str) -> bool:
+    """Check if a branch already exists."""
+    try:
+        result = clutil_run_git(["git", "show-ref", "--verify",
+                                 f"refs/heads/{branch_name}"],
+                                capture_output=True, text=True, check=False)
+        return result.returncode == 0
+    except subprocess.CalledProcessError:
+        return False
+
+
+def clutil_check_unassigned_changes(
+        changelists: dict, git_root: Path,
+        status_map: Optional[dict[str, str]] = None) -> list[str]:
+    """Check for uncommitted changes not in any changelist."""
+    if status_map is None:
+        status_map = clutil_get_file_status_map(show_all=True)
+
+    # Get all files assigned to changelists
+    assigned_files = set()
+    for files in changelists.values():
+        for file_path in files:
+            try:
+                abs_path = (git_root / file_path).resolve()
+                rel_path = abs_path.relative_to(git_root).as_posix()
+                assigned_files.add(rel_path)
+            except (ValueError, OSError):
+                continue
+
+    # Check for unassigned changes (ignore untracked files)
+    return [file_path for file_path, status in status_map.items()
+            if file_path not in assigned_files and status != "??"]
+
+
+def clutil_execute_stash_all() -> None:
+    """Execute stash all operation."""
+    temp_args = argparse.Namespace()
+    temp_args.all = True
+    cl_stash(temp_args)
+
+
+def clutil_create_branch(branch_name: str,
+                         base_branch: str, current_branch: str) -> None:
+    """Create new branch from base."""
+    if base_branch != current_branch:
+        # Create branch from specified base
+        clutil_run_git(["git", "checkout", "-b", branch_name, base_branch],
+                       check=True)
+    else:
+        # Create branch from current HEAD
+        clutil_run_git(["git", "checkout", "-b", branch_name], check=True)
+    # HEAD now points at the new branch
+    clutil_reset_repo_context()
+
+
+def clutil_branch_starts_at_head(base_branch: Optional[str]) -> bool:
+    """
+    Check whether a new branch from base_branch would start at HEAD.
+
+    Args:
+        base_branch: The --from argument, or None for the current branch
+
+    Returns:
+        True if base_branch is None or names the HEAD commit
+    """
+    head_oid = clutil_get_repo_context().head_oid
+    if base_branch is None:
+        return head_oid is not None
+    result = clutil_run_git(["git", "rev-parse", "-q", "--verify",
+                             f"{base_branch}^{{commit}}"],
+                            capture_output=True, text=True, check=False)
+    return result.returncode == 0 and result.stdout.strip() == head_oid
+
+
+def clutil_switch_to_new_branch_in_place(branch_name: str,
+                                         current_branch: str) -> None:
+    """
+    Create a branch at HEAD and switch to it without touching any file.
+
+    The new branch points at the commit that is already checked out, so
+    the index and working tree are right as they are: only the branch ref
+    is created and HEAD is pointed at it. The reflog messages match those
+    of 'git checkout -b'.
+
+    Args:
+        branch_name: Name of the new branch
+        current_branch: Branch HEAD points at now
+
+    Raises:
+        subprocess.CalledProcessError: If the name is not a valid branch
+            name, the branch already exists or HEAD cannot be moved.
+    """
+    head_oid = clutil_get_repo_context().head_oid
+    clutil_run_git(["git", "check-ref-format", "--branch", branch_name],
+                   capture_output=True, text=True, check=True)
+    # The empty old value makes update-ref fail if the branch exists
+    clutil_run_git(["git", "update-ref", "-m",
+                    f"branch: Created from {current_branch}",
+                    f"refs/heads/{branch_name}", head_oid, ""],
+                   capture_output=True, text=True, check=True)
+    clutil_run_git(["git", "symbolic-ref", "-m",
+                    f"checkout: moving from {current_branch} to {branch_name}",
+                    "HEAD", f"refs/heads/{branch_name}"],
+                   capture_output=True, text=True, check=True)
+    clutil_reset_repo_context()
+
+
+def clutil_unstash_changelist(changelist_name: str,
+                              status_map: Optional[dict[str, str]] = None) -> None:
+    """
+    Unstash specific changelist.
+
+    Args:
+        changelist_name: Changelist to restore
+        status_map: Whole-tree status of the new branch if already known;
+                    the merge-conflict, clean-tree and conflict checks then
+                    use it instead of asking Git
+    """
+    if status_map is None:
+        temp_unstash_args = argparse.Namespace()
+        temp_unstash_args.name = changelist_name
+        temp_unstash_args.force = False
+        temp_unstash_args.all = False
+        cl_unstash(temp_unstash_args, quiet=True)  # Add quiet=True here
+        return
+
+    if clutil_refuse_on_merge_conflict(status_map, "unstash"):
+        return
+    try:
+        clutil_unstash_single(changelist_name, False, quiet=True,
+                              status_map=status_map, is_dirty=bool(status_map))
+    except GitClError as error:
+        clutil_print_error(error)
+
+
+def clutil_handle_branch_creation_failure() -> None:
+    """Handle failure during branch creation by restoring stashes."""
+    try:
+        temp_unstash_args = argparse.Namespace()
+        temp_unstash_args.all = True
+        temp_unstash_args.force = True
+        cl_unstash(temp_unstash_args)
+    except (OSError, subprocess.CalledProcessError,
+            json.JSONDecodeError) as restore_error:
+        print(f"Error restoring stashes: {restore_error}")
+        print("You may need to manually unstash: git cl unstash --all")
+
+
+# =============================================================================
+# DAEMON UTILITIES
+# =============================================================================
+
+# Commands a running daemon answers. All others run in-process, since they
+# prompt, run Git interactively or change the working tree.
+DAEMON_COMMANDS = {"status", "s", "st"}
+
+# A daemon that receives no request for this long exits
+DAEMON_IDLE_SECONDS = 3600
+
+# How long a client waits for a daemon to accept its connection
+DAEMON_CONNECT_SECONDS = 1.0
+
+# Name of the daemon's socket in the (per-worktree) Git directory
+DAEMON_SOCKET_NAME = "cl-daemon.sock"
+
+# With any of these set, Git may see a different repository or
+# configuration than the daemon, so the command runs in-process
+DAEMON_BYPASS_ENV = (
+    "GIT_DIR", "GIT_WORK_TREE", "GIT_INDEX_FILE", "GIT_COMMON_DIR",
+    "GIT_OBJECT_DIRECTORY", "GIT_CEILING_DIRECTORIES",
+    "GIT_DISCOVERY_ACROSS_FILESYSTEM", "GIT_CONFIG", "GIT_CONFIG_GLOBAL",
+    "GIT_CONFIG_SYSTEM", "GIT_CONFIG_NOSYSTEM", "GIT_CONFIG_PARAMETERS",
+    "GIT_CONFIG_COUNT", "GIT_CL_TRACE", "GIT_CL_TRACE_FILE",
+)
+
+
+class DaemonOutput(io.StringIO):
+    """
+    Captures the output of a forwarded command.
+
+    isatty() answers for the client's terminal rather than the daemon's,
+    so clutil_should_use_color() decides as it would in the client.
+    """
+
+    def __init__(self, tty: bool):
+        super().__init__()
+        self.tty = tty
+
+    def isatty(self) -> bool:
+        return self.tty
+
+
+def clutil_daemon_supported() -> bool:
+    """Returns True if this platform has Unix domain sockets."""
+    import socket
+    return hasattr(socket, "AF_UNIX") and sys.platform != "win32"
+
+
+def clutil_locate_git_dir(start: Path) -> Optional[Path]:
+    """
+    Finds the Git directory for a working directory without running Git.
+
+    Walks up from start to the first '.git' directory, or '.git' file
+    pointing to one as in linked worktrees and submodules. This is only
+    used to find a daemon's socket; Git's own discovery rules (bare
+    repositories, safe.directory, ...) still apply to whatever runs.
+
+    Args:
+        start (Path): Absolute directory to start from.
+
+    Returns:
+        Optional[Path]: The resolved Git directory, or None if not found.
+    """
+    for directory in (start, *start.parents):
+        dot_git = directory / ".git"
+        if dot_git.is_dir():
+            return dot_git.resolve()
+        if dot_git.is_file():
+            try:
+                content = dot_git.read_text(encoding="utf-8")
+            except OSError:
+                return None
+            if not content.startswith("gitdir:"):
+                return None
+            return (directory / content[len("gitdir:"):].strip()).resolve()
+    return None
+
+
+def clutil_daemon_receive(conn) -> dict:
+    """
+    Reads one JSON message, sent as a whole before the sender's shutdown.
+
+    Args:
+        conn (socket.socket): Connected socket.
+
+    Returns:
+        dict: The decoded message.
+
+    Raises:
+        OSError: If reading fails or times out.
+        ValueError: If the message is not a JSON object.
+    """
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    message = json.loads(b"".join(chunks))
+    if not isinstance(message, dict):
+        raise ValueError("daemon message is not a JSON object")
+    return message
+
+
+def clutil_daemon_request(socket_path: Path, message: dict) -> dict:
+    """
+    Sends one message to a daemon and returns its reply.
+
+    Args:
+        socket_path (Path): The daemon's socket.
+        message (dict): Request or control message.
+
+    Returns:
+        dict: The daemon's reply.
+
+    Raises:
+        OSError: If no daemon is listening or the connection fails.
+        ValueError: If the reply is not a JSON object.
+    """
+    import socket
+    with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as conn:
+        conn.settimeout(DAEMON_CONNECT_SECONDS)
+        conn.connect(str(socket_path))
+        # The daemon serves one request at a time, so the reply may take
+        # as long as the requests queued before this one
+        conn.settimeout(None)
+        conn.sendall(json.dumps(message).encode("utf-8"))
+        conn.shutdown(socket.SHUT_WR)
+        return clutil_daemon_receive(conn)
+
+
+def clutil_daemon_forward(argv: list[str]) -> Optional[int]:
+    """
+    Runs a command in this repository's daemon, if one is running.
+
+    Only commands in DAEMON_COMMANDS are forwarded, and only when none of
+    DAEMON_BYPASS_ENV is set. The daemon's output is written to this
+    process's stdout and stderr.
+
+    Args:
+        argv (list[str]): Command-line arguments, without the program name.
+
+    Returns:
+        Optional[int]: The command's exit status, or None if the command
+                       has to run in-process (no daemon, or the daemon
+                       declined or failed).
+    """
+    if not argv or argv[0] not in DAEMON_COMMANDS or sys.platform == "win32":
+        return None
+    if any(name in os.environ for name in DAEMON_BYPASS_ENV):
+        return None
+    try:
+        cwd = os.getcwd()
+    except OSError:
+        return None
+    git_dir = clutil_locate_git_dir(Path(cwd))
+    if git_dir is None or not (git_dir / DAEMON_SOCKET_NAME).exists() or \
+            not clutil_daemon_supported():
+        return None
+
+    request = {"argv": argv, "cwd": cwd, "tty": sys.stdout.isatty(),
+               "no_color": os.environ.get("NO_COLOR", "")}
+    try:
+        reply = clutil_daemon_request(git_dir / DAEMON_SOCKET_NAME, request)
+        if reply.get("fallback"):
+            return None
+        stdout, stderr, code = reply["stdout"], reply["stderr"], reply["exit"]
+    except (OSError, ValueError, KeyError):
+        # Includes a socket left behind by a daemon that was killed
+        return None
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return code
+
+
+def clutil_daemon_handle(parser: argparse.ArgumentParser, request: dict,
+                         git_dir: Path) -> dict:
+    """
+    Runs one forwarded command inside the daemon.
+
+    The command runs as it would in the client: in the client's working
+    directory, with its NO_COLOR setting and terminal state, and with
+    stdout and stderr captured for the reply.
+
+    Args:
+        parser (argparse.ArgumentParser): The git-cl argument parser.
+        request (dict): 'argv', 'cwd', 'tty' and 'no_color' from the client.
+        git_dir (Path): The daemon's resolved Git directory.
+
+    Returns:
+        dict: 'stdout', 'stderr' and 'exit', or 'fallback' if the client
+              has to run the command itself.
+    """
+    fallback = {"fallback": True}
+    argv = request.get("argv")
+    cwd = request.get("cwd")
+    if not isinstance(argv, list) or not argv or \
+            argv[0] not in DAEMON_COMMANDS or not isinstance(cwd, str):
+        return fallback
+    if clutil_locate_git_dir(Path(cwd)) != git_dir:
+        return fallback
+    try:
+        os.chdir(cwd)
+    except OSError:
+        return fallback
+
+    if request.get("no_color"):
+        os.environ["NO_COLOR"] = request["no_color"]
+    else:
+        os.environ.pop("NO_COLOR", None)
+
+    stdout = DaemonOutput(tty=bool(request.get("tty")))
+    stderr = io.StringIO()
+    code = 0
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            clutil_refresh_repo_context(_DAEMON_CACHE)
+            args = parser.parse_args(argv)
+            args.parser = parser
+            args.func(args)
+    except SystemExit as error:
+        if isinstance(error.code, int):
+            code = error.code
+        elif error.code is not None:
+            stderr.write(f"{error.code}\n")
+            code = 1
+    except Exception:  # pylint: disable=broad-except
+        # Let the client run the command itself and report the error
+        return fallback
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(),
+            "exit": code}
+
+
+def clutil_daemon_serve() -> None:
+    """
+    Runs the daemon for the current repository until stopped or idle.
+
+    Listens on DAEMON_SOCKET_NAME in the Git directory and answers one
+    connection at a time: forwarded commands (clutil_daemon_handle()) and
+    the control messages 'ping' and 'stop'. The argument parser, the
+    repository context, the configuration, the changelist store and the
+    status map are kept between requests (see _DAEMON_CACHE). Exits after
+    DAEMON_IDLE_SECONDS without a request.
+    """
+    import socket
+    global _DAEMON_CACHE  # pylint: disable=global-statement
+
+    git_dir = clutil_get_repo_context().git_dir.resolve()
+    socket_path = git_dir / DAEMON_SOCKET_NAME
+    if socket_path.exists():
+        try:
+            clutil_daemon_request(socket_path, {"control": "ping"})
+            print("git-cl daemon is already running.")
+            return
+        except (OSError, ValueError):
+            # Left behind by a daemon that was killed
+            socket_path.unlink()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(str(socket_path))
+    except OSError as error:
+        server.close()
+        print(f"Error: Cannot listen on '{socket_path}': {error}")
+        sys.exit(1)
+    finally:
+        os.umask(old_umask)
+
+    parser = clutil_build_parser()
+    _DAEMON_CACHE = {}
+    started = time.time()
+    served = 0
+    print(f"git-cl daemon listening on {socket_path}")
+    sys.stdout.flush()
+    try:
+        with closing(server):
+            server.listen()
+            server.settimeout(DAEMON_IDLE_SECONDS)
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    break
+                with closing(conn):
+                    try:
+                        conn.settimeout(DAEMON_CONNECT_SECONDS)
+                        message = clutil_daemon_receive(conn)
+                        control = message.get("control")
+                        if control == "stop":
+                            conn.sendall(b'{"stopped": true}')
+                            break
+                        if control == "ping":
+                            reply = {"pid": os.getpid(), "served": served,
+                                     "uptime": time.time() - started}
+                        else:
+                            reply = clutil_daemon_handle(parser, message,
+                                                         git_dir)
+                            served += 1
+                        conn.sendall(json.dumps(reply).encode("utf-8"))
+                    except (OSError, ValueError):
+                        continue
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _DAEMON_CACHE = None
+        try:
+            socket_path.unlink()
+        except OSError:
+            pass
+
+
+# =============================================================================
+# PUBLIC API
+# =============================================================================
+
+# For scripts that run many changelist operations in one process:
+#
+#     import git_cl
+#
+#     repo = git_cl.Repo("path/to/repo")
+#     repo.add("docs", ["README.md", "docs/guide.md"])
+#     for entry in repo.status().changelists["docs"]:
+#         print(entry.code, entry.path)
+#
+# The CLI commands below render the results of the same functions.
+
+
+def clutil_check_name(name: str) -> None:
+    """
+    Raises InvalidNameError unless name is a valid changelist name.
+
+    Args:
+        name: Changelist name to check
+    """
+    if not clutil_validate_name(name):
+        raise InvalidNameError(
+            f"Error: Invalid changelist name '{name}'. Names cannot "
+            "contain special characters or be Git reserved words.")
+
+
+def clutil_status_report(show_all: bool = False,
+                         warn_skipped: bool = True) -> StatusReport:
+    """
+    Collects what 'git cl status' shows, without printing it.
+
+    The metadata is read without locking, like in other read-only commands.
+
+    Args:
+        show_all: Include files with uncommon status codes, as --all does
+        warn_skipped: Print the note about files with uncommon codes
+
+    Returns:
+        StatusReport: Changelists, unassigned files and stashes.
+    """
+    changelists = clutil_load(lock=False)
+    stashes = clutil_load_stashes(lock=False)
+    git_root = clutil_get_git_root()
+    status_map = clutil_get_file_status_map(show_all=show_all,
+                                            warn_skipped=warn_skipped)
+
+    active = {}
+    assigned = set()
+    for name, files in changelists.items():
+        # Skip empty lists and leftovers of the old stash implementation
+        if not files or name.endswith("_stashed"):
+            continue
+        entries = active[name] = []
+        for file in files:
+            code = status_map.get(file, "  ")
+            if code == "  " and not (git_root / file).exists():
+                code = "XX"  # Deleted (committed) but still in the changelist
+            entries.append(FileStatus(file, code, name))
+        assigned.update(files)
+
+    unassigned = [FileStatus(path, status_map[path], None)
+                  for path in sorted(status_map) if path not in assigned]
+    stashed = [StashedChangelist(name, data.get("files", []),
+                                 clutil_get_stash_source_branch(data),
+                                 data.get("timestamp", ""))
+               for name, data in stashes.items()]
+    stashed.sort(key=lambda stash: stash.timestamp, reverse=True)
+
+    return StatusReport(active, unassigned, stashed,
+                        clutil_detect_merge_conflicts(status_map), status_map)
+
+
+def clutil_add_files(name: str, file_args: list[str]) -> AddResult:
+    """
+    Adds files to a changelist, creating it if needed; 'git cl add' once
+    its pathspecs are expanded.
+
+    Files are moved out of other active changelists. Invalid paths are
+    skipped and missing files added, each with a warning.
+
+    Args:
+        name: Changelist name
+        file_args: Paths relative to the current directory, or absolute
+
+    Returns:
+        AddResult: The files added.
+
+    Raises:
+        InvalidNameError: If name is not a valid changelist name.
+        StashedFilesError: If any file is in a stashed changelist.
+    """
+    clutil_check_name(name)
+
+    changelists = clutil_load()
+    stashes = clutil_load_stashes()
+    git_root = clutil_get_git_root()
+
+    files, missing, skipped = [], [], []
+    for file, sanitized in zip(file_args,
+                               clutil_sanitize_paths(file_args, git_root)):
+        if sanitized:
+            # Check if file exists and warn if not
+            if not os.path.exists(git_root / sanitized):
+                print(f"Warning: File '{file}' does not exist.")
+                missing.append(sanitized)
+            files.append(sanitized)
+        else:
+            print(f"Warning: Skipping invalid or unsafe path: '{file}'")
+            skipped.append(file)
+
+    # Check if any files are in stashed changelists
+    blocked = []
+    for file_path in files:
+        stash_name = stashes.owner(file_path)
+        if stash_name is not None:
+            blocked.append(f"  {file_path} (in stashed changelist "
+                           f"'{stash_name}')")
+
+    if blocked:
+        raise StashedFilesError("\n".join(
+            ["Error: Cannot add files that are in stashed changelists:",
+             *blocked,
+             "Unstash the changelist first if you want to modify it."]))
+
+    # Moves files out of other active changelists
+    changelists.assign(name, files)
+    clutil_save(changelists)
+    return AddResult(name, files, missing, skipped)
+
+
+def clutil_remove_files(file_args: list[str]) -> list[tuple[str, str]]:
+    """
+    Removes files from the changelists they are in; 'git cl remove'.
+
+    Args:
+        file_args: Paths relative to the current directory, or absolute
+
+    Returns:
+        list[tuple[str, str]]: (path, changelist) for each removed file.
+    """
+    changelists = clutil_load()
+
+    git_root = clutil_get_git_root()
+    to_remove = []
+    for file, sanitized in zip(file_args,
+                               clutil_sanitize_paths(file_args, git_root)):
+        if sanitized is None:
+            print(f"Warning: Skipping invalid or unsafe path: '{file}'")
+        elif changelists.owner(sanitized) is None:
+            print(f"'{file}' was not found in any changelist.")
+        else:
+            to_remove.append(sanitized)
+
+    removed = changelists.discard(to_remove)
+    for sanitized, name in removed:
+        print(f"Removed '{sanitized}' from changelist '{name}'")
+
+    if removed:
+        clutil_save(changelists)
+    return removed
+
+
+def clutil_delete_changelists(names: list[str]) -> list[str]:
+    """
+    Deletes active changelists by name; 'git cl delete <names>'.
+
+    Args:
+        names: Changelist names
+
+    Returns:
+        list[str]: The names that were found and deleted.
+    """
+    changelists = clutil_load()
+
+    deleted = []
+    for name in names:
+        if name in changelists:
+            del changelists[name]
+            print(f"Deleted changelist '{name}'")
+            deleted.append(name)
+        else:
+            print(f"Changelist '{name}' not found.")
+
+    if deleted:
+        clutil_save(changelists)
+    return deleted
+
+
+def clutil_stash_changelist(name: str, quiet: bool = False) -> StashResult:
+    """
+    Stashes the changes of one changelist; 'git cl stash <name>'.
+
+    Metadata is read and written once, under one lock.
+
+    Args:
+        name: Changelist name
+        quiet: If True, suppress verbose output for workflow contexts
+
+    Returns:
+        StashResult: The stashed files and the stash entry.
+
+    Raises:
+        ChangelistNotFoundError: If there is no active changelist name.
+        MergeConflictError: If merge conflicts are unresolved.
+        StashError: If the changelist is stashed already or empty, or
+                    nothing could be stashed.
+    """
+    with clutil_metadata_transaction() as txn:
+        changelists, stashes = txn.changelists, txn.stashes
+
+        # Validate preconditions
+        error_msg = clutil_validate_stash_preconditions(name, changelists, stashes)
+        if error_msg:
+            if name not in changelists:
+                raise ChangelistNotFoundError(error_msg)
+            raise StashError(error_msg)
+
+        git_root = clutil_get_git_root()
+        files = changelists[name]
+
+        # Get file statuses
+        status_map = clutil_get_file_status_map(show_all=True, paths=files)
+
+        message = clutil_merge_conflict_message(status_map, "stash")
+        if message:
+            raise MergeConflictError(message)
+
+        try:
+            with clutil_stash_builder(git_root) as builder:
+                pushed = clutil_push_changelist_stash(name, files, status_map,
+                                                      git_root, builder,
+                                                      quiet=quiet)
+        except (subprocess.CalledProcessError, ValueError) as error:
+            raise StashError(f"Error creating stash: {error}") from error
+        if not pushed:
+            raise StashError(f"Nothing was stashed for changelist '{name}'.",
+                             reported=True)
+        stash_ref, stash_oid, file_categories, stashable_files = pushed
+        current_branch = clutil_get_current_branch()
+
+        # Save metadata atomically, before the working tree is touched
+        try:
+            clutil_save_stash_metadata_atomic(
+                name, stash_ref, stash_oid, files, file_categories, txn
+            )
+        except (OSError, subprocess.CalledProcessError,
+                json.JSONDecodeError) as error:
+            clutil_handle_stash_failure(error, name, stash_ref, txn)
+            raise StashError(f"Error during atomic operation: {error}",
+                             reported=True) from error
+
+        clutil_finish_stash(stashable_files, status_map, git_root)
+
+        # Success! Print appropriate message based on context
+        if not quiet:
+            clutil_print_stash_success(name, stashable_files,
+                                       file_categories, current_branch)
+
+    return StashResult(name, stashable_files, stash_ref, current_branch)
+
+
+# The Repo the cached repository context and configuration belong to
+_ACTIVE_REPO = None
+
+
+class Repo:
+    """
+    In-process access to the changelists of one Git working tree.
+
+    Meant for scripts that run many operations: Python starts once, and
+    the repository root, Git directory and configuration are looked up
+    once and afterwards only re-checked with a few stat() calls.
+
+    Methods return NamedTuple records and raise GitClError subclasses
+    where 'git cl' would print. Paths are relative to the repository
+    root, or absolute; wildcards and pathspec magic are not expanded.
+    Each call runs in the repository root with stdout captured, so a
+    Repo must not be used from several threads at once.
+
+    Args:
+        path: Any directory inside the working tree
+
+    Raises:
+        NotARepositoryError: If path is not inside a Git working tree.
+
+    Example:
+        >>> repo = Repo("path/to/repo")
+        >>> repo.add("docs", ["README.md"]).files
+        ['README.md']
+    """
+
+    def __init__(self, path: str = "."):
+        result = clutil_run_git(
+            ["git", "-C", str(path), "rev-parse", "--show-toplevel"],
+            capture_output=True, text=True, check=False)
+        if result.returncode != 0 or not result.stdout.strip():
+            raise NotARepositoryError(
+                f"Error: '{path}' is not inside a Git working tree.")
+        self.root = Path(result.stdout.strip()).resolve()
+        self._state = {}
+
+    def __repr__(self) -> str:
+        return f"Repo({str(self.root)!r})"
+
+    @contextmanager
+    def _activate(self) -> Iterator[None]:
+        """
+        Runs the body in the repository root with stdout captured.
+
+        The cached repository context and configuration are reset when
+        a different Repo used them last, and otherwise refreshed.
+        """
+        global _ACTIVE_REPO  # pylint: disable=global-statement
+        previous_cwd = os.getcwd()
+        os.chdir(self.root)
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output):
+                if _ACTIVE_REPO is not self:
+                    clutil_reset_repo_context()
+                    clutil_get_config.cache_clear()
+                    self._state.clear()
+                    _ACTIVE_REPO = self
+                clutil_refresh_repo_context(self._state)
+                yield
+        except GitClError as error:
+            error.output = output.getvalue()
+            raise
+        except SystemExit as error:
+            # A helper gave up after printing why
+            failure = GitClError(output.getvalue().strip()
+                                 or f"git-cl exited with status {error.code}",
+                                 reported=True)
+            failure.output = output.getvalue()
+            raise failure from None
+        finally:
+            os.chdir(previous_cwd)
+
+    def status(self, show_all: bool = False) -> StatusReport:
+        """
+        Returns what 'git cl status' shows.
+
+        Args:
+            show_all: Include files with uncommon status codes
+        """
+        with self._activate():
+            return clutil_status_report(show_all=show_all)
+
+    def add(self, name: str, paths: list[str]) -> AddResult:
+        """
+        Adds files to a changelist, moving them out of any other.
+
+        Raises:
+            InvalidNameError: If name is not a valid changelist name.
+            StashedFilesError: If any file is in a stashed changelist.
+        """
+        with self._activate():
+            return clutil_add_files(name, [str(path) for path in paths])
+
+    def remove(self, paths: list[str]) -> dict[str, str]:
+        """
+        Removes files from their changelists.
+
+        Returns:
+            dict[str, str]: The changelist each removed file was in, by path.
+        """
+        with self._activate():
+            return dict(clutil_remove_files([str(path) for path in paths]))
+
+    def delete(self, name: str) -> None:
+        """
+        Deletes an active changelist; its files are not changed.
+
+        Raises:
+            ChangelistNotFoundError: If there is no changelist name.
+        """
+        with self._activate():
+            if not clutil_delete_changelists([name]):
+                raise ChangelistNotFoundError(
+                    f"Changelist '{name}' not found.")
+
+    def stash(self, name: str) -> StashResult:
+        """
+        Stashes the changes of a changelist and resets its files.
+
+        Raises:
+            ChangelistNotFoundError: If there is no active changelist name.
+            MergeConflictError: If merge conflicts are unresolved.
+            StashError: If nothing could be stashed.
+        """
+        with self._activate():
+            return clutil_stash_changelist(name)
+
+    def unstash(self, name: str, force: bool = False) -> UnstashResult:
+        """
+        Restores a stashed changelist.
+
+        Args:
+            name: Changelist name
+            force: Unstash despite branch and conflict warnings
+
+        Raises:
+            ChangelistNotFoundError: If there is no stashed changelist name.
+            MergeConflictError: If merge conflicts are unresolved.
+            StashError: If the changelist could not be restored.
+        """
+        with self._activate():
+            message = clutil_merge_conflict_message(
+                clutil_get_unmerged_status_map(), "unstash")
+            if message:
+                raise MergeConflictError(message)
+            return clutil_unstash_single(name, force)
+
+
+# =============================================================================
+# CLI COMMANDS
+# =============================================================================
+
+
+def cl_add(args: argparse.Namespace) -> None:
+    """
+    Adds one or more files to the specified changelist, creating it if needed.
+    Prevents adding files that are in stashed changelists. Directories,
+    wildcards and pathspec magic are expanded by clutil_expand_pathspecs().
+    """
+    try:
+        clutil_check_name(args.name)
+    except GitClError as error:
+        clutil_print_error(error)
+        return
+
+    file_args = clutil_get_file_arguments(args)
+    if file_args is None:
+        return
+
+    # Globs, pathspec magic and directories are expanded by Git in one go
+    patterns = [arg for arg in file_args if clutil_is_pathspec_pattern(arg)]
+    if patterns:
+        expanded = clutil_expand_pathspecs(patterns)
+        if expanded is None:
+            return
+        if not expanded:
+            print("Warning: No files matched: "
+                  + ", ".join(f"'{pattern}'" for pattern in patterns))
+        pattern_set = set(patterns)
+        file_args = [arg for arg in file_args
+                     if arg not in pattern_set] + expanded
+
+    try:
+        result = clutil_add_files(args.name, file_args)
+    except GitClError as error:
+        clutil_print_error(error)
+        return
+
+    if not (args.stdin or args.pathspec_from_file or patterns):
+        print(f"Added to '{args.name}': {result.files}")
+    else:
+        print(f"Added {len(result.files)} file(s) to '{args.name}'.")
+
+
+def cl_stage(args: argparse.Namespace) -> None:
+    """
+    Stages all tracked files in the given changelist and optionally
+    deletes the changelist.
+
+    Args:
+        args: argparse.Namespace with 'name' and 'delete' attributes.
+    """
+    changelists = clutil_load()
+    name = args.name
+    if name not in changelists:
+        print(f"Changelist '{name}' not found.")
+        return
+
+    git_root = clutil_get_git_root()
+    to_stage = []
+
+    # Fetch git status once for the changelist's files and reuse it
+    status_map = clutil_get_file_status_map(show_all=True,
+                                            paths=changelists[name])
+
+    if clutil_refuse_on_merge_conflict(status_map, "stage"):
+        return
+
+    for stored_path in changelists[name]:
+        # Convert stored path (relative to git root) to absolute path
+        abs_path = (git_root / stored_path).resolve()
+
+        if not abs_path.exists():
+            print(f"Warning: '{stored_path}' does not exist.")
+            continue
+
+        # Convert to path relative to current working directory for Git command
+        rel_to_cwd = _relpath(abs_path, Path.cwd().resolve())
+
+        if not clutil_is_file_untracked_cached(stored_path, status_map):
+            to_stage.append(rel_to_cwd)
+
+    if not to_stage:
+        print(f"No tracked files to stage in changelist '{name}'.")
+        return
+
+    try:
+        clutil_run_git(["git", "add", "--"] + to_stage, check=True)
+        print(f"Staged tracked files from changelist '{name}':")
+        for file in to_stage:
+            print(f"  {file}")
+    except subprocess.CalledProcessError as error:
+        print(f"Error staging files: {error}")
+        return
+
+    # Only delete if --delete flag is set
+    if args.delete:
+        del changelists[name]
+        clutil_save(changelists)
+        print(f"Deleted changelist '{name}'")
+
+
+def cl_unstage(args: argparse.Namespace) -> None:
+    """
+    Unstages all staged files in the specified changelist, moving them back
+    to the working directory as unstaged changes.
+
+    Args:
+        args: argparse.Namespace with 'name' and 'keep' attributes.
+    """
+    changelists = clutil_load()
+    name = args.name
+    if name not in changelists:
+        print(f"Changelist '{name}' not found.")
+        return
+
+    git_root = clutil_get_git_root()
+    to_unstage = []
+
+    # Get current status of the changelist's files to identify staged files
+    status_map = clutil_get_file_status_map(show_all=True,
+                                            paths=changelists[name])
+
+    if clutil_refuse_on_merge_conflict(status_map, "unstage"):
+        return
+
+    for stored_path in changelists[name]:
+        # Convert stored path (relative to git root) to absolute path
+        abs_path = (git_root / stored_path).resolve()
+
+        if not abs_path.exists():
+            print(f"Warning: '{stored_path}' does not exist.")
+            continue
+
+        # Convert to path relative to current working directory for Git command
+        rel_to_cwd = _relpath(abs_path, Path.cwd().resolve())
+
+        # Check if this file has staged changes
+        rel_to_git_root = abs_path.relative_to(git_root).as_posix()
+        status = status_map.get(rel_to_git_root, "  ")
+
+        # File has staged changes if first character is not space
+        if status[0] != " ":
+            to_unstage.append(rel_to_cwd)
+
+    if not to_unstage:
+        print(f"No staged files to unstage in changelist '{name}'.")
+        return
+
+    try:
+        # Use git reset HEAD to unstage files
+        clutil_run_git(["git", "reset", "HEAD", "--"] + to_unstage, check=True)
+        print(f"Unstaged files from changelist '{name}':")
+        for file in to_unstage:
+            print(f"  {file}")
+    except subprocess.CalledProcessError as error:
+        print(f"Error unstaging files: {error}")
+        return
+
+    # Only delete if --delete flag is set
+    if args.delete:
+        del changelists[name]
+        clutil_save(changelists)
+        print(f"Deleted changelist '{name}'")
+
+
+def cl_status(args: argparse.Namespace) -> None:
+    """
+    Displays git status grouped by changelist membership,
+    including stashed changelists.
+
+    Shows active changelists first, then a separate "Stashed Changelists" section,
+    then unassigned files. Filtering by changelist names applies only to active
+    changelists unless --include-no-cl is specified.
+
+    With --porcelain (-z) or --json, the same files are written as records
+    for other programs, straight from the status report: paths stay
+    relative to the repository root and no colours or notes are added.
+    Files the display lists under "No Changelist" have no changelist.
+    """
+    porcelain = args.porcelain or args.z
+    if args.json and porcelain:
+        print("Error: --json cannot be used with --porcelain or -z.")
+        return
+
+    selected_names = set(args.names) if args.names else None
+    machine = args.json or porcelain
+    report = clutil_status_report(show_all=args.all, warn_skipped=not machine)
+    changelists, no_cl_files = clutil_select_status_entries(
+        report, selected_names, args.include_no_cl)
+
+    if args.json:
+        stashed = report.stashed if selected_names is None else []
+        sys.stdout.writelines(
+            clutil_iter_json_records(changelists, no_cl_files, stashed))
+        return
+    if porcelain:
+        sys.stdout.writelines(
+            clutil_iter_porcelain_records(changelists, no_cl_files, args.z))
+        return
+
+    git_root = clutil_get_git_root()
+    cwd = Path.cwd().resolve()
+    use_color = clutil_should_use_color(args)
+
+    # Show active changelists
+    for cl_name, entries in changelists.items():
+        clutil_show_file_statuses(f"{cl_name}:", entries, git_root, cwd,
+                                  use_color)
+
+    # Show stashed changelists section
+    if report.stashed and (selected_names is None):  # Only when not filtering
+        if changelists:
+            print()  # Add spacing
+        clutil_show_stashed_changelists(report.stashed)
+
+    # Show unassigned files
+    if no_cl_files:
+        if changelists or report.stashed:
+            print()  # Add spacing
+        clutil_show_file_statuses("No Changelist:", no_cl_files, git_root,
+                                  cwd, use_color)
+
+    # Advise user if conflicts are present
+    if report.conflicts:
+        print()
+        print(f"Note: {len(report.conflicts)} file(s) with merge conflicts. "
+              "Resolve before staging, committing, or stashing.")
+
+
+def cl_diff(args: argparse.Namespace) -> None:
+    """
+    Show git diff for one or more changelists.
+
+    By default, shows unstaged changes (like `git diff`).
+    Use --staged for staged changes, or --both to show both.
+
+    Args:
+        args: argparse.Namespace with 'names' list of changelists,
+              and optional 'staged' and 'both' flags
+    """
+    changelists = clutil_load()
+    git_root = clutil_get_git_root()
+    diff_files = set()
+
+    for name in args.names:
+        if name not in changelists:
+            print(f"Changelist '{name}' not found.")
+            continue
+        for path in changelists[name]:
+            abs_path = (git_root / path).resolve()
+            if abs_path.exists():
+                rel_to_cwd = _relpath(abs_path, Path.cwd().resolve())
+                diff_files.add(rel_to_cwd)
+            else:
+                print(f"Warning: File '{path}' from '{name}' does not exist.")
+
+    if not diff_files:
+        print("No valid files to diff.")
+        return
+
+    sorted_files = sorted(diff_files)
+
+    try:
+        if args.both:
+            # Show both unstaged and staged diffs
+            print("=== Unstaged changes (working tree vs index) ===")
+            clutil_run_git(["git", "diff", "--"] + sorted_files, check=False)
+            print("\n=== Staged changes (index vs HEAD) ===")
+            clutil_run_git(["git", "diff", "--staged", "--"] + sorted_files,
+                           check=False)
+        elif args.staged:
+            # Show only staged changes
+            clutil_run_git(["git", "diff", "--staged", "--"] + sorted_files,
+                           check=False)
+        else:
+            # Default: show unstaged changes
+            clutil_run_git(["git", "diff", "--"] + sorted_files, check=False)
+    except subprocess.CalledProcessError as error:
+        print(f"Error running git diff: {error}")
+
+
+def cl_checkout(args: argparse.Namespace) -> None:
+    """
+    Checkout (revert) files from one or more changelists to their HEAD state.
+
+    This discards local changes in the working directory for the specified files,
+    reverting them to their last committed state. Useful for undoing unwanted
+    local modifications. Optionally deletes the changelist(s) after checkout.
+
+    Args:
+        args: argparse.Namespace with 'names' list of changelist names,
+              optional 'force' flag for confirmation, and optional 'delete'
+              flag to remove changelist(s) after checkout.
+    """
+    changelists = clutil_load()
+    git_root = clutil_get_git_root()
+
+    # Check for merge conflicts before doing anything destructive. Only
+    # the conflicts matter here, and those can be read from the index.
+    if clutil_refuse_on_merge_conflict(clutil_get_unmerged_status_map(),
+                                       "checkout"):
+        return
+
+    # Collect all files from specified changelists
+    all_files = []
+    missing_changelists = []
+
+    for name in args.names:
+        if name not in changelists:
+            missing_changelists.append(name)
+            continue
+
+        files = changelists[name]
+        if not files:
+            print(f"Warning: Changelist '{name}' is empty.")
+            continue
+
+        all_files.extend(files)
+
+    # Report missing changelists
+    if missing_changelists:
+        print("Error: The following changelists were not found:")
+        for name in missing_changelists:
+            print(f"  {name}")
+        if not all_files:  # No valid changelists found
+            return
+
+    if not all_files:
+        print("No files to checkout.")
+        return
+
+    # Convert to paths relative to current working directory for git command
+    checkout_files = []
+    missing_files = []
+
+    for stored_path in all_files:
+        abs_path = (git_root / stored_path).resolve()
+
+        if not abs_path.exists():
+            missing_files.append(stored_path)
+            continue
+
+        rel_to_cwd = _relpath(abs_path, Path.cwd().resolve())
+        checkout_files.append(rel_to_cwd)
+
+    # Report missing files
+    if missing_files:
+        print("Warning: The following files do not exist and will be skipped:")
+        for file_path in missing_files:
+            print(f"  {file_path}")
+
+    if not checkout_files:
+        print("No existing files to checkout.")
+        return
+
+    # Show what will be affected and ask for confirmation unless --force
+    print(f"This will discard local changes in {len(checkout_files)} file(s):")
+    for file_path in checkout_files[:10]:  # Show first 10 files
+        print(f"  {file_path}")
+    if len(checkout_files) > 10:
+        print(f"  ... and {len(checkout_files) - 10} more files")
+
+    if not args.force:
+        try:
+            response = input("\nProceed? [y/N]: ").strip().lower()
+            if response not in ('y', 'yes'):
+                print("Checkout cancelled.")
+                return
+        except (EOFError, KeyboardInterrupt):
+            print("\nCheckout cancelled.")
+            return
+
+    # Perform the checkout
+    try:
+        clutil_run_git(["git", "checkout", "HEAD", "--"] + checkout_files,
+                       check=True)
+        print(f"Successfully reverted {len(checkout_files)} file(s) to HEAD state.")
+
+        # Show summary by changelist
+        print("\nFiles reverted by changelist:")
+        for name in args.names:
+            if name in changelists and changelists[name]:
+                reverted_count = sum(1 for f in changelists[name]
+                                     if f in all_files and
+                                     (git_root / f).resolve().exists())
+                if reverted_count > 0:
+                    print(f"  {name}: {reverted_count} files")
+
+        # Delete changelists if --delete flag is set
+        if args.delete:
+            deleted_any = False
+            for name in args.names:
+                if name in changelists:
+                    del changelists[name]
+                    print(f"Deleted changelist '{name}'")
+                    deleted_any = True
+
+            if deleted_any:
+                clutil_save(changelists)
+
+    except subprocess.CalledProcessError as error:
+        print(f"Error during checkout: {error}")
+        print("Some files may not have been reverted.")
+
+
+def cl_remove(args: argparse.Namespace) -> None:
+    """
+    Removes one or more files from any changelists they are part of.
+
+    Args:
+        args: argparse.Namespace with 'files' attribute, or a pathspec
+              file given by 'stdin' / 'pathspec_from_file'.
+    """
+    file_args = clutil_get_file_arguments(args)
+    if file_args is None:
+        return
+
+    clutil_remove_files(file_args)
+
+
+def cl_delete(args: argparse.Namespace) -> None:
+    """
+    Deletes one or more changelists by name, or all with --all.
+    """
+    if args.all and args.names:
+        print("Error: Cannot specify changelist names and --all together.")
+        return
+
+    if args.all:
+        changelists = clutil_load()
+        if not changelists:
+            print("No changelists to delete.")
+            return
+        count = len(changelists)
+        changelists.clear()
+        clutil_save(changelists)
+        print(f"Deleted all {count} changelists.")
+        return
+
+    if not args.names:
+        print("Error: No changelist names provided.")
+        return
+
+    clutil_delete_changelists(args.names)
+
+
+def cl_commit(args: argparse.Namespace) -> None:
+    """
+    Commits all tracked files in the specified changelist, then optionally
+    deletes it.
+
+    Args:
+        args: argparse.Namespace with 'name', 'message'/'file',
+              and 'keep' attributes.
+    """
+    changelists = clutil_load()
+    name = args.name
+    if name not in changelists:
+        print(f"Changelist '{name}' not found.")
+        return
+
+    git_root = clutil_get_git_root()
+    to_commit = []
+
+    # Fetch git status once for the changelist's files and reuse it
+    status_map = clutil_get_file_status_map(show_all=True,
+                                            paths=changelists[name])
+
+    if clutil_refuse_on_merge_conflict(status_map, "commit"):
+        return
+
+    for stored_path in changelists[name]:
+        # Convert stored path (relative to git root) to absolute path
+        abs_path = (git_root / stored_path).resolve()
+
+        if not abs_path.exists():
+            print(f"Warning: '{stored_path}' does not exist.")
+            continue
+
+        # Convert to path relative to current working directory for Git command
+        rel_to_cwd = _relpath(abs_path, Path.cwd().resolve())
+
+        if not clutil_is_file_untracked_cached(stored_path, status_map):
+            to_commit.append(rel_to_cwd)
+
+    if not to_commit:
+        print(f"No tracked files to commit in changelist '{name}'.")
+        return
+
+    commit_message = clutil_resolve_commit_message(args)
+    if not commit_message:
+        return
+
+    try:
+        clutil_run_git(["git", "commit", "-m", commit_message, "--"]
+                       + to_commit, check=True)
+        print(f"Committed tracked files from changelist '{name}':")
+        for file in to_commit:
+            print(f"  {file}")
+    except subprocess.CalledProcessError as error:
+        print(f"Error committing changelist '{name}': {error}")
+        return
+
+    if not args.keep:
+        del changelists[name]
+        clutil_save(changelists)
+        print(f"Deleted changelist '{name}'")
+    else:
+        print(f"Kept changelist '{name}'")
+
+
+def cl_stash(args: argparse.Namespace, quiet: bool = False) -> None:
+    """
+    Stash all unstaged changes for files in specified changelist(s).
+    Supports --all to stash all active changelists.
+    Tracks source branch for better workflow support.
+
+    Accepts files with:
+    - Unstaged changes (modified, deleted)
+    - Newly added to index (staged additions)
+    - Untracked files (if explicitly in changelist)
+
+    Args:
+        args: argparse.Namespace with 'name'
+              (or None for --all), 'all' and 'migrate_refs' attributes.
+        quiet: If True, suppress verbose output for workflow contexts
+    """
+    # Handle --all flag
+    if getattr(args, 'all', False):
+        clutil_stash_all_changelists(clutil_load(), quiet=quiet)
+        return
+
+    if getattr(args, 'migrate_refs', False):
+        clutil_migrate_stash_refs()
+        return
+
+    try:
+        clutil_stash_changelist(args.name, quiet=quiet)
+    except GitClError as error:
+        clutil_print_error(error)
+
+
+def cl_unstash(args: argparse.Namespace, quiet: bool = False) -> None:
+    """
+    Restore a stashed changelist to the working directory.
+    Enforces clean branch workflow by default.
+    Supports --all to unstash all stashed changelists.
+
+    Args:
+        args: argparse.Namespace with 'name' (or None for --all),
+            'force', and 'all' attributes.
+        quiet: If True, suppress verbose output for workflow contexts
+    """
+    # Only merge conflicts matter here, and those live in the index
+    if clutil_refuse_on_merge_conflict(clutil_get_unmerged_status_map(),
+                                       "unstash"):
+        return
+
+    # Handle --all flag
+    if getattr(args, 'all', False):
+        clutil_unstash_all_changelists(getattr(args, 'force', False))
+        return
+
+    try:
+        clutil_unstash_single(args.name, getattr(args, 'force', False),
+                              quiet=quiet)
+    except GitClError as error:
+        clutil_print_error(error)
+
+
+def clutil_unstash_single(
+    name: str,
+    force: bool,
+    quiet: bool = False,
+    status_map: Optional[dict[str, str]] = None,
+    is_dirty: Optional[bool] = None
+) -> UnstashResult:
+    """
+    Restore one stashed changelist; the body of 'git cl unstash <name>'.
+
+    Callers that already know the state of the working tree, such as
+    cl_branch(), pass it in so it is not read from Git again.
+
+    Args:
+        name: Changelist name (with or without _stashed suffix)
+        force: Whether to force unstash despite warnings and conflicts
+        quiet: If True, suppress verbose output for workflow contexts
+        status_map: Status of the changelist's files; queried when None
+        is_dirty: Whether the working tree has changes; checked when None
+
+    Returns:
+        UnstashResult: The restored changelist.
+
+    Raises:
+        ChangelistNotFoundError: If there is no stashed changelist name.
+        StashError: If the changelist cannot or could not be restored.
+    """
+    # Metadata is read and written once
+    with clutil_metadata_transaction() as txn:
+        changelists, stashes = txn.changelists, txn.stashes
+        base_name, stash_key = clutil_resolve_unstash_name(name)
+
+        # Validate environment and get stash data
+        error_msg, stash_data = clutil_validate_unstash_environment(
+            base_name, stash_key, stashes, changelists, force, is_dirty=is_dirty
+        )
+        if error_msg:
+            if stash_key not in stashes:
+                raise ChangelistNotFoundError(error_msg)
+            raise StashError(error_msg)
+
+        files = stash_data["files"]
+        git_root = clutil_get_git_root()
+        # The helpers below print why they fail
+        failed = StashError(f"Changelist '{base_name}' was not unstashed.",
+                            reported=True)
+
+        # Check for conflicts (suppress verbose output in quiet mode)
+        if not clutil_check_and_report_conflicts(files, git_root, base_name,
+                                                 force, quiet=quiet,
+                                                 status_map=status_map):
+            raise failed
+
+        # Verify stash still exists and update reference
+        stash_ref = clutil_verify_and_update_stash_ref(base_name, stashes)
+        if not stash_ref:
+            raise failed
+
+        # Apply the stash (suppress verbose output in quiet mode)
+        if not clutil_apply_stash(stash_ref, base_name, quiet=quiet):
+            raise failed
+
+        # Success - update metadata (suppress verbose output in quiet mode)
+        clutil_update_unstash_metadata(base_name, stash_key,
+                                       files, txn, quiet=quiet)
+
+    return UnstashResult(base_name, files)
+
+
+def cl_branch(args: argparse.Namespace) -> None:
+    """
+    Create a new branch with changelist workflow: stash all changelists,
+    create branch, unstash specified changelist.
+
+    This automates the common workflow of:
+    1. Stash all active changelists to clean working directory
+    2. Create a new branch from current HEAD (or specified base)
+    3. Unstash the specified changelist to the new branch
+
+    When the new branch starts at the current HEAD commit, the target
+    changelist is left in the working tree instead: only the other
+    changelists are stashed, and the branch is created and checked out
+    without touching any file. With --keep-others nothing is stashed.
+
+    Args:
+        args: argparse.Namespace with 'changelist_name', optional 'branch_name',
+              optional 'from_branch' and optional 'keep_others' attributes.
+    """
+    changelists = clutil_load()
+    stashes = clutil_load_stashes()
+
+    changelist_name = args.changelist_name
+    branch_name = getattr(args, 'branch_name', None) or changelist_name
+
+    # Validate changelist exists and is active
+    error_msg = clutil_validate_branch_preconditions(changelist_name,
+                                                     changelists, stashes)
+    if error_msg:
+        print(error_msg)
+        return
+
+    # Check if branch already exists
+    if clutil_check_branch_exists(branch_name):
+        print(f"Error: Branch '{branch_name}' already exists.")
+        print(f"Use a different branch name: git cl br "
+              f"{changelist_name} <new-branch-name>")
+        return
+
+    # A branch that starts at HEAD needs no checkout, so the target
+    # changelist can stay where it is
+    in_place = clutil_branch_starts_at_head(getattr(args, 'from_branch', None))
+    keep_others = getattr(args, 'keep_others', False)
+    if keep_others and not in_place:
+        print("Error: --keep-others needs a branch that starts at the "
+              "current commit.")
+        print("Other changelists cannot be carried over to a different base.")
+        return
+
+    # The whole workflow shares one status read: the stash step uses it
+    # as it is, and the unstash step derives the new branch's status from
+    # it. Leaving everything in place needs no status at all.
+    git_root = clutil_get_git_root()
+    status_map = {} if keep_others else clutil_get_file_status_map(show_all=True)
+
+    # Check for uncommitted changes not in any changelist
+    unassigned_changes = clutil_check_unassigned_changes(changelists, git_root,
+                                                         status_map)
+
+    if unassigned_changes:
+        print("Error: There are uncommitted changes not in any changelist:")
+        for file_path in unassigned_changes[:10]:  # Show first 10
+            print(f"  [{status_map[file_path]}] {file_path}")
+        if len(unassigned_changes) > 10:
+            print(f"  ... and {len(unassigned_changes) - 10} more files")
+        print("\nPlease assign these files to changelists first:")
+        print(f"  git cl add <changelist-name> {' '.join(unassigned_changes[:3])}")
+        return
+
+    # Get current branch for messaging
+    current_branch = clutil_get_current_branch()
+    if not current_branch:
+        print("Error: Cannot create branch from detached HEAD state.")
+        print("Switch to a branch first: git checkout <branch-name>")
+        return
+
+    # Determine base branch
+    base_branch = getattr(args, 'from_branch', None) or current_branch
+
+    # Count active changelists for summary
+    active_changelists = {name: files for name, files in changelists.items() if files}
+    if keep_others:
+        to_stash = {}
+    elif in_place:
+        to_stash = {name: files for name, files in active_changelists.items()
+                    if name != changelist_name}
+    else:
+        to_stash = active_changelists
+
+    print(f"Creating branch '{branch_name}' with changelist '{changelist_name}'")
+    if in_place and to_stash:
+        print(f"Stashing {len(to_stash)} other changelists...")
+    elif len(to_stash) > 1:
+        print(f"Stashing {len(to_stash)} active changelists...")
+
+    # Step 1: Stash the active changelists (quietly)
+    stashed_paths = []
+    if to_stash:
+        try:
+            stashed_paths = clutil_stash_all_changelists(to_stash, quiet=True,
+                                                         status_map=status_map)
+        except (subprocess.CalledProcessError,
+                OSError, json.JSONDecodeError) as error:
+            print(f"Error during stash operation: {error}")
+            print("Branch creation aborted.")
+            return
+
+    # Step 2: Create the new branch
+    try:
+        if in_place:
+            clutil_switch_to_new_branch_in_place(branch_name, current_branch)
+        else:
+            clutil_create_branch(branch_name, base_branch, current_branch)
+        print(f"Switched to new branch '{branch_name}'")
+    except subprocess.CalledProcessError as error:
+        print(f"Error creating branch: {error}")
+        if to_stash:
+            print("Attempting to restore stashed changelists...")
+            clutil_handle_branch_creation_failure()
+        return
+
+    if in_place:
+        file_count = len(changelists[changelist_name])
+        print(f"Kept changelist '{changelist_name}' ({file_count} files) "
+              "in the working tree")
+        print("Ready to work on your feature!")
+        return
+
+    # Step 3: Unstash the target changelist (quietly). The stashed files
+    # were reset and the checkout started from a clean copy of them, so
+    # whatever else was in the status carried over to the new branch.
+    stashed = set(stashed_paths)
+    branch_status = {path: code for path, code in status_map.items()
+                     if path not in stashed}
+    try:
+        clutil_unstash_changelist(changelist_name, branch_status)
+
+        # Single success message
+        file_count = len(changelists.get(changelist_name, []))
+        print(f"Restored changelist '{changelist_name}' ({file_count} files)")
+        print("Ready to work on your feature!")
+
+    except (subprocess.CalledProcessError,
+            OSError, json.JSONDecodeError) as error:
+        print(f"Error unstashing changelist: {error}")
+        print(f"Branch '{branch_name}' was created but"
+              "changelist restore failed.")
+        print(f"Try manually: git cl unstash {changelist_name}")
+
+
+def cl_daemon(args: argparse.Namespace) -> None:
+    """
+    Starts, stops or reports on this repository's git-cl daemon.
+
+    A running daemon answers 'git cl status' from memory (see
+    clutil_daemon_serve()); without one, every command runs in-process.
+
+    Args:
+        args: argparse.Namespace with 'action': 'start', 'stop', 'status'
+              or 'run' (serve in the foreground).
+    """
+    if not clutil_daemon_supported():
+        print("Error: git cl daemon needs Unix domain sockets, which are "
+              "not available on this platform.")
+        sys.exit(1)
+
+    if args.action == "run":
+        clutil_daemon_serve()
+        return
+
+    socket_path = clutil_get_repo_context().git_dir / DAEMON_SOCKET_NAME
+    try:
+        info = clutil_daemon_request(socket_path, {"control": "ping"})
+    except (OSError, ValueError):
+        info = None
+
+    if args.action == "status":
+        if info is None:
+            print("git-cl daemon is not running.")
+            sys.exit(1)
+        print(f"git-cl daemon running (pid {info.get('pid')}), up "
+              f"{int(info.get('uptime', 0))}s, {info.get('served')} "
+              "request(s) served.")
+    elif args.action == "stop":
+        if info is None:
+            print("git-cl daemon is not running.")
+            return
+        try:
+            clutil_daemon_request(socket_path, {"control": "stop"})
+        except (OSError, ValueError) as error:
+            print(f"Error stopping git-cl daemon: {error}")
+            sys.exit(1)
+        print("Stopped git-cl daemon.")
+    elif info is not None:
+        print(f"git-cl daemon is already running (pid {info.get('pid')}).")
+    else:
+        subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, os.path.abspath(__file__), "daemon", "run"],
+            cwd=clutil_get_git_root(), stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                info = clutil_daemon_request(socket_path, {"control": "ping"})
+            except (OSError, ValueError):
+                time.sleep(0.05)
+                continue
+            print(f"Started git-cl daemon (pid {info.get('pid')}).")
+            return
+        print("Error: git-cl daemon did not start. Run 'git cl daemon run' "
+              "to see why.")
+        sys.exit(1)
+
+
+def cl_help(args: argparse.Namespace) -> None:
+    """
+    Displays the main help message using argparse's built-in formatting.
+    """
+    args.parser.print_help()
+
+
+# =============================================================================
+# MAIN ENTRY POINT
+# =============================================================================
+
+
+# Read-only commands run often enough (shell prompts, editors) to get a
+# parser with only their own subcommand; see clutil_build_parser()
+FAST_DISPATCH_COMMANDS = {"status", "s", "st"}
+
+
+def clutil_add_pathspec_file_arguments(
+        subparser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options for reading file paths from a file or stdin.
+
+    Args:
+        subparser (argparse.ArgumentParser): Parser of a command that takes
+                                             FILE arguments.
+    """
+    subparser.add_argument('--stdin', action='store_true',
+                           help='Read the files from standard input')
+    subparser.add_argument('--pathspec-from-file', metavar='FILE',
+                           help=("Read the files from FILE, one per line "
+                                 "('-' for standard input)"))
+    subparser.add_argument('-z', '--pathspec-file-nul', dest='nul',
+                           action='store_true',
+                           help=("With --stdin or --pathspec-from-file, "
+                                 "files are separated by NUL characters"))
+    subparser.set_defaults(file_parser=subparser)
+
+
+def clutil_add_status_parser(subparsers) -> None:
+    """
+    Adds the 'status' command to the subcommand parsers.
+
+    Args:
+        subparsers: Result of ArgumentParser.add_subparsers().
+    """
+    status_parser = subparsers.add_parser('status', aliases=['s', 'st'],
+                                          help=("Show file changes grouped by "
+                                                "changelist"),
+                                          description=(
+                                              "Show file changes grouped by "
+                                              "changelist. Unassigned files "
+                                              "appear under 'No Changelist'."))
+    status_parser.add_argument('names', metavar='CHANGELIST', nargs='*',
+                               help=("Optional list of changelists to show "
+                                     "(default: all)"))
+    status_parser.add_argument('--include-no-cl', action='store_true',
+                               help=("When filtering by changelist names, "
+                                     "also show files not assigned to any "
+                                     "changelist"))
+    status_parser.add_argument('--all', action='store_true',
+                               help=("Include files with uncommon Git "
+                                     "status codes"))
+    status_parser.add_argument('--no-color', action='store_true',
+                               help='Disable colored output')
+    status_parser.add_argument('--porcelain', action='store_true',
+                               help=("Print one '<XY> <changelist> <path>' "
+                                     "line per file, paths relative to the "
+                                     "repository root"))
+    status_parser.add_argument('-z', action='store_true',
+                               help=("Like --porcelain, but end records "
+                                     "with NUL and do not quote paths"))
+    status_parser.add_argument('--json', action='store_true',
+                               help=("Print one JSON object per line for "
+                                     "each file and stashed changelist"))
+    status_parser.set_defaults(func=cl_status)
+
+
+def clutil_build_parser(
+        command: Optional[str] = None) -> argparse.ArgumentParser:
+    """
+    Builds the git-cl argument parser.
+
+    Building all subcommand parsers takes a noticeable share of a
+    'git cl st', so for the commands in FAST_DISPATCH_COMMANDS only that
+    command's parser is added. Usage, errors and the command's own help
+    are the same either way; other command names are then not recognised,
+    so callers must pass the command they are about to parse.
+
+    Args:
+        command (Optional[str]): First command-line argument, or None to
+                                 build the parser for every command.
+
+    Returns:
+        argparse.ArgumentParser: The parser; each subcommand sets 'func'.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='git-cl',
+        usage='git cl <command> [<args>]',
+        description=(
+            "git-cl: A Git subcommand for managing named changelists \n"
+            "        Group files into logical changelists before staging "
+            "or committing.\n\n"
+            "        NOTE: Commit/stage commands only operate on tracked files"
+            "\n              untracked files in changelists are safely "
+            "ignored."),
+        epilog=(
+            "Example usage:\n"
+            "    git cl add my-feature file1.py file2.py\n"
+            "    git cl status\n"
+            "    git cl commit my-feature -m 'Implement feature'\n\n"
+            "See also: \n"
+            "    GitHub: https://github.com/BHFock/git-cl \n"
+            "    DOI:    https://doi.org/10.5281/zenodo.18722077"),
+        formatter_class=argparse.RawTextHelpFormatter,
+        add_help=False)
+
+    parser.add_argument(
+        '--version',
+        action='version',
+        version=f'git-cl {__version__}',
+        help=argparse.SUPPRESS)
+
+    parser.add_argument(
+        '--trace',
+        action='store_true',
+        help=("Print every Git command run, with its time, exit status and "
+              "output size,\nand a summary at the end (same as GIT_CL_TRACE=1)"))
+
+    subparsers = parser.add_subparsers(dest='command', title='Commands')
+
+    if command in FAST_DISPATCH_COMMANDS:
+        clutil_add_status_parser(subparsers)
+        return parser
+
+    # ADD
+    add_parser = subparsers.add_parser('add', aliases=['a'],
+                                       help='Add files to a named changelist',
+                                       description=(
+                                           "Add one or more files to a named "
+                                           "changelist. If the changelist "
+                                           "does not exist, it will be "
+                                           "created automatically."))
+    add_parser.add_argument('name', metavar='CHANGELIST',
+                            help='Name of the changelist to add files to')
+    add_parser.add_argument('files', metavar='FILE', nargs='*',
+                            help=("One or more files to include "
+                                  "in the changelist. Directories, "
+                                  "wildcards and pathspec magic such as "
+                                  "':(glob)src/**/*.proto' are expanded to "
+                                  "tracked and non-ignored untracked "
+                                  "files"))
+    clutil_add_pathspec_file_arguments(add_parser)
+    add_parser.set_defaults(func=cl_add)
+
+    # REMOVE
+    remove_parser = subparsers.add_parser('remove', aliases=['r', 'rm'],
+                                          help=("Remove files from any "
+                                                "changelist"),
+                                          description=("Removes files from "
+                                                       "any changelists they "
+                                                       "belong to."))
+    remove_parser.add_argument('files', metavar='FILE', nargs='*',
+                               help=("One or more files to remove "
+                                     "from changelists"))
+    clutil_add_pathspec_file_arguments(remove_parser)
+    remove_parser.set_defaults(func=cl_remove)
+
+    # DELETE
+    delete_parser = subparsers.add_parser('delete', aliases=['del'],
+                                          help=("Delete one or more "
+                                                "changelists"),
+                                          description=(
+                                              "Delete one or more changelists "
+                                              "by name, or remove all with "
+                                              "--all."))
+    delete_parser.add_argument('names', metavar='CHANGELIST', nargs='*',
+                               help=("One or more changelists to delete "
+                                     "(required unless --all is used)"))
+    delete_parser.add_argument('--all', action='store_true',
+                               help='Delete all changelists')
+    delete_parser.set_defaults(func=cl_delete)
+
+    # STATUS
+    clutil_add_status_parser(subparsers)
+
+    # DIFF
+    diff_parser = subparsers.add_parser('diff',
+                                        help=("Show git diff for one or more "
+                                              "changelists"),
+                                        description=(
+                                            "Show unified diff for the files "
+                                            "in one or more changelists. "
+                                            "By default, shows unstaged "
+                                            "changes (like `git diff`). "
+                                            "Use --staged for staged changes, "
+                                            "or --both to show both."))
+    diff_parser.add_argument('names', metavar='CHANGELIST', nargs='+',
+                             help='One or more changelists to diff')
+    diff_parser.add_argument('--staged', action='store_true',
+                             help='Show staged changes (index vs HEAD)')
+    diff_parser.add_argument('--both', action='store_true',
+                             help='Show both unstaged and staged diffs')
+    diff_parser.set_defaults(func=cl_diff)
+
+    # CHECKOUT
+    checkout_parser = subparsers.add_parser('checkout', aliases=['co'],
+                                            help=("Checkout (revert) files "
+                                                  "from changelists"),
+                                            description=(
+                                                "Revert files in one or more "
+                                                "changelists to their HEAD "
+                                                "state, discarding both "
+                                                "staged and unstaged changes "
+                                                "in those files. This "
+                                                "completely restores files "
+                                                "to their last committed "
+                                                "state. By default, asks for "
+                                                " confirmation before "
+                                                "proceeding."))
+    checkout_parser.add_argument('names', metavar='CHANGELIST', nargs='+',
+                                 help='One or more changelists to checkout')
+    checkout_parser.add_argument('--delete', action='store_true',
+                                 help='Delete the changelist after checkout')
+    checkout_parser.add_argument('--force', '-f', action='store_true',
+                                 help='Skip confirmation prompt')
+    checkout_parser.set_defaults(func=cl_checkout)
+
+    # STAGE
+    stage_parser = subparsers.add_parser('stage',
+                                         help=("Stage tracked files from a "
+                                               "changelist"),
+                                         description=(
+                                             "Stage all tracked files from "
+                                             "the specified changelist. Only "
+                                             "files already tracked by Git "
+                                             "will be staged. Untracked files "
+                                             "in the changelist are safely "
+                                             "ignored and remain untracked. "
+                                             "By default, the changelist is "
+                                             "kept unless --delete is used."))
+    stage_parser.add_argument('name', metavar='CHANGELIST',
+                              help='Name of the changelist to stage')
+    stage_parser.add_argument('--delete', action='store_true',
+                              help='Delete the changelist after staging')
+    stage_parser.set_defaults(func=cl_stage)
+
+    # UNSTAGE
+    unstage_parser = subparsers.add_parser('unstage',
+                                           help=("Unstage tracked files from "
+                                                 "a changelist"),
+                                           description=(
+                                               "Unstage all staged files from "
+                                               "the specified changelist, "
+                                               "moving them back to unstaged "
+                                               "state in the working "
+                                               "directory. By default, the "
+                                               "changelist is kept unless "
+                                               "--delete is used."))
+    unstage_parser.add_argument('name', metavar='CHANGELIST',
+                                help='Name of the changelist to unstage')
+    unstage_parser.add_argument('--delete', action='store_true',
+                                help='Delete the changelist after unstaging')
+    unstage_parser.set_defaults(func=cl_unstage)
+
+    # COMMIT
+    commit_parser = subparsers.add_parser('commit', aliases=['ci'],
+                                          help=("Commit tracked files from a "
+                                                "changelist (auto-stages, "
+                                                "ignores untracked)"),
+                                          description=(
+                                              "Stage and commit all tracked "
+                                              "files from the specified "
+                                              "changelist using the provided "
+                                              "message. Untracked files in "
+                                              "the changelist are ignored and "
+                                              "remain untracked. By default, "
+                                              "the changelist is deleted "
+                                              "after committing unless --keep "
+                                              "is used."))
+    commit_parser.add_argument('name', metavar='CHANGELIST',
+                               help='Name of the changelist to commit')
+    msg_group = commit_parser.add_mutually_exclusive_group(required=True)
+    msg_group.add_argument('-m', '--message',
+                           help='Commit message')
+    msg_group.add_argument('-F', '--file',
+                           help='Read commit message from file')
+    commit_parser.add_argument('--keep', action='store_true',
+                               help='Keep the changelist after committing')
+    commit_parser.set_defaults(func=cl_commit)
+
+    # STASH
+    stash_parser = subparsers.add_parser('stash', aliases=['sh'],
+                                         help='Stash changes in changelist(s)',
+                                         description=(
+                                             "Stash all unstaged changes for "
+                                             "files in the specified "
+                                             "changelist. Only files with "
+                                             "unstaged changes can be "
+                                             "stashed. Use --all to stash "
+                                             "all active changelists at once "
+                                             "for multi-feature branch "
+                                             "workflow."))
+    stash_group = stash_parser.add_mutually_exclusive_group(required=True)
+    stash_group.add_argument('name', nargs='?', metavar='CHANGELIST',
+                             help='Name of the changelist to stash')
+    stash_group.add_argument('--all', action='store_true',
+                             help='Stash all active changelists')
+    stash_group.add_argument('--migrate-refs', action='store_true',
+                             help=('Move stashed changelists from the Git '
+                                   'stash list to refs/cl-stash/<name>'))
+    stash_parser.set_defaults(func=cl_stash)
+
+    # UNSTASH
+    unstash_parser = subparsers.add_parser('unstash', aliases=['us'],
+                                           help=("Restore stashed "
+                                                 "changelist(s)"),
+                                           description=(
+                                               "Restore a previously stashed "
+                                               "changelist to the working "
+                                               "directory. Enforces clean "
+                                               "branch workflow by default "
+                                               "(use --force to override). "
+                                               "Use --all to unstash all "
+                                               "stashed changelists to the "
+                                               "current branch."))
+    unstash_group = unstash_parser.add_mutually_exclusive_group(required=True)
+    unstash_group.add_argument('name', nargs='?', metavar='CHANGELIST',
+                               help=('Name of the changelist to unstash '
+                                     '(with or without _stashed suffix)'))
+    unstash_group.add_argument('--all', action='store_true',
+                               help='Unstash all stashed changelists')
+    unstash_parser.add_argument('--force', action='store_true',
+                                help=("Force unstash even if branch/"
+                                      "conflicts detected"))
+    unstash_parser.set_defaults(func=cl_unstash)
+
+    # BRANCH
+    branch_parser = subparsers.add_parser('branch', aliases=['br'],
+                                          help=("Create branch from "
+                                                "changelist workflow"),
+                                          description=(
+                                              "Automate the changelist-to-"
+                                              "branch workflow: stash all "
+                                              "active changelists, create a "
+                                              "new branch, and unstash the "
+                                              "specified changelist to the "
+                                              "new branch. This provides a "
+                                              "clean way to move changelist "
+                                              "work to a dedicated "
+                                              "feature branch."))
+    branch_parser.add_argument('changelist_name', metavar='CHANGELIST',
+                               help=("Name of the changelist to "
+                                     "create branch for"))
+    branch_parser.add_argument('branch_name',
+                               metavar='BRANCH', nargs='?',
+                               help=("Name of the new branch "
+                                     "(defaults to changelist name)"))
+    branch_parser.add_argument('--from', dest='from_branch',
+                               metavar='BASE_BRANCH',
+                               help=("Create branch from specified base "
+                                     "branch (default: current branch)"))
+    branch_parser.add_argument('--keep-others', action='store_true',
+                               help=("Leave the other changelists in the "
+                                     "working tree instead of stashing them "
+                                     "(only when branching from the current "
+                                     "commit)"))
+    branch_parser.set_defaults(func=cl_branch)
+
+    # DAEMON
+    daemon_parser = subparsers.add_parser('daemon',
+                                          help=("Keep status warm in a "
+                                                "background process"),
+                                          description=(
+                                              "Start, stop or check a "
+                                              "per-repository daemon that "
+                                              "keeps changelists, "
+                                              "configuration and the status "
+                                              "cache in memory and answers "
+                                              "'git cl status'. Other "
+                                              "commands always run "
+                                              "in-process. Not available on "
+                                              "Windows."))
+    daemon_parser.add_argument('action',
+                               choices=['start', 'stop', 'status', 'run'],
+                               help=("'run' serves in the foreground "
+                                     "instead of starting a background "
+                                     "process"))
+    daemon_parser.set_defaults(func=cl_daemon)
+
+    # HELP
+    help_parser = subparsers.add_parser('help',
+                                        help='Show this help message',
+                                        description=(
+                                            "Displays a summary of "
+                                            "available git-cl commands."))
+    help_parser.set_defaults(func=cl_help, parser=parser)
+
+    return parser
+
+
+def main() -> None:
+    """
+    Entry point for the git-cl command-line interface.
+
+    Forwards the command to a running daemon if it can answer it
+    (clutil_daemon_forward()). Otherwise parses command-line arguments and
+    dispatches to the appropriate subcommand handler (e.g., add, remove,
+    stage, commit, etc.).
+    """
+    code = clutil_daemon_forward(sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
+
+    parser = clutil_build_parser(sys.argv[1] if len(sys.argv) > 1 else None)
+    args = parser.parse_args()
+
+    if args.trace:
+        _GIT_TRACE.enable_stderr()
+
+    # If no command was provided, show help
+    if args.command is None:
+        parser.print_help()
+        return
+
+    # Provide parser to all commands in case needed
+    if not hasattr(args, 'parser'):
+        args.parser = parser
+
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py — Measure git-cl start-up with and without cached bytecode.
+
+Compares running git_cl.py directly as a script, which Python compiles
+on every run, with the 'git-cl' launcher, which imports git_cl.py and so
+uses the bytecode cached in __pycache__. Also reports the time Python
+needs to compile git_cl.py, the cost the launcher removes.
+
+Each command is run in a small temporary repository:
+    --version   — start-up only
+    status      — start-up plus a 'git cl status' of a few files
+
+PYTHONDONTWRITEBYTECODE is removed from the environment of the measured
+runs, since with it set Python never writes the cache.
+
+This is a benchmark, not a test: run_tests.py does not run it.
+
+Run:
+    ./bench_startup.py [--runs N]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPT = ROOT / "git_cl.py"
+LAUNCHER = ROOT / "git-cl"
+
+
+def median_seconds(command: list[str], cwd: Path, env: dict, runs: int) -> float:
+    """Return the median wall time of running command."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def compile_seconds(runs: int) -> float:
+    """Return the median time Python takes to compile git_cl.py."""
+    source = SCRIPT.read_text(encoding="utf-8")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        compile(source, str(SCRIPT), "exec")
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def make_repo(repo_dir: Path, env: dict):
+    """Create a repository with a few changed files in a changelist."""
+    def git(*args):
+        subprocess.run(["git", *args], cwd=repo_dir, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    git("init", "--quiet")
+    git("config", "user.email", "bench@example.com")
+    git("config", "user.name", "Bench")
+    for index in range(10):
+        (repo_dir / f"file{index}.txt").write_text("one\n")
+    git("add", ".")
+    git("commit", "--quiet", "-m", "Add files")
+    for index in range(5):
+        (repo_dir / f"file{index}.txt").write_text("two\n")
+    subprocess.run([sys.executable, str(LAUNCHER), "add", "bench",
+                    *[f"file{index}.txt" for index in range(5)]],
+                   cwd=repo_dir, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def main():
+    runs = 20
+    if "--runs" in sys.argv:
+        runs = int(sys.argv[sys.argv.index("--runs") + 1])
+
+    env = {k: v for k, v in os.environ.items()
+           if k != "PYTHONDONTWRITEBYTECODE"}
+
+    with tempfile.TemporaryDirectory(prefix="git-cl-bench.") as temp:
+        repo_dir = Path(temp)
+        make_repo(repo_dir, env)
+
+        print(f"Python {sys.version.split()[0]}, median of {runs} runs\n")
+        print(f"Compile git_cl.py: {compile_seconds(runs) * 1000:8.1f} ms\n")
+        print(f"{'command':<12} {'script':>10} {'launcher':>10} {'saved':>10}")
+        for args in (["--version"], ["status"]):
+            script = median_seconds([sys.executable, str(SCRIPT), *args],
+                                    repo_dir, env, runs)
+            launcher = median_seconds([sys.executable, str(LAUNCHER), *args],
+                                      repo_dir, env, runs)
+            print(f"{args[0]:<12} {script * 1000:8.1f} ms {launcher * 1000:8.1f} ms"
+                  f" {(script - launcher) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./bench_startup.py [--runs N]\n")
+        print("Options:")
+        print("  --runs N   Runs per measurement (default: 20).")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    main()
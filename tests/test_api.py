@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+test_api.py — Test the Python API of git_cl.py.
+
+Covers:
+    git_cl.Repo(path)               — open a working tree
+    Repo.status()                   — what 'git cl status' shows, as records
+    Repo.add() / remove() / delete()
+    Repo.stash() / unstash()
+
+What you'll learn:
+    - Scripts can import git_cl and work with changelists in one process,
+      without starting git-cl for each operation
+    - Results are NamedTuple records, failures are GitClError subclasses
+      carrying the message 'git cl' would print
+    - The API and the command line read and write the same metadata
+
+git_cl.py is imported from the directory of the 'git-cl' found on PATH.
+This test calls Python rather than the shell, so it has no walkthrough.
+
+Run:
+    ./test_api.py
+"""
+
+import os
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+def raises(repo: TestRepo, error_type, call, msg: str):
+    """Assert that call() raises error_type; return the error."""
+    try:
+        call()
+    except error_type as error:
+        repo.assert_true(True, msg)
+        return error
+    repo.assert_true(False, msg)
+    return None
+
+
+def run_tests(repo: TestRepo, git_cl):
+
+    repo.write_file("file1.txt", "one")
+    repo.write_file("file2.txt", "two")
+    repo.write_file("src/file3.txt", "three")
+    repo.run("git add file1.txt file2.txt src/file3.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add files"])
+    repo.write_file("file1.txt", "one modified")
+    repo.write_file("file2.txt", "two modified")
+    repo.write_file("new.txt", "new")
+
+    # =================================================================
+    # Test: Open a repository
+    # =================================================================
+
+    repo.section("Repo finds the working tree root")
+
+    api = git_cl.Repo(repo.repo_dir / "src")
+    repo.assert_equal(Path(repo.repo_dir).resolve(), api.root,
+                      "root found from a subdirectory")
+    raises(repo, git_cl.NotARepositoryError,
+           lambda: git_cl.Repo(Path(repo.repo_dir).parent),
+           "a directory outside Git is rejected")
+
+    # =================================================================
+    # Test: Add and status
+    # =================================================================
+
+    repo.section("add() and status() return records")
+
+    result = api.add("list", ["file1.txt", "src/file3.txt", "gone.txt"])
+    repo.assert_equal(["file1.txt", "src/file3.txt", "gone.txt"], result.files,
+                      "paths are relative to the root, not the cwd")
+    repo.assert_equal(["gone.txt"], result.missing, "missing file reported")
+
+    report = api.status()
+    repo.assert_equal([("file1.txt", " M"), ("src/file3.txt", "  "),
+                       ("gone.txt", "XX")],
+                      [(e.path, e.code) for e in report.changelists["list"]],
+                      "changelist files with their status codes")
+    repo.assert_equal([("file2.txt", " M", None), ("new.txt", "??", None)],
+                      [tuple(e) for e in report.unassigned],
+                      "unassigned files, sorted")
+
+    output = repo.run("git cl st")
+    repo.assert_in("[ M] file1.txt", output, "the CLI sees the API's changes")
+
+    error = raises(repo, git_cl.InvalidNameError,
+                   lambda: api.add("bad name!", ["file2.txt"]),
+                   "invalid name raises InvalidNameError")
+    repo.assert_in("Invalid changelist name", str(error), "same message as CLI")
+
+    # =================================================================
+    # Test: Remove and delete
+    # =================================================================
+
+    repo.section("remove() and delete()")
+
+    repo.assert_equal({"gone.txt": "list"}, api.remove(["gone.txt", "new.txt"]),
+                      "only files in a changelist are removed")
+    api.add("other", ["new.txt"])
+    api.delete("other")
+    repo.assert_true("other" not in api.status().changelists,
+                     "changelist deleted")
+    raises(repo, git_cl.ChangelistNotFoundError, lambda: api.delete("other"),
+           "deleting twice raises ChangelistNotFoundError")
+
+    # =================================================================
+    # Test: Stash and unstash
+    # =================================================================
+
+    repo.section("stash() and unstash()")
+
+    error = raises(repo, git_cl.StashError, lambda: api.stash("list"),
+                   "a clean file prevents stashing")
+    repo.assert_in("not stashable", error.output, "the reason is captured")
+
+    api.remove(["src/file3.txt"])
+    result = api.stash("list")
+    repo.assert_equal(["file1.txt"], result.files, "changed file stashed")
+    repo.assert_equal("one", repo.read_file("file1.txt"), "file reset")
+
+    report = api.status()
+    repo.assert_equal(["list"], [s.name for s in report.stashed],
+                      "stashed changelist reported")
+    error = raises(repo, git_cl.StashedFilesError,
+                   lambda: api.add("again", ["file1.txt"]),
+                   "stashed files cannot be added")
+    repo.assert_in("in stashed changelist 'list'", str(error),
+                   "message names the stash")
+
+    result = api.unstash("list")
+    repo.assert_equal("one modified", repo.read_file("file1.txt"),
+                      "changes restored")
+    repo.assert_equal(["file1.txt"], result.files, "changelist restored")
+    error = raises(repo, git_cl.ChangelistNotFoundError,
+                   lambda: api.unstash("list"),
+                   "unstashing twice raises ChangelistNotFoundError")
+    repo.assert_in("No stashed changelist", str(error), "same message as CLI")
+
+    # =================================================================
+    # Test: Working directory
+    # =================================================================
+
+    repo.section("The caller's directory is left alone")
+
+    cwd = os.getcwd()
+    api.status()
+    raises(repo, git_cl.ChangelistNotFoundError, lambda: api.stash("nope"),
+           "an error leaves it too")
+    repo.assert_equal(cwd, os.getcwd(), "cwd restored after each call")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_api.py\n")
+        print("Options:")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    if "--export" in sys.argv:
+        print("Skipped: test_api.py calls Python and has no shell walkthrough.")
+        sys.exit(0)
+
+    launcher = shutil.which("git-cl")
+    if launcher is not None:
+        sys.path.insert(0, os.path.dirname(os.path.realpath(launcher)))
+    try:
+        import git_cl
+    except ModuleNotFoundError:
+        print("Skipped: git_cl.py was not found next to git-cl.")
+        sys.exit(0)
+
+    with TestRepo() as repo:
+        run_tests(repo, git_cl)
@@ -7,6 +7,8 @@ Covers:
     git cl status / git cl st       — view status grouped by changelist
     git cl st <name>                — filter status by changelist name
     git cl st --include-no-cl       — include unassigned files when filtering
+    git cl add --pathspec-from-file — read the files to add from a file
+    git cl add <name> <pathspec>    — expand globs, directories and magic
 
 What you'll learn:
     - How to create changelists and assign files
@@ -197,6 +199,61 @@ def run_tests(repo: TestRepo):
     repo.assert_equal(output_st, output_status,
                        "'git cl st' and 'git cl status' produce identical output")
 
+    # =================================================================
+    # Test: Read files from a pathspec file
+    # =================================================================
+
+    repo.section("Add files listed in a pathspec file")
+
+    repo.write_file("docs/api.md", "api")
+    repo.write_file("docs/paths.txt", "guide.md\napi.md\n../file1.txt")
+
+    # Paths in the file are relative to the current directory, like
+    # paths given on the command line
+    output = repo.run_in("docs", "git cl add batch --pathspec-from-file paths.txt")
+    repo.assert_exit_code(0, "add --pathspec-from-file should succeed")
+    repo.assert_in("Added 3 file(s) to 'batch'", output,
+                    "batch add reports the number of files")
+
+    cl = repo.load_cl_json()
+    repo.assert_equal(["docs/guide.md", "docs/api.md", "file1.txt"],
+                       cl["batch"], "listed files are stored in order")
+    repo.assert_true("docs-cl" not in cl,
+                      "file moved out of its previous changelist")
+
+    output = repo.run("git cl add other file2.txt --pathspec-from-file x")
+    repo.assert_exit_code(2, "file arguments and a pathspec file are a usage error")
+    repo.assert_in("cannot combine", output,
+                    "file arguments and a pathspec file are exclusive")
+
+    # =================================================================
+    # Test: Expand globs, directories and pathspec magic
+    # =================================================================
+
+    repo.section("Add files by glob, directory and pathspec magic")
+
+    repo.write_file(".gitignore", "build/")
+    repo.write_file("proto/a.proto", "a")
+    repo.write_file("proto/sub/b.proto", "b")
+    repo.write_file("proto/sub/notes.txt", "notes")
+    repo.write_file("build/gen.proto", "generated")
+
+    repo.run(["git", "cl", "add", "protos", ":(glob)**/*.proto"])
+    cl = repo.load_cl_json()
+    repo.assert_equal(["proto/a.proto", "proto/sub/b.proto"],
+                       sorted(cl["protos"]),
+                       "glob matches untracked files but not ignored ones")
+
+    output = repo.run_in("proto", ["git", "cl", "add", "sub-dir", "sub",
+                                   ":(exclude)*.proto"])
+    repo.assert_exit_code(0, "directory with an exclude pathspec")
+    repo.assert_equal(["proto/sub/notes.txt"], repo.load_cl_json()["sub-dir"],
+                       "directory is expanded relative to the current directory")
+
+    output = repo.run(["git", "cl", "add", "none", "*.nothing"])
+    repo.assert_in("No files matched", output,
+                    "pattern without matches is reported")
+
 
 # =================================================================
 # Entry point
@@ -6,6 +6,7 @@ Covers:
     git cl branch <n>                        — create branch named after changelist
     git cl branch <n> <branch-name>          — create branch with custom name
     git cl branch <n> <branch> --from <base> — create branch from a base branch
+    git cl branch <n> --keep-others          — leave other changelists active
     git cl br                                   — alias for branch
 
 What you'll learn:
@@ -14,6 +15,8 @@ What you'll learn:
     - Other changelists remain stashed and can be restored later
     - The branch name defaults to the changelist name but can be overridden
     - The --from flag lets you base the branch on a different branch
+    - A branch at the current commit is created in place, without
+      rewriting the target changelist's files
     - This is a one-step workflow for isolating work on a dedicated branch
 
 Run:
@@ -23,6 +26,7 @@ Export as shell walkthrough:
     ./test_branch.py --export > walkthrough_branch.sh
 """
 
+import os
 import sys
 from pathlib import Path
 
@@ -153,6 +157,64 @@ def run_tests(repo: TestRepo):
     repo.assert_equal("quick-fix", branch,
                        "'br' alias created the branch")
 
+    # =================================================================
+    # Test: Branching at HEAD leaves the changelist's files alone
+    # =================================================================
+    # A branch that starts at the current commit is created in place:
+    # the target changelist is never stashed, so its files keep their
+    # modification times.
+
+    repo.section("Branch at HEAD keeps the changelist in place")
+
+    repo.run("git checkout --quiet " + default_branch)
+    repo.write_file("gamma.txt", "gamma")
+    repo.write_file("delta.txt", "delta")
+    repo.run("git add gamma.txt delta.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add more files"])
+
+    repo.write_file("gamma.txt", "in place")
+    repo.write_file("delta.txt", "other work")
+    repo.run("git cl add in-place gamma.txt")
+    repo.run("git cl add other-work delta.txt")
+    gamma = repo.repo_dir / "gamma.txt"
+    os.utime(gamma, (1_000_000_000, 1_000_000_000))
+
+    output = repo.run("git cl branch in-place")
+    repo.assert_exit_code(0, "git cl branch at HEAD should succeed")
+    repo.assert_equal("in-place", repo.get_current_branch(),
+                      "now on branch 'in-place'")
+    repo.assert_equal(1_000_000_000, int(gamma.stat().st_mtime),
+                      "gamma.txt was not rewritten")
+    repo.assert_true("other-work" in repo.load_stash_json(),
+                     "other changelists are still stashed")
+    repo.assert_equal("delta", repo.read_file("delta.txt"),
+                      "delta.txt reverted (other-work stashed)")
+
+    # =================================================================
+    # Test: --keep-others
+    # =================================================================
+
+    repo.section("Branch with --keep-others")
+
+    repo.run("git cl add keep-a gamma.txt")
+    repo.write_file("epsilon.txt", "kept")
+    repo.run("git cl add keep-b epsilon.txt")
+
+    output = repo.run("git cl branch keep-a --keep-others")
+    repo.assert_exit_code(0, "git cl branch --keep-others should succeed")
+    repo.assert_equal("keep-a", repo.get_current_branch(),
+                      "now on branch 'keep-a'")
+    cl = repo.load_cl_json()
+    repo.assert_true("keep-a" in cl and "keep-b" in cl,
+                     "both changelists stay active")
+    repo.assert_equal("kept", repo.read_file("epsilon.txt"),
+                      "epsilon.txt left in the working tree")
+
+    output = repo.run("git cl branch keep-b keep-b-dev --from develop "
+                      "--keep-others")
+    repo.assert_in("--keep-others needs a branch", output,
+                   "--keep-others is refused for a different base")
+
     # =================================================================
     # Test: Branch with a non-existent changelist
     # =================================================================
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+test_daemon.py — Test the per-repository git-cl daemon.
+
+Covers:
+    git cl daemon start     — start a daemon in the background
+    git cl daemon status    — report whether it runs and how much it served
+    git cl daemon stop      — stop it
+    git cl status           — answered by the daemon while it runs
+
+What you'll learn:
+    - A running daemon answers 'git cl status' with the same output as
+      git-cl itself, without starting a new Python process for the work
+    - Changes to changelists, the working tree and HEAD show up right away
+    - Without a daemon, or after it stopped, every command runs as before
+
+Run:
+    ./test_daemon.py
+
+Export as shell walkthrough:
+    ./test_daemon.py --export > walkthrough_daemon.sh
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+def served_count(repo: TestRepo) -> int:
+    """Return the number of requests the daemon has served."""
+    output = repo.run("git cl daemon status")
+    return int(output.split(", ")[-1].split()[0])
+
+
+def run_tests(repo: TestRepo):
+
+    repo.write_file("file1.txt", "one")
+    repo.write_file("file2.txt", "two")
+    repo.run("git add file1.txt file2.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add files"])
+    repo.write_file("file1.txt", "one modified")
+    repo.run("git cl add list file1.txt")
+    expected = repo.run("git cl st")
+
+    # =================================================================
+    # Test: Start the daemon
+    # =================================================================
+
+    repo.section("Start the daemon")
+
+    output = repo.run("git cl daemon status")
+    repo.assert_in("not running", output, "no daemon before start")
+
+    output = repo.run("git cl daemon start")
+    repo.assert_exit_code(0, "git cl daemon start should succeed")
+    repo.assert_in("Started git-cl daemon", output, "daemon started")
+    repo.assert_true((repo.repo_dir / ".git" / "cl-daemon.sock").exists(),
+                     "socket created in .git")
+
+    output = repo.run("git cl daemon start")
+    repo.assert_in("already running", output, "only one daemon per repository")
+
+    # =================================================================
+    # Test: Status is answered by the daemon
+    # =================================================================
+
+    repo.section("Status is answered by the daemon")
+
+    output = repo.run("git cl st")
+    repo.assert_equal(expected, output, "same output as without the daemon")
+    repo.assert_equal(1, served_count(repo), "the daemon served the request")
+
+    output = repo.run("git cl st no-such-list")
+    repo.assert_exit_code(0, "filtered status should succeed")
+    repo.assert_not_in("file1.txt", output, "filter applied by the daemon")
+
+    output = repo.run("git cl st --bogus")
+    repo.assert_exit_code(2, "usage errors keep their exit status")
+    repo.assert_in("unrecognized arguments", output, "usage error shown")
+
+    # =================================================================
+    # Test: Changes are picked up
+    # =================================================================
+
+    repo.section("Changes are picked up")
+
+    repo.write_file("file2.txt", "two modified")
+    repo.run("git cl add other file2.txt")
+    output = repo.run("git cl st")
+    repo.assert_in("other:", output, "new changelist shown")
+    repo.assert_in("[ M] file2.txt", output, "edited file shown")
+
+    repo.run(["git", "commit", "--quiet", "-am", "Commit both"])
+    output = repo.run("git cl st")
+    repo.assert_not_in("[ M]", output, "commit (new HEAD) reflected")
+
+    repo.mkdir("sub")
+    output = repo.run_in("sub", "git cl st")
+    repo.assert_in("../file1.txt", output,
+                   "paths relative to the client's directory")
+    repo.assert_equal(6, served_count(repo), "all requests were served")
+
+    # =================================================================
+    # Test: Stop the daemon
+    # =================================================================
+
+    repo.section("Stop the daemon")
+
+    output = repo.run("git cl daemon stop")
+    repo.assert_in("Stopped git-cl daemon", output, "daemon stopped")
+    repo.assert_true(not (repo.repo_dir / ".git" / "cl-daemon.sock").exists(),
+                     "socket removed")
+
+    output = repo.run("git cl st")
+    repo.assert_exit_code(0, "status runs in-process again")
+    repo.assert_in("list:", output, "status still works")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_daemon.py [--export]\n")
+        print("Options:")
+        print("  --export   Print a shell walkthrough instead of test output.")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    if os.name == "nt":
+        print("Skipped: the git-cl daemon needs Unix domain sockets.")
+        sys.exit(0)
+
+    export_mode = "--export" in sys.argv
+
+    with TestRepo(quiet=export_mode) as repo:
+        try:
+            run_tests(repo)
+        finally:
+            repo.run("git cl daemon stop")
+        if export_mode:
+            print(repo.export_shell("git-cl walkthrough: daemon"))
@@ -8,6 +8,8 @@ Covers:
     Duplicate files   — adding the same file twice in one command
     Deleted files     — adding a deleted file to a changelist
     Commit edge cases — committing a changelist with only untracked files
+    Symlinks          — untracked symlinks are listed by their target
+    Locking           — status does not wait for a held metadata lock
 
 What you'll learn:
     - git cl status produces no output when there are no changelists
@@ -15,6 +17,7 @@ What you'll learn:
     - A file can only belong to one changelist — reassignment is automatic
     - Adding the same file twice in one command deduplicates
     - Committing a changelist with only untracked files does nothing harmful
+    - The .git/cl.lock file is kept between commands; status reads without it
 
 Run:
     ./test_edge_cases.py
@@ -23,6 +26,8 @@ Export as shell walkthrough:
     ./test_edge_cases.py --export > walkthrough_edge_cases.sh
 """
 
+import os
+import subprocess
 import sys
 from pathlib import Path
 
@@ -145,6 +150,35 @@ def run_tests(repo: TestRepo):
 
     repo.run("git cl delete --all")
 
+    # =================================================================
+    # Test: Renamed file and a path containing ' -> '
+    # =================================================================
+    # Status is parsed from NUL-delimited porcelain output, so a path that
+    # looks like a rename arrow is reported verbatim. '>' is not a valid
+    # filename character on Windows, so that part is skipped there.
+
+    repo.section("Renamed file and a path containing ' -> '")
+
+    repo.write_file("old-name.txt", "to be renamed")
+    repo.run("git add old-name.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add file to rename"])
+    repo.run("git mv old-name.txt new-name.txt")
+    repo.run("git cl add renames new-name.txt")
+
+    output = repo.run("git cl st")
+    repo.assert_in("[R ] new-name.txt", output,
+                    "renamed file shows [R ] under its new name")
+
+    if sys.platform != "win32":
+        repo.run(["git", "mv", "new-name.txt", "a -> b.txt"])
+        repo.run(["git", "cl", "add", "renames", "a -> b.txt"])
+
+        output = repo.run("git cl st")
+        repo.assert_in("[R ] a -> b.txt", output,
+                        "rename target containing ' -> ' is shown verbatim")
+
+    repo.run("git cl delete --all")
+
     # =================================================================
     # Test: Status after delete --all is empty
     # =================================================================
@@ -162,6 +196,54 @@ def run_tests(repo: TestRepo):
     output = repo.run("git cl st")
     repo.assert_exit_code(0, "status works after delete --all")
 
+    # =================================================================
+    # Test: Untracked symlinks show under the changelist
+    # =================================================================
+
+    if os.name != "nt":
+        repo.section("Untracked symlinks stay in their changelist")
+
+        repo.write_file("target.txt", "target")
+        repo.run("git add target.txt")
+        repo.run(["git", "commit", "--quiet", "-m", "Add target"])
+        os.symlink("target.txt", repo.repo_dir / "link")
+        os.symlink("new-target.txt", repo.repo_dir / "link2")
+        repo.write_file("new-target.txt", "new")
+
+        repo.run("git cl add links link link2")
+        output = repo.run("git cl st")
+        repo.assert_in("[??] target.txt", output,
+                       "symlink to a tracked file shows as untracked")
+        repo.assert_in("[??] new-target.txt", output,
+                       "symlink to an untracked file shows too")
+        unassigned = output.partition("No Changelist:")[2]
+        repo.assert_not_in("target.txt", unassigned,
+                           "neither appears as unassigned")
+        repo.run("git cl delete links")
+        os.remove(repo.repo_dir / "link")
+        os.remove(repo.repo_dir / "link2")
+        os.remove(repo.repo_dir / "new-target.txt")
+
+    # =================================================================
+    # Test: Status does not wait for the metadata lock
+    # =================================================================
+
+    if os.name != "nt":
+        import fcntl  # pylint: disable=import-outside-toplevel
+
+        repo.section("Status reads changelists while another command holds the lock")
+
+        repo.run("git cl add locked file.txt")
+        lock_path = repo.repo_dir / ".git" / "cl.lock"
+        repo.assert_true(lock_path.exists(), "lock file is kept after the command")
+
+        with open(lock_path, "a", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            result = subprocess.run(["git", "cl", "st"], capture_output=True,
+                                    text=True, cwd=repo.repo_dir, timeout=30)
+        repo.assert_equal(0, result.returncode, "status does not block on the lock")
+        repo.assert_in("locked:", result.stdout, "status shows the changelist")
+
 
 # =================================================================
 # Entry point
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+test_git_calls.py — Count the Git processes git-cl starts.
+
+Covers:
+    git cl branch <n> --from <base> — stash, checkout and unstash share
+                                      one status read
+    git cl branch <n>               — branching at HEAD
+
+What you'll learn:
+    - git-cl runs one 'git status' per command, however many steps the
+      command has
+    - Regressions that add Git calls per file or per step show up here
+      as a count, before they show up as slowness in large repositories
+
+Every Git call is logged by a small 'git' wrapper placed first on PATH.
+git-cl is run as 'git-cl' rather than 'git cl', since Git puts its own
+exec directory in front of PATH for subcommands, which would bypass the
+wrapper.
+
+Run:
+    ./test_git_calls.py
+
+Export as shell walkthrough:
+    ./test_git_calls.py --export > walkthrough_git_calls.sh
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+# Upper bounds for the whole command; both cases stash two changelists.
+# Stashing a changelist costs a fixed handful of plumbing calls
+# (read-tree, write-tree, commit-tree, ...); none scale with the file count.
+BRANCH_FROM_BUDGET = 35
+BRANCH_IN_PLACE_BUDGET = 30
+
+
+def install_wrapper(shim_dir: Path, log_file: Path):
+    """Put a 'git' first on PATH that logs its arguments."""
+    real_git = shutil.which("git")
+    wrapper = shim_dir / "git"
+    wrapper.write_text("#!/bin/sh\n"
+                       f"printf '%s\\n' \"$*\" >> '{log_file}'\n"
+                       f"exec '{real_git}' \"$@\"\n")
+    wrapper.chmod(0o755)
+    os.environ["PATH"] = f"{shim_dir}{os.pathsep}{os.environ['PATH']}"
+
+
+def read_calls(log_file: Path) -> list[str]:
+    """Return the logged Git calls and clear the log."""
+    calls = log_file.read_text().splitlines() if log_file.exists() else []
+    log_file.write_text("")
+    return calls
+
+
+def run_tests(repo: TestRepo, log_file: Path):
+
+    repo.write_file("alpha.txt", "alpha")
+    repo.write_file("beta.txt", "beta")
+    repo.run("git add alpha.txt beta.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add files"])
+    default_branch = repo.get_current_branch()
+
+    repo.run("git checkout --quiet -b develop")
+    repo.write_file("develop.txt", "develop")
+    repo.run("git add develop.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add develop.txt"])
+    repo.run("git checkout --quiet " + default_branch)
+
+    # =================================================================
+    # Test: Branch from another base
+    # =================================================================
+
+    repo.section("Branch from another base reads status once")
+
+    repo.write_file("alpha.txt", "alpha modified")
+    repo.write_file("new.txt", "new")
+    repo.write_file("beta.txt", "beta modified")
+    repo.run("git cl add feature alpha.txt new.txt")
+    repo.run("git cl add other beta.txt")
+
+    read_calls(log_file)
+    repo.run("git-cl branch feature feature-dev --from develop")
+    calls = read_calls(log_file)
+    repo.assert_equal("feature-dev", repo.get_current_branch(),
+                      "now on branch 'feature-dev'")
+    repo.assert_equal("alpha modified", repo.read_file("alpha.txt"),
+                      "changelist restored on the new branch")
+    repo.assert_equal(1, sum(call.startswith("status ") for call in calls),
+                      "git status runs once")
+    repo.assert_true(not any(call.startswith("ls-files --unmerged")
+                             for call in calls),
+                     "unstash reuses the status instead of reading the index")
+    repo.assert_true(len(calls) <= BRANCH_FROM_BUDGET,
+                     f"{len(calls)} Git calls, at most {BRANCH_FROM_BUDGET}")
+
+    # =================================================================
+    # Test: Branch at HEAD
+    # =================================================================
+
+    repo.section("Branch at HEAD reads status once")
+
+    # 'feature' is still active here, with new.txt, so it is stashed
+    # together with 'second'
+
+    repo.run("git checkout --quiet " + default_branch)
+    repo.write_file("alpha.txt", "in place")
+    repo.run("git cl add in-place alpha.txt")
+    repo.write_file("second.txt", "second")
+    repo.run("git cl add second second.txt")
+
+    read_calls(log_file)
+    repo.run("git-cl branch in-place")
+    calls = read_calls(log_file)
+    repo.assert_equal("in-place", repo.get_current_branch(),
+                      "now on branch 'in-place'")
+    repo.assert_equal(1, sum(call.startswith("status ") for call in calls),
+                      "git status runs once")
+    repo.assert_true(len(calls) <= BRANCH_IN_PLACE_BUDGET,
+                     f"{len(calls)} Git calls, at most "
+                     f"{BRANCH_IN_PLACE_BUDGET}")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_git_calls.py [--export]\n")
+        print("Options:")
+        print("  --export   Print a shell walkthrough instead of test output.")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    if os.name == "nt":
+        # The logging wrapper is a shell script
+        print("Skipped: the Git call wrapper needs a POSIX shell.")
+        sys.exit(0)
+
+    export_mode = "--export" in sys.argv
+
+    with tempfile.TemporaryDirectory(prefix="git-cl-shim.") as shim_dir:
+        log_file = Path(shim_dir) / "calls.log"
+        install_wrapper(Path(shim_dir), log_file)
+        with TestRepo(quiet=export_mode) as repo:
+            run_tests(repo, log_file)
+            if export_mode:
+                print(repo.export_shell("git-cl walkthrough: Git calls"))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+test_journal.py — Test the journal storage mode for changelists.
+
+Covers:
+    Journal writes    — changes are appended to .git/cl.journal
+    Replay            — status, remove and delete see journalled changes
+    Compaction        — a large journal is folded back into cl.json
+    Migration         — switching back to cl.json keeps every change
+
+What you'll learn:
+    - 'git config cl.storage journal' appends small records instead of
+      rewriting .git/cl.json on every change
+    - .git/cl.json stays the snapshot format and is always readable
+
+Run:
+    ./test_journal.py
+
+Export as shell walkthrough:
+    ./test_journal.py --export > walkthrough_journal.sh
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+def run_tests(repo: TestRepo):
+
+    repo.write_file("file1.txt", "one")
+    repo.write_file("file2.txt", "two")
+    repo.run("git add file1.txt file2.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add files"])
+
+    # =================================================================
+    # Test: Changes are journalled
+    # =================================================================
+
+    repo.section("Changes are appended to the journal")
+
+    repo.run("git cl add list-a file1.txt")
+    snapshot = repo.load_cl_json()
+    repo.run("git config cl.storage journal")
+
+    repo.run("git cl add list-b file1.txt file2.txt")
+    repo.assert_true(repo.file_exists(".git/cl.journal"),
+                     "journal file is created")
+    repo.assert_equal(snapshot, repo.load_cl_json(),
+                      "cl.json is not rewritten")
+
+    output = repo.run("git cl st")
+    repo.assert_not_in("list-a:", output, "moved file left its changelist")
+    repo.assert_in("list-b:", output, "status replays the journal")
+
+    repo.run("git cl rm file2.txt")
+    output = repo.run("git cl st")
+    repo.assert_not_in("file2.txt", output, "remove is journalled")
+
+    # =================================================================
+    # Test: Compaction
+    # =================================================================
+
+    repo.section("Large journal is compacted into cl.json")
+
+    # About 1.3 MB of paths, more than the compaction threshold
+    paths = "".join(f"generated/{'x' * 50}/file{i}.txt\n"
+                    for i in range(20000))
+    result = subprocess.run(["git", "cl", "add", "generated", "--stdin"],
+                            input=paths, capture_output=True, text=True,
+                            cwd=repo.repo_dir)
+    repo.assert_equal(0, result.returncode, "batch add succeeds")
+    repo.assert_true(not repo.file_exists(".git/cl.journal"),
+                     "journal is folded into cl.json")
+    cl = repo.load_cl_json()
+    repo.assert_equal(20000, len(cl["generated"]),
+                      "snapshot contains the batch")
+    repo.assert_equal(["file1.txt"], cl["list-b"],
+                      "snapshot contains earlier journalled changes")
+
+    # =================================================================
+    # Test: Switching back to cl.json
+    # =================================================================
+
+    repo.section("Switching back to plain cl.json keeps changes")
+
+    repo.run("git cl delete generated")
+    repo.assert_true(repo.file_exists(".git/cl.journal"),
+                     "delete is journalled")
+
+    repo.run("git config --unset cl.storage")
+    output = repo.run("git cl st")
+    repo.assert_not_in("generated:", output,
+                       "journal is still replayed after switching back")
+
+    repo.run("git cl add list-c file2.txt")
+    repo.assert_true(not repo.file_exists(".git/cl.journal"),
+                     "next save writes cl.json and retires the journal")
+    repo.assert_equal({"list-b": ["file1.txt"], "list-c": ["file2.txt"]},
+                      repo.load_cl_json(), "cl.json holds every change")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_journal.py [--export]\n")
+        print("Options:")
+        print("  --export   Print a shell walkthrough instead of test output.")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    export_mode = "--export" in sys.argv
+
+    with TestRepo(quiet=export_mode) as repo:
+        run_tests(repo)
+        if export_mode:
+            print(repo.export_shell("git-cl walkthrough: journal storage"))
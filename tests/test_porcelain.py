@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+test_porcelain.py — Test the machine-readable output of git cl status.
+
+Covers:
+    git cl status --porcelain   — one '<XY> <changelist> <path>' line per file
+    git cl status -z            — the same records, NUL-terminated
+    git cl status --json        — one JSON object per file and stash
+
+What you'll learn:
+    - Scripts and editors can read status without parsing the coloured,
+      grouped display
+    - Paths are always relative to the repository root, wherever the
+      command runs
+    - Changelist filters apply as in the normal display
+
+Run:
+    ./test_porcelain.py
+
+Export as shell walkthrough:
+    ./test_porcelain.py --export > walkthrough_porcelain.sh
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+def run_tests(repo: TestRepo):
+
+    repo.write_file("file1.txt", "one")
+    repo.write_file("src/file2.txt", "two")
+    repo.run("git add file1.txt src/file2.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add files"])
+    repo.write_file("file1.txt", "one modified")
+    repo.write_file("src/file2.txt", "two modified")
+    repo.write_file("new file.txt", "new")
+    repo.write_file('odd"name.txt', "odd")
+    repo.run("git cl add list file1.txt src/file2.txt")
+
+    # =================================================================
+    # Test: --porcelain
+    # =================================================================
+
+    repo.section("--porcelain prints one line per file")
+
+    output = repo.run("git cl st --porcelain")
+    repo.assert_exit_code(0, "git cl st --porcelain should succeed")
+    repo.assert_in(" M list src/file2.txt\n", output,
+                   "code, changelist and repo-relative path")
+    repo.assert_in("??  new file.txt\n", output,
+                   "unassigned files have an empty changelist field")
+    repo.assert_in('??  "odd\\"name.txt"', output, "special paths are quoted")
+    repo.assert_not_in("list:", output, "no grouped display")
+
+    output = repo.run_in("src", "git cl st --porcelain")
+    repo.assert_in("list file1.txt", output,
+                   "paths stay relative to the root in a subdirectory")
+
+    # =================================================================
+    # Test: -z
+    # =================================================================
+
+    repo.section("-z ends records with NUL")
+
+    output = repo.run("git cl st -z")
+    records = output.split("\0")
+    repo.assert_in("M list file1.txt", records, "first record")
+    repo.assert_in('??  odd"name.txt', records, "paths are not quoted")
+    repo.assert_not_in("\n", output, "no newlines")
+
+    # =================================================================
+    # Test: --json
+    # =================================================================
+
+    repo.section("--json prints one object per line")
+
+    repo.run("git cl add later new\\ file.txt")
+    repo.run("git cl stash later")
+    output = repo.run("git cl st --json")
+    records = [json.loads(line) for line in output.splitlines()]
+    files = [r for r in records if r["type"] == "file"]
+    stashes = [r for r in records if r["type"] == "stash"]
+    repo.assert_equal({"type": "file", "changelist": "list", "status": " M",
+                       "path": "src/file2.txt"}, files[1],
+                      "file record with changelist and status")
+    repo.assert_equal({"type": "file", "changelist": None, "status": "??",
+                       "path": 'odd"name.txt'}, files[-1],
+                      "unassigned file has a null changelist")
+    repo.assert_equal(["later"], [s["changelist"] for s in stashes],
+                      "stashed changelist listed")
+    repo.assert_equal(["new file.txt"], stashes[0]["files"],
+                      "with its files")
+
+    output = repo.run("git cl st --porcelain -z --json")
+    repo.assert_in("cannot be used with", output, "--json excludes -z")
+
+    # =================================================================
+    # Test: Filters
+    # =================================================================
+
+    repo.section("Changelist filters apply")
+
+    output = repo.run("git cl st --porcelain other")
+    repo.assert_equal("", output, "nothing in an unknown changelist")
+
+    output = repo.run("git cl st --json other --include-no-cl")
+    records = [json.loads(line) for line in output.splitlines()]
+    repo.assert_in("file1.txt", [r["path"] for r in records],
+                   "files of other changelists are listed")
+    repo.assert_equal({None}, {r["changelist"] for r in records},
+                      "as unassigned, like in the display")
+
+    repo.write_file("file3.txt", "three")
+    repo.run("git cl add one file3.txt")
+    output = repo.run("git cl st --porcelain one --include-no-cl")
+    repo.assert_in("?? one file3.txt\n", output, "selected changelist named")
+    repo.assert_in(" M  file1.txt\n", output,
+                   "unselected changelist's file has an empty field")
+    repo.assert_not_in(" list ", output, "unselected changelist not named")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_porcelain.py [--export]\n")
+        print("Options:")
+        print("  --export   Print a shell walkthrough instead of test output.")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    export_mode = "--export" in sys.argv
+
+    with TestRepo(quiet=export_mode) as repo:
+        run_tests(repo)
+        if export_mode:
+            print(repo.export_shell("git-cl walkthrough: porcelain status"))
@@ -8,6 +8,7 @@ Covers:
     git cl delete <names...>         — delete one or more changelists
     git cl delete --all              — delete all changelists
     git cl del                       — alias for delete
+    git cl remove --stdin -z         — read NUL-separated files from stdin
 
 What you'll learn:
     - Removing a file from a changelist does not affect the file on disk
@@ -22,6 +23,7 @@ Export as shell walkthrough:
     ./test_remove_delete.py --export > walkthrough_remove_delete.sh
 """
 
+import subprocess
 import sys
 from pathlib import Path
 
@@ -197,6 +199,20 @@ def run_tests(repo: TestRepo):
     repo.assert_in("no-such-list", output,
                     "error message mentions the changelist name")
 
+    # =================================================================
+    # Test: Remove NUL-separated files from standard input
+    # =================================================================
+
+    repo.section("Remove files read from stdin with -z")
+
+    repo.run("git cl add batch file1.txt file2.txt")
+    result = subprocess.run(["git", "cl", "remove", "--stdin", "-z"],
+                            input=b"file1.txt\0file2.txt\0",
+                            capture_output=True, cwd=repo.repo_dir)
+    repo.assert_equal(0, result.returncode, "remove --stdin -z should succeed")
+    repo.assert_true("batch" not in repo.load_cl_json(),
+                      "all files read from stdin were removed")
+
 
 # =================================================================
 # Entry point
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+test_startup.py — Check what 'git cl status' imports and how long it takes.
+
+Covers:
+    git cl status   — run with 'python -X importtime'
+
+What you'll learn:
+    - git-cl imports modules that only some commands need (datetime,
+      tempfile, socket, copy, colorama) when those commands run, so a
+      plain 'git cl st' does not pay for them
+    - Colours are plain ANSI codes; colorama is only loaded on Windows
+    - A module import added to the start-up path shows up here before it
+      shows up as a slower shell prompt; the number of modules importing
+      git_cl loads is kept within a budget
+
+git-cl is run as 'python -X importtime git-cl st', which makes Python
+report every import with its time in microseconds on stderr.
+
+Run:
+    ./test_startup.py
+
+Export as shell walkthrough:
+    ./test_startup.py --export > walkthrough_startup.sh
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+# Modules 'git cl st' must not import in a repository without stashes.
+# 'copy' is left out, since some Python versions import it themselves.
+LAZY_MODULES = ["colorama", "datetime", "socket", "tempfile"]
+
+
+# Upper bound for the number of modules importing git_cl loads, the
+# ones the interpreter had already loaded not counted. Around 50 with
+# Python 3.11; the margin absorbs other Python versions. Unlike the
+# import time it does not depend on the speed of the machine.
+IMPORT_MODULE_BUDGET = 75
+
+
+def importtime_records(repo: TestRepo, launcher: str) -> list[tuple[str, int]]:
+    """
+    Run 'git cl st' under -X importtime.
+
+    Returns (name, cumulative us) per import in the order Python reports
+    them; names keep their indentation, which gives the nesting.
+    """
+    env = {k: v for k, v in os.environ.items()
+           if k != "PYTHONDONTWRITEBYTECODE"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", launcher, "st"],
+        cwd=repo.repo_dir, env=env, capture_output=True, text=True,
+        check=True)
+    records = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                records.append((name.rstrip(), int(cumulative)))
+    return records
+
+
+def import_times(repo: TestRepo, launcher: str) -> dict[str, int]:
+    """Run 'git cl st' under -X importtime; return cumulative us per module."""
+    return {name.strip(): cumulative
+            for name, cumulative in importtime_records(repo, launcher)}
+
+
+def modules_imported_by(repo: TestRepo, launcher: str, module: str) -> set[str]:
+    """Run 'git cl st'; return the modules first imported by a module."""
+    names = [name for name, _ in importtime_records(repo, launcher)]
+    stripped = [name.strip() for name in names]
+    # Nested imports are reported before the module that imports them,
+    # indented further
+    position = stripped.index(module)
+    depth = len(names[position]) - len(stripped[position])
+    nested = set()
+    for name in reversed(names[:position]):
+        if len(name) - len(name.lstrip()) <= depth:
+            break
+        nested.add(name.strip())
+    return nested
+
+
+def run_tests(repo: TestRepo, launcher: str):
+
+    repo.write_file("file1.txt", "one")
+    repo.run("git add file1.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add file"])
+    repo.write_file("file1.txt", "one modified")
+    repo.run("git cl add list file1.txt")
+
+    # =================================================================
+    # Test: Lazy imports
+    # =================================================================
+
+    repo.section("'git cl st' skips modules it does not need")
+
+    # The first run may have to compile git_cl.py and write its bytecode
+    import_times(repo, launcher)
+    times = import_times(repo, launcher)
+    repo.assert_true("git_cl" in times, "git_cl is imported by the launcher")
+    for module in LAZY_MODULES:
+        repo.assert_true(module not in times, f"{module} is not imported")
+
+    # =================================================================
+    # Test: Start-up budget
+    # =================================================================
+
+    repo.section("Importing git_cl stays within budget")
+
+    count = len(modules_imported_by(repo, launcher, "git_cl"))
+    repo.assert_true(count <= IMPORT_MODULE_BUDGET,
+                     f"git_cl imports {count} modules, at most "
+                     f"{IMPORT_MODULE_BUDGET}")
+
+    # Wall-clock time varies too much between machines to assert on
+    if not repo.quiet:
+        print(f"  INFO: importing git_cl took {times['git_cl'] / 1000:.1f} ms")
+
+    # =================================================================
+    # Test: Stashes still show their time
+    # =================================================================
+
+    repo.section("Modules are loaded when needed")
+
+    repo.run("git cl stash list")
+    output = repo.run("git cl st")
+    repo.assert_in("list (1 file, ", output, "stash with its time shown")
+    times = import_times(repo, launcher)
+    repo.assert_true("datetime" in times,
+                     "datetime is imported to show stash times")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_startup.py [--export]\n")
+        print("Options:")
+        print("  --export   Print a shell walkthrough instead of test output.")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    launcher = shutil.which("git-cl")
+    if launcher is None:
+        # Windows finds git-cl through Git, not through PATHEXT
+        print("Skipped: git-cl was not found on PATH.")
+        sys.exit(0)
+
+    export_mode = "--export" in sys.argv
+
+    with TestRepo(quiet=export_mode) as repo:
+        run_tests(repo, launcher)
+        if export_mode:
+            print(repo.export_shell("git-cl walkthrough: start-up"))
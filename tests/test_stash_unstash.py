@@ -122,6 +122,13 @@ def run_tests(repo: TestRepo):
     repo.assert_true("list-a" in stash, "list-a stashed")
     repo.assert_true("list-b" in stash, "list-b stashed")
 
+    # Each recorded stash_ref points at that changelist's Git stash
+    for name in ("list-a", "list-b"):
+        message = repo.run(["git", "log", "-1", "--format=%s",
+                            stash[name]["stash_ref"]])
+        repo.assert_in(f"git-cl-stash:{name}:", message,
+                       f"{name} stash_ref points at its stash")
+
     # No active changelists should remain
     cl = repo.load_cl_json()
     repo.assert_equal({}, cl, "no active changelists remain")
@@ -163,6 +170,35 @@ def run_tests(repo: TestRepo):
     repo.assert_equal("alpha", content_a,
                        "alpha.txt still reverted (list-a stashed)")
 
+    # =================================================================
+    # Test: Unstash finds its stash by commit, not by position or message
+    # =================================================================
+
+    repo.section("Unstash after a newer stash with a similar message")
+
+    repo.write_file("delta.txt", "delta")
+    repo.run("git add delta.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add delta"])
+    repo.write_file("delta.txt", "delta modified")
+    repo.run(["git", "stash", "push", "--quiet",
+              "-m", "git-cl-stash:list-a:manual", "--", "delta.txt"])
+
+    stash = repo.load_stash_json()
+    repo.assert_true(stash["list-a"].get("stash_oid"),
+                     "stash metadata records the stash commit")
+
+    output = repo.run("git cl unstash list-a")
+    repo.assert_exit_code(0, "unstashing list-a should succeed")
+    repo.assert_equal("alpha modified", repo.read_file("alpha.txt"),
+                      "list-a's own stash was applied")
+    repo.assert_equal("delta", repo.read_file("delta.txt"),
+                      "the newer stash was left alone")
+    stash_list = repo.run("git stash list")
+    repo.assert_in("git-cl-stash:list-a:manual", stash_list,
+                   "the newer stash still exists")
+
+    repo.run("git cl stash list-a")
+
     # =================================================================
     # Test: Unstash all with --all
     # =================================================================
@@ -215,6 +251,120 @@ def run_tests(repo: TestRepo):
     repo.assert_true("list-a" in cl,
                       "list-a unstashed via us alias")
 
+    # =================================================================
+    # Test: Stashes under refs/cl-stash/
+    # =================================================================
+
+    repo.section("Stash under a dedicated ref with cl.stashRefs")
+
+    repo.run("git config cl.stashRefs true")
+    repo.run("git cl stash list-a")
+
+    stash = repo.load_stash_json()
+    repo.assert_equal("refs/cl-stash/list-a", stash["list-a"]["stash_ref"],
+                      "stash is recorded under its own ref")
+    oid = repo.run("git rev-parse refs/cl-stash/list-a")
+    repo.assert_equal(stash["list-a"]["stash_oid"], oid,
+                      "ref points at the recorded stash commit")
+    repo.assert_not_in("git-cl-stash:list-a:", repo.run("git stash list")
+                       .replace("git-cl-stash:list-a:manual", ""),
+                       "stash is not in the git stash list")
+
+    output = repo.run("git cl unstash list-a")
+    repo.assert_exit_code(0, "unstash from the dedicated ref succeeds")
+    repo.assert_equal("alpha modified", repo.read_file("alpha.txt"),
+                      "alpha.txt restored from the dedicated ref")
+    repo.run("git rev-parse -q --verify refs/cl-stash/list-a")
+    repo.assert_exit_code(1, "ref is deleted after unstash")
+
+    # =================================================================
+    # Test: Migrate existing stashes to refs/cl-stash/
+    # =================================================================
+
+    repo.section("Migrate stashes from the git stash list")
+
+    repo.run("git config --unset cl.stashRefs")
+    repo.run("git cl stash list-a")
+    repo.run("git config cl.stashRefs true")
+
+    output = repo.run("git cl stash --migrate-refs")
+    repo.assert_in("Moved 1 stashed changelist(s)", output,
+                   "migration reports the moved stash")
+    stash = repo.load_stash_json()
+    repo.assert_equal("refs/cl-stash/list-a", stash["list-a"]["stash_ref"],
+                      "metadata points at the new ref")
+    stash_list = repo.run("git stash list")
+    repo.assert_not_in("git-cl-stash:list-a:2", stash_list,
+                       "migrated stash is dropped from the stash list")
+    repo.assert_in("git-cl-stash:list-a:manual", stash_list,
+                   "other stashes are kept")
+
+    repo.run("git cl unstash list-a")
+    repo.assert_equal("alpha modified", repo.read_file("alpha.txt"),
+                      "migrated stash can be unstashed")
+
+    # =================================================================
+    # Test: Names Git does not accept as ref names
+    # =================================================================
+
+    repo.section("Names that are not valid ref names use refs/stash")
+
+    repo.run("git cl add x.lock alpha.txt")
+    output = repo.run("git cl stash x.lock")
+    repo.assert_in("not a valid Git ref name", output, "fallback is reported")
+    stash = repo.load_stash_json()
+    repo.assert_equal("stash@{0}", stash.get("x.lock", {}).get("stash_ref"),
+                      "x.lock is stashed in refs/stash")
+    repo.assert_equal("alpha", repo.read_file("alpha.txt"), "alpha.txt reset")
+
+    repo.run("git cl unstash x.lock")
+    repo.assert_equal("alpha modified", repo.read_file("alpha.txt"),
+                      "x.lock can be unstashed")
+
+    # =================================================================
+    # Test: A leftover ref under refs/cl-stash/
+    # =================================================================
+
+    repo.section("A leftover stash ref is reported")
+
+    repo.run("git cl add list-a alpha.txt")
+    repo.run("git update-ref refs/cl-stash/list-a HEAD")
+    output = repo.run("git cl stash list-a")
+    repo.assert_in("refs/cl-stash/list-a already exists", output,
+                   "the leftover ref is named")
+    repo.assert_in("git update-ref -d refs/cl-stash/list-a", output,
+                   "how to remove it is shown")
+    repo.assert_true("list-a" not in repo.load_stash_json(),
+                     "list-a is not recorded as stashed")
+    repo.assert_equal("alpha modified", repo.read_file("alpha.txt"),
+                      "alpha.txt is left alone")
+
+    repo.run("git update-ref -d refs/cl-stash/list-a")
+    repo.run("git cl stash list-a")
+    repo.assert_true("list-a" in repo.load_stash_json(),
+                     "stashing works once the ref is removed")
+    repo.run("git cl unstash list-a")
+    repo.run("git config --unset cl.stashRefs")
+
+    # =================================================================
+    # Test: Unstash all onto a new branch
+    # =================================================================
+    # The clean-tree check applies to the tree before the batch, so the
+    # first restored changelist does not block the next one.
+
+    repo.section("Unstash all onto a new branch")
+
+    repo.run("git cl stash --all")
+    repo.run("git checkout --quiet -b feature")
+    output = repo.run("git cl unstash --all")
+    repo.assert_in("Unstashed 2/2 changelists successfully", output,
+                   "every changelist is restored")
+    repo.assert_equal({}, repo.load_stash_json(), "stash is empty")
+    repo.assert_equal("alpha modified", repo.read_file("alpha.txt"),
+                      "alpha.txt restored on the new branch")
+    repo.assert_equal("beta modified", repo.read_file("beta.txt"),
+                      "beta.txt restored on the new branch")
+
     # =================================================================
     # Test: Stash a non-existent changelist
     # =================================================================
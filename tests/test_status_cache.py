@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+test_status_cache.py — Test the opt-in status cache.
+
+Covers:
+    Cache hits        — unchanged repository reuses .git/cl-status-cache.json
+    Working tree      — only paths reported by the fsmonitor hook are
+                        re-queried, '/' rescans everything
+    Untracked cache   — core.untrackedCache switches to collapsed 'dir/'
+                        entries, which still answer for the files inside
+    Ignore rules      — a changed .gitignore or core.excludesFile rescans
+                        the tree
+    Index and HEAD    — git add and git commit invalidate it
+    No monitor        — without a queryable fsmonitor hook the cache is unused
+
+What you'll learn:
+    - 'git config cl.statusCache true' enables the cache
+    - The cache is only trusted together with a core.fsmonitor hook, which
+      is what tells git-cl that no file was edited in the meantime
+    - Changed paths are patched into the cached status, not rescanned
+
+The fsmonitor hook used here is a stand-in: it reports the paths listed in
+.git/fsmonitor-log, and its token is the number of lines in that log.
+
+Run:
+    ./test_status_cache.py
+
+Export as shell walkthrough:
+    ./test_status_cache.py --export > walkthrough_status_cache.sh
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+FSMONITOR_HOOK = r"""#!/bin/sh
+log=.git/fsmonitor-log
+touch "$log"
+count=$(wc -l < "$log" | tr -d ' ')
+printf '%s\0' "$count"
+case "$2" in
+    ''|*[!0-9]*) printf '/\0'; exit 0 ;;
+esac
+if [ "$2" -gt "$count" ]; then
+    printf '/\0'
+    exit 0
+fi
+tail -n "+$(($2 + 1))" "$log" | tr '\n' '\0'
+"""
+
+
+def install_fsmonitor(repo: TestRepo):
+    """Install the stand-in fsmonitor hook and enable it."""
+    hook = repo.repo_dir / ".git" / "fsmonitor-hook"
+    hook.write_text(FSMONITOR_HOOK)
+    hook.chmod(0o755)
+    repo.run(["git", "config", "core.fsmonitor", str(hook)])
+    repo.run("git config core.fsmonitorHookVersion 2")
+
+
+def report_change(repo: TestRepo, path: str):
+    """Tell the stand-in fsmonitor hook that a path changed."""
+    with open(repo.repo_dir / ".git" / "fsmonitor-log", "a",
+              encoding="utf-8") as log:
+        log.write(path + "\n")
+
+
+def plant_marker(repo: TestRepo, path: str, code: str):
+    """
+    Overwrite one entry in the status cache.
+
+    If 'git cl st' then shows the planted code, the cache was used;
+    if it shows the real code, the cache was recomputed.
+    """
+    cache_file = repo.repo_dir / ".git" / "cl-status-cache.json"
+    cache = json.loads(cache_file.read_text())
+    cache["entries"][path] = code
+    cache_file.write_text(json.dumps(cache))
+
+
+def run_tests(repo: TestRepo):
+
+    repo.write_file("a.txt", "a")
+    repo.write_file("b.txt", "b")
+    repo.run("git add a.txt b.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add files"])
+    install_fsmonitor(repo)
+    repo.run("git config cl.statusCache true")
+
+    # =================================================================
+    # Test: Cache is written and reused
+    # =================================================================
+
+    repo.section("Unchanged repository reuses the status cache")
+
+    repo.write_file("a.txt", "modified")
+    report_change(repo, "a.txt")
+    repo.run("git cl add list a.txt b.txt")
+
+    output = repo.run("git cl st")
+    repo.assert_in("[ M] a.txt", output, "first status scans the tree")
+    repo.assert_true(repo.file_exists(".git/cl-status-cache.json"),
+                     "status cache file is written")
+
+    plant_marker(repo, "a.txt", "A ")
+    output = repo.run("git cl st")
+    repo.assert_in("[A ] a.txt", output, "unchanged repository uses the cache")
+
+    # =================================================================
+    # Test: Working-tree change reported by the monitor
+    # =================================================================
+
+    repo.section("Only paths reported by fsmonitor are re-queried")
+
+    repo.write_file("b.txt", "modified")
+    report_change(repo, "b.txt")
+    output = repo.run("git cl st")
+    repo.assert_in("[ M] b.txt", output, "reported change is picked up")
+    repo.assert_in("[A ] a.txt", output, "unreported path is not re-queried")
+
+    report_change(repo, "/")
+    output = repo.run("git cl st")
+    repo.assert_in("[ M] a.txt", output, "'/' from fsmonitor rescans everything")
+
+    # =================================================================
+    # Test: Untracked directories with core.untrackedCache
+    # =================================================================
+
+    repo.section("Untracked directories are collapsed with core.untrackedCache")
+
+    repo.run("git config core.untrackedCache true")
+    repo.write_file("new/one.txt", "one")
+    repo.write_file("new/two.txt", "two")
+    report_change(repo, "new/one.txt")
+    report_change(repo, "new/two.txt")
+    repo.run("git cl add list new/one.txt")
+
+    output = repo.run("git cl st")
+    repo.assert_in("[??] new/one.txt", output,
+                   "file inside a collapsed directory is untracked")
+    repo.assert_in("[??] new/\n", output + "\n",
+                   "unassigned untracked directory is listed as a whole")
+    repo.assert_equal("normal",
+                      json.loads(repo.read_file(".git/cl-status-cache.json"))
+                      ["fingerprint"]["untracked"],
+                      "cache records --untracked-files=normal")
+
+    repo.delete_file("new/two.txt")
+    report_change(repo, "new/two.txt")
+    output = repo.run("git cl st")
+    repo.assert_in("[??] new/one.txt", output,
+                   "directory is re-queried after a change inside it")
+
+    repo.run("git config core.untrackedCache false")
+
+    # =================================================================
+    # Test: Ignore rules
+    # =================================================================
+
+    repo.section("Changed ignore rules rescan the tree")
+
+    repo.write_file("new.log", "log")
+    report_change(repo, "new.log")
+    output = repo.run("git cl st --porcelain")
+    repo.assert_in("??  new.log", output, "untracked file is listed")
+
+    repo.write_file(".gitignore", "*.log\n")
+    report_change(repo, ".gitignore")
+    output = repo.run("git cl st --porcelain")
+    repo.assert_not_in("new.log", output,
+                       "file hidden by a new .gitignore rule is dropped")
+
+    repo.write_file(".gitignore", "")
+    report_change(repo, ".gitignore")
+    output = repo.run("git cl st --porcelain")
+    repo.assert_in("??  new.log", output,
+                   "file revealed by a removed rule is listed again")
+
+    excludes = repo.repo_dir / ".git" / "global-ignore"
+    excludes.write_text("*.log\n")
+    repo.run(["git", "config", "core.excludesFile", str(excludes)])
+    output = repo.run("git cl st --porcelain")
+    repo.assert_not_in("new.log", output, "core.excludesFile is honoured")
+
+    excludes.write_text("")
+    output = repo.run("git cl st --porcelain")
+    repo.assert_in("??  new.log", output,
+                   "an edited core.excludesFile invalidates the cache")
+
+    repo.run("git config --unset core.excludesFile")
+    repo.delete_file("new.log")
+    repo.delete_file(".gitignore")
+    report_change(repo, "new.log")
+    report_change(repo, ".gitignore")
+
+    # =================================================================
+    # Test: Index and HEAD changes
+    # =================================================================
+
+    repo.section("Staging and committing invalidate the cache")
+
+    plant_marker(repo, "a.txt", "A ")
+    repo.run("git add a.txt")
+    output = repo.run("git cl st")
+    repo.assert_in("[M ] a.txt", output, "index change invalidates the cache")
+
+    plant_marker(repo, "b.txt", "A ")
+    repo.run(["git", "commit", "--quiet", "-m", "Commit a.txt"])
+    output = repo.run("git cl st")
+    repo.assert_in("[  ] a.txt", output, "committed file is clean")
+    repo.assert_in("[ M] b.txt", output, "HEAD change invalidates the cache")
+
+    # =================================================================
+    # Test: Cache is bypassed without an fsmonitor hook
+    # =================================================================
+
+    repo.section("Cache is not used without an fsmonitor hook")
+
+    plant_marker(repo, "b.txt", "A ")
+    repo.run("git config --unset core.fsmonitor")
+    output = repo.run("git cl st")
+    repo.assert_in("[ M] b.txt", output, "status is read from Git")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_status_cache.py [--export]\n")
+        print("Options:")
+        print("  --export   Print a shell walkthrough instead of test output.")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    if os.name == "nt":
+        # fsmonitor hooks are run through 'sh', which git-cl does not
+        # use on Windows
+        print("Skipped: fsmonitor hooks are not queried on Windows.")
+        sys.exit(0)
+
+    export_mode = "--export" in sys.argv
+
+    with TestRepo(quiet=export_mode) as repo:
+        run_tests(repo)
+        if export_mode:
+            print(repo.export_shell("git-cl walkthrough: status cache"))
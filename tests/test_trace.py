@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+test_trace.py — Test tracing of the Git commands git-cl runs.
+
+Covers:
+    git cl --trace <command>    — each Git command and a summary on stderr
+    GIT_CL_TRACE=1              — the same, switched on from the environment
+    GIT_CL_TRACE_FILE=<path>    — the same information as JSON lines
+
+What you'll learn:
+    - Tracing shows how many Git processes a command starts and how long
+      each one took, which is where the time of a slow command goes
+    - The JSON-lines file can be collected from several commands and
+      analysed afterwards
+
+Run:
+    ./test_trace.py
+
+Export as shell walkthrough:
+    ./test_trace.py --export > walkthrough_trace.sh
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from test_helpers import TestRepo
+
+
+def run_tests(repo: TestRepo):
+
+    repo.write_file("file1.txt", "one")
+    repo.run("git add file1.txt")
+    repo.run(["git", "commit", "--quiet", "-m", "Add file"])
+    repo.write_file("file1.txt", "one modified")
+    repo.run("git cl add list file1.txt")
+
+    # =================================================================
+    # Test: --trace
+    # =================================================================
+
+    repo.section("--trace prints each Git command")
+
+    output = repo.run("git cl --trace st")
+    repo.assert_exit_code(0, "git cl --trace st should succeed")
+    repo.assert_in("[ M] file1.txt", output, "status output is unchanged")
+    repo.assert_in("git-cl trace:", output, "Git commands are traced")
+    repo.assert_in("exit 0", output, "exit status is shown")
+    repo.assert_in("git status --porcelain=v2", output,
+                   "the status command line is shown")
+    repo.assert_in("Git processes,", output, "a summary is printed")
+
+    output = repo.run("git cl st")
+    repo.assert_not_in("git-cl trace:", output, "tracing is off by default")
+
+    # =================================================================
+    # Test: GIT_CL_TRACE
+    # =================================================================
+
+    repo.section("GIT_CL_TRACE=1 switches tracing on")
+
+    os.environ["GIT_CL_TRACE"] = "1"
+    try:
+        output = repo.run("git cl st")
+    finally:
+        del os.environ["GIT_CL_TRACE"]
+    repo.assert_in("git-cl trace:", output, "Git commands are traced")
+
+    # =================================================================
+    # Test: GIT_CL_TRACE_FILE
+    # =================================================================
+
+    repo.section("GIT_CL_TRACE_FILE writes JSON lines")
+
+    trace_file = repo.repo_dir / ".git" / "trace.jsonl"
+    os.environ["GIT_CL_TRACE_FILE"] = str(trace_file)
+    try:
+        output = repo.run("git cl st")
+    finally:
+        del os.environ["GIT_CL_TRACE_FILE"]
+    repo.assert_not_in("git-cl trace:", output, "nothing is printed")
+
+    records = [json.loads(line)
+               for line in trace_file.read_text().splitlines()]
+    calls = [r for r in records if r["event"] == "git"]
+    summary = [r for r in records if r["event"] == "summary"]
+    repo.assert_true(any(r["argv"][:2] == ["git", "status"] for r in calls),
+                     "status call is recorded with its argv")
+    repo.assert_true(all(r["returncode"] == 0 and r["seconds"] >= 0
+                         for r in calls),
+                     "each call has an exit status and a wall time")
+    repo.assert_equal(1, len(summary), "one summary record")
+    repo.assert_equal(len(calls), summary[0]["calls"],
+                      "summary counts every call")
+    repo.assert_equal(["st"], summary[0]["argv"],
+                      "summary names the git-cl command")
+
+
+# =================================================================
+# Entry point
+# =================================================================
+
+if __name__ == "__main__":
+
+    if "--help" in sys.argv:
+        print("Usage: ./test_trace.py [--export]\n")
+        print("Options:")
+        print("  --export   Print a shell walkthrough instead of test output.")
+        print("  --help     Show this message.")
+        sys.exit(0)
+
+    export_mode = "--export" in sys.argv
+
+    with TestRepo(quiet=export_mode) as repo:
+        run_tests(repo)
+        if export_mode:
+            print(repo.export_shell("git-cl walkthrough: tracing"))